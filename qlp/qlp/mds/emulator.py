@@ -0,0 +1,662 @@
+"""Offline stand-ins for the D-Wave samplers used in this package.
+
+``LocalDWaveSampler`` emulates the properties and ``sample_qubo`` parameters of a
+``dwave.system.DWaveSampler`` on a Chimera or Pegasus target graph and
+``LocalEmbeddingComposite`` emulates ``dwave.system.FixedEmbeddingComposite`` on top
+of it. Samples are drawn by the simulated annealing kernel of ``qlp.mds.sampler``:
+the anneal schedule sets the inverse temperature of each sweep and anneal offsets
+shift the schedule of single qubits. This allows to run ``mds_schedule_submit``,
+``retry_embedding`` and the database ingestion without access to an annealer.
+
+.. code-block:: python
+
+    sampler = LocalDWaveSampler(topology="chimera", shape=(16, 16, 4), seed=42)
+    embedding = find_embedding(qubo_dict, sampler.edgelist)
+    embed = LocalEmbeddingComposite(sampler, embedding)
+    result = embed.sample_qubo(qubo_dict, num_reads=100, answer_mode="raw")
+    raw = result.to_pandas_dataframe()
+"""
+from typing import Dict, Any, List, Optional, Tuple, Hashable, Union
+from collections import namedtuple
+
+import numpy as np
+from scipy.sparse import csr_matrix, issparse
+
+from qlp.mds.sampler import (
+    SampleSet,
+    default_beta_range,
+    _as_qubo,
+    _beta_range,
+    _couplings,
+    _simulated_annealing,
+)
+
+Embedding = Dict[Hashable, List[int]]
+
+# Chains of the requested variables and the couplers between and within chains
+_Layout = namedtuple(
+    "_Layout",
+    [
+        "qubits",
+        "counts",
+        "starts",
+        "chain_of",
+        "inter_keys",
+        "inter_rows",
+        "inter_cols",
+        "intra_rows",
+        "intra_cols",
+        "intra_degree",
+    ],
+)
+
+# Embedded sparsity structure of a set of QUBO keys
+_Structure = namedtuple(
+    "_Structure",
+    [
+        "variables",
+        "layout",
+        "rows",
+        "cols",
+        "diagonal",
+        "pairs",
+        "n_couplers",
+        "order",
+        "W_rows",
+        "W_indices",
+        "W_indptr",
+    ],
+)
+
+
+def chimera_edges(m: int, n: Optional[int] = None, t: int = 4) -> np.ndarray:
+    """Returns the couplers of the Chimera graph C(m, n, t)
+
+    Qubit labels are linear indices ``((i * n + j) * 2 + u) * t + k`` for row i,
+    column j, shore u (0 vertical, 1 horizontal) and position k as in
+    ``dwave_networkx.chimera_graph``.
+
+    Returns:
+        Array of shape (n_couplers, 2).
+    """
+    n = m if n is None else n
+    qubits = np.arange(m * n * 2 * t).reshape(m, n, 2, t)
+    vertical, horizontal = np.broadcast_arrays(
+        qubits[:, :, 0, :, None], qubits[:, :, 1, None, :]
+    )
+    internal = np.stack([vertical.ravel(), horizontal.ravel()], axis=1)
+    rows = np.stack([qubits[:-1, :, 0].ravel(), qubits[1:, :, 0].ravel()], axis=1)
+    cols = np.stack([qubits[:, :-1, 1].ravel(), qubits[:, 1:, 1].ravel()], axis=1)
+    return np.concatenate([internal, rows, cols])
+
+
+def pegasus_edges(m: int) -> np.ndarray:
+    """Returns the couplers of the Pegasus graph P(m) with linear qubit labels
+
+    Requires ``dwave_networkx``. P(16) is the graph of the Advantage systems.
+
+    Returns:
+        Array of shape (n_couplers, 2).
+    """
+    import dwave_networkx as dnx  # pylint: disable=C0415
+
+    return np.array(list(dnx.pegasus_graph(m).edges), dtype=int).reshape(-1, 2)
+
+
+class LocalDWaveSampler:
+    """Emulates ``dwave.system.DWaveSampler`` with a classical annealer
+
+    The anneal fraction ``s`` of each sweep follows ``anneal_schedule`` (or a linear
+    ramp over ``annealing_time``) and maps to the inverse temperature
+    ``beta_min (beta_max / beta_min)^s``. Anneal offsets shift ``s`` qubit-wise.
+    ``auto_scale`` has no effect since the default beta range is set per problem.
+
+    Arguments:
+        topology: "chimera" or "pegasus" (requires ``dwave_networkx``). Ignored if
+            ``edges`` are given.
+        shape: (m, n, t) for Chimera and (m,) for Pegasus. Defaults to a 2000Q
+            Chimera (16, 16, 4) and an Advantage Pegasus (16,).
+        edges: Couplers of a custom target graph.
+        anneal_offset_ranges: Offset range of each qubit of shape (num_qubits, 2).
+            Defaults to random lower bounds in [-0.6, -0.15] and upper bounds in
+            [0.05, 0.6].
+        sweeps_per_microsecond: Metropolis sweeps per microsecond of the schedule.
+        beta_range: Inverse temperatures at ``s = 0`` and ``s = 1``. Defaults to
+            ``default_beta_range`` of each problem.
+        seed: Seed of the random states of the sampler.
+    """
+
+    parameters = {
+        "anneal_offsets": ["parameters"],
+        "anneal_schedule": ["parameters"],
+        "annealing_time": ["parameters"],
+        "answer_mode": ["parameters"],
+        "auto_scale": ["parameters"],
+        "initial_state": ["parameters"],
+        "num_reads": ["parameters"],
+        "num_spin_reversal_transforms": ["parameters"],
+        "programming_thermalization": ["parameters"],
+        "readout_thermalization": ["parameters"],
+        "reinitialize_state": ["parameters"],
+    }
+
+    def __init__(
+            self,
+            topology: str = "pegasus",
+            shape: Optional[Tuple[int, ...]] = None,
+            edges: Optional[Union[np.ndarray, List[Tuple[int, int]]]] = None,
+            anneal_offset_ranges: Optional[np.ndarray] = None,
+            sweeps_per_microsecond: float = 10.0,
+            beta_range: Optional[Tuple[float, float]] = None,
+            seed: Optional[int] = None,
+    ):
+        if edges is not None:
+            topology = "custom"
+            edges = np.array(edges, dtype=int).reshape(-1, 2)
+            num_qubits = int(edges.max()) + 1 if edges.size else 0
+        elif topology == "chimera":
+            shape = tuple(shape or (16, 16, 4))
+            edges = chimera_edges(*shape)
+            num_qubits = int(np.prod(shape)) * 2
+        elif topology == "pegasus":
+            shape = tuple(shape or (16,))
+            edges = pegasus_edges(*shape)
+            num_qubits = 24 * shape[0] * (shape[0] - 1)
+        else:
+            raise KeyError(f"Topology {topology} not reckognized")
+
+        edges = np.sort(edges, axis=1)
+        edges = edges[np.lexsort((edges[:, 1], edges[:, 0]))]
+        self.nodelist = np.unique(edges).tolist()
+        self.edgelist = [tuple(edge) for edge in edges.tolist()]
+        self.adjacency = {q: set() for q in self.nodelist}
+        for u, v in self.edgelist:
+            self.adjacency[u].add(v)
+            self.adjacency[v].add(u)
+        self._num_qubits = num_qubits
+        self._edge_keys = np.unique(edges[:, 0] * num_qubits + edges[:, 1])
+
+        self._rng = np.random.default_rng(seed)
+        if anneal_offset_ranges is None:
+            anneal_offset_ranges = np.stack(
+                [
+                    self._rng.uniform(-0.6, -0.15, size=num_qubits),
+                    self._rng.uniform(0.05, 0.6, size=num_qubits),
+                ],
+                axis=1,
+            )
+        self._offset_ranges = np.array(anneal_offset_ranges, dtype=float)
+        if self._offset_ranges.shape != (num_qubits, 2):
+            raise ValueError(
+                f"anneal_offset_ranges must have shape ({num_qubits}, 2),"
+                f" got {self._offset_ranges.shape}"
+            )
+        self.sweeps_per_microsecond = sweeps_per_microsecond
+        self.beta_range = beta_range
+
+        self.properties = {
+            "chip_id": f"Local_{topology}",
+            "topology": {"type": topology, "shape": list(shape or ())},
+            "num_qubits": num_qubits,
+            "qubits": self.nodelist,
+            "couplers": [list(edge) for edge in self.edgelist],
+            "anneal_offset_ranges": self._offset_ranges.tolist(),
+            "anneal_offset_step": 0.0,
+            "annealing_time_range": [0.5, 2000.0],
+            "default_annealing_time": 20.0,
+            "num_reads_range": [1, 10000],
+            "max_anneal_schedule_points": 12,
+            "h_range": [-4.0, 4.0],
+            "j_range": [-1.0, 1.0],
+            "parameters": {key: "" for key in self.parameters},
+        }
+
+    def sample_qubo(
+            self,
+            Q: Dict[Tuple[int, int], float],
+            initial_state: Optional[
+                Union[Dict[int, int], List[Tuple[int, int]]]
+            ] = None,
+            **params,
+    ) -> SampleSet:
+        """Samples the QUBO ``{(q1, q2): bias}`` defined on qubits and couplers of
+        the target graph
+
+        Arguments:
+            Q: The QUBO on the target graph.
+            initial_state: Bits of all active qubits as dict or ``(qubit, bit)``
+                pairs.
+            params: Sampling parameters, see ``LocalDWaveSampler.parameters``.
+
+        Raises:
+            ValueError: If the QUBO does not fit the target graph.
+        """
+        qubo, qubits = _as_qubo(Q)
+        qubits = np.array(qubits, dtype=int)
+        missing = np.setdiff1d(qubits, self.nodelist)
+        if missing.size:
+            raise ValueError(f"Qubits {missing.tolist()} are not in the target graph")
+        coo = qubo.tocoo()
+        mask = (coo.row != coo.col) & (coo.data != 0)
+        u = np.minimum(qubits[coo.row[mask]], qubits[coo.col[mask]])
+        v = np.maximum(qubits[coo.row[mask]], qubits[coo.col[mask]])
+        unknown = ~np.isin(u * self._num_qubits + v, self._edge_keys)
+        if np.any(unknown):
+            raise ValueError(
+                f"Couplers {list(zip(u[unknown].tolist(), v[unknown].tolist()))}"
+                " are not in the target graph"
+            )
+        if initial_state is not None:
+            state = dict(initial_state)
+            initial_state = np.array([state[q] for q in qubits.tolist()])
+        W, diag = _couplings(qubo)
+        states, occurrences, info = self._anneal(
+            W.indptr,
+            W.indices,
+            W.data,
+            diag,
+            qubits,
+            self.beta_range or default_beta_range(qubo),
+            initial_state=initial_state,
+            **params,
+        )
+        energies = states @ diag + 0.5 * np.einsum("ij,ij->i", states @ W, states)
+        return SampleSet(states, energies, occurrences, qubits.tolist(), info)
+
+    def _betas(
+            self,
+            beta_range: Tuple[float, float],
+            qubits: np.ndarray,
+            annealing_time: Optional[float],
+            anneal_schedule: Optional[List[Tuple[float, float]]],
+            anneal_offsets: Optional[List[float]],
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the beta of each sweep, shape (n_sweeps, 1) or (n_sweeps, n) for
+        anneal offsets, and the schedule as array of shape (n_points, 2)
+        """
+        if anneal_schedule is not None and annealing_time is not None:
+            raise ValueError("annealing_time and anneal_schedule are mutually exclusive")
+        if anneal_schedule is None:
+            anneal_schedule = [
+                (0.0, 0.0),
+                (annealing_time or self.properties["default_annealing_time"], 1.0),
+            ]
+        schedule = np.array(anneal_schedule, dtype=float).reshape(-1, 2)
+        times, s = schedule.T
+        if (
+                times[0] != 0
+                or np.any(np.diff(times) <= 0)
+                or np.any((s < 0) | (s > 1))
+                or s[-1] != 1
+        ):
+            raise ValueError(
+                "anneal_schedule must start at t = 0, increase in time, stay in"
+                f" [0, 1] and end at s = 1, got {anneal_schedule}"
+            )
+
+        n_sweeps = max(2, int(round(self.sweeps_per_microsecond * times[-1])))
+        s_sweeps = np.interp(np.linspace(0, times[-1], n_sweeps), times, s)[:, None]
+        if anneal_offsets is not None:
+            offsets = np.asarray(anneal_offsets, dtype=float)
+            if offsets.shape != (self._num_qubits,):
+                raise ValueError(
+                    f"anneal_offsets must have {self._num_qubits} entries,"
+                    f" got {offsets.size}"
+                )
+            lower, upper = self._offset_ranges.T
+            outside = (offsets < lower) | (offsets > upper)
+            if np.any(outside):
+                raise ValueError(
+                    f"Anneal offsets of qubits {np.flatnonzero(outside).tolist()}"
+                    " are out of range"
+                )
+            s_sweeps = np.clip(s_sweeps + offsets[qubits][None, :], 0.0, 1.0)
+
+        beta_min, beta_max = beta_range
+        return beta_min * (beta_max / beta_min) ** s_sweeps, schedule
+
+    def _anneal(
+            self,
+            indptr: np.ndarray,
+            indices: np.ndarray,
+            data: np.ndarray,
+            diag: np.ndarray,
+            qubits: np.ndarray,
+            beta_range: Tuple[float, float],
+            num_reads: int = 1,
+            annealing_time: Optional[float] = None,
+            anneal_schedule: Optional[List[Tuple[float, float]]] = None,
+            anneal_offsets: Optional[List[float]] = None,
+            initial_state: Optional[np.ndarray] = None,
+            reinitialize_state: bool = True,
+            answer_mode: str = "histogram",
+            **params,
+    ) -> Tuple[np.ndarray, np.ndarray, Dict[str, Any]]:
+        """Anneals the QUBO ``x^T diag + x^T W x / 2`` of the active ``qubits``
+
+        ``W`` are the symmetric couplings without diagonal in csr format, see
+        ``_couplings``. Returns the states, their occurrences and the info.
+
+        Raises:
+            KeyError: If a parameter is not supported.
+            ValueError: If parameters are out of range.
+        """
+        unknown = set(params) - set(self.parameters)
+        if unknown:
+            raise KeyError(f"Parameters {sorted(unknown)} not reckognized")
+        if answer_mode not in ("raw", "histogram"):
+            raise ValueError(f"answer_mode {answer_mode} not reckognized")
+        low, high = self.properties["num_reads_range"]
+        if not low <= num_reads <= high:
+            raise ValueError(f"num_reads must be in [{low}, {high}], got {num_reads}")
+
+        betas, schedule = self._betas(
+            beta_range, qubits, annealing_time, anneal_schedule, anneal_offsets
+        )
+        if schedule[0, 1] > 0 and initial_state is None:
+            raise ValueError("Reverse annealing requires an initial_state")
+
+        n = qubits.size
+        seeds = self._rng.integers(0, 2 ** 63, size=num_reads, dtype=np.uint64)
+        if initial_state is None:
+            states = self._rng.integers(0, 2, size=(num_reads, n), dtype=np.int8)
+        else:
+            states = np.repeat(
+                np.asarray(initial_state, dtype=np.int8).reshape(1, n), num_reads, axis=0
+            )
+
+        betas = np.ascontiguousarray(betas)
+        if initial_state is not None and not reinitialize_state:
+            # Each read starts from the final state of the previous read
+            for read in range(num_reads):
+                if read:
+                    states[read] = states[read - 1]
+                _simulated_annealing(
+                    indptr,
+                    indices,
+                    data,
+                    diag,
+                    betas,
+                    states[read : read + 1],
+                    seeds[read : read + 1],
+                )
+        else:
+            _simulated_annealing(indptr, indices, data, diag, betas, states, seeds)
+
+        if answer_mode == "histogram":
+            states, occurrences = np.unique(states, axis=0, return_counts=True)
+        else:
+            occurrences = np.ones(num_reads, dtype=int)
+        info = {
+            "timing": {
+                "qpu_anneal_time_per_sample": float(schedule[-1, 0]),
+                "num_sweeps": betas.shape[0],
+            },
+        }
+        return states, occurrences, info
+
+
+def _torque(J: np.ndarray, n_variables: int, prefactor: float) -> float:
+    """Returns the uniform torque compensation for the Ising couplings ``J``"""
+    J = J[J != 0]
+    if J.size == 0:
+        return 1.0
+    rms = np.sqrt(np.mean(J ** 2))
+    return float(prefactor * rms * np.sqrt(2 * J.size / n_variables))
+
+
+def uniform_torque_compensation(qubo: csr_matrix, prefactor: float = 1.414) -> float:
+    """Returns the chain strength ``prefactor * rms(J) * sqrt(mean degree)`` of the
+    Ising model of the QUBO as ``dwave.embedding.chain_strength``
+
+    Returns 1 for QUBOs without couplings.
+    """
+    coo = qubo.tocoo()
+    mask = coo.row != coo.col
+    keys = np.minimum(coo.row[mask], coo.col[mask]) * qubo.shape[0] + np.maximum(
+        coo.row[mask], coo.col[mask]
+    )
+    _, inverse = np.unique(keys, return_inverse=True)
+    J = np.bincount(inverse.ravel(), weights=coo.data[mask]) / 4.0
+    return _torque(J, qubo.shape[0], prefactor)
+
+
+class LocalEmbeddingComposite:
+    """Emulates ``dwave.system.FixedEmbeddingComposite`` on a ``LocalDWaveSampler``
+
+    Linear biases are split evenly over the chain, couplings evenly over all
+    couplers between two chains and qubits within a chain are bound by
+    ``chain_strength`` (Ising units as for D-Wave). Samples are unembedded by
+    majority vote, ties resolve to 1.
+
+    The embedded sparsity structure of each set of QUBO keys is computed once. Thus
+    requests which only change the biases, e.g., penalty sweeps, cost a few numpy
+    operations besides the anneal.
+
+    Arguments:
+        child_sampler: The sampler on the target graph.
+        embedding: Map from variables to chains of qubits.
+        cache_size: Maximal number of cached QUBO structures.
+    """
+
+    def __init__(
+            self,
+            child_sampler: LocalDWaveSampler,
+            embedding: Embedding,
+            cache_size: int = 1024,
+    ):
+        self.child = child_sampler
+        self.children = [child_sampler]
+        self.embedding = {v: list(chain) for v, chain in embedding.items()}
+        self.properties = {
+            "child_properties": child_sampler.properties.copy(),
+            "embedding": self.embedding,
+        }
+        self.parameters = child_sampler.parameters.copy()
+        self.parameters.update({"chain_strength": [], "chain_break_fraction": []})
+        self.cache_size = cache_size
+        self._structures: Dict[Tuple[Tuple[Hashable, Hashable], ...], _Structure] = {}
+
+    def _layout(self, variables: List[Hashable]) -> _Layout:
+        """Returns the chains of the variables and the couplers between and
+        within them
+        """
+        missing = [v for v in variables if v not in self.embedding]
+        if missing:
+            raise ValueError(f"Variables {missing} are not embedded")
+        chains = [self.embedding[v] for v in variables]
+        counts = np.array([len(chain) for chain in chains], dtype=int)
+        qubits = np.array([q for chain in chains for q in chain], dtype=int)
+        chain_of = np.repeat(np.arange(len(chains)), counts)
+        local = {q: idx for idx, q in enumerate(qubits.tolist())}
+        if len(local) != qubits.size:
+            raise ValueError("Chains of the embedding overlap")
+
+        rows, cols = [], []
+        for idx, q in enumerate(qubits.tolist()):
+            for p in self.child.adjacency[q]:
+                jdx = local.get(p)
+                if jdx is not None and idx < jdx:
+                    rows.append(idx)
+                    cols.append(jdx)
+        rows, cols = np.array(rows, dtype=int), np.array(cols, dtype=int)
+        intra = chain_of[rows] == chain_of[cols]
+        intra_rows, intra_cols = rows[intra], cols[intra]
+
+        rows, cols = rows[~intra], cols[~intra]
+        keys = np.minimum(chain_of[rows], chain_of[cols]) * len(chains) + np.maximum(
+            chain_of[rows], chain_of[cols]
+        )
+        order = np.argsort(keys, kind="stable")
+
+        return _Layout(
+            qubits=qubits,
+            counts=counts,
+            starts=np.cumsum(counts) - counts,
+            chain_of=chain_of,
+            inter_keys=keys[order],
+            inter_rows=rows[order],
+            inter_cols=cols[order],
+            intra_rows=intra_rows,
+            intra_cols=intra_cols,
+            intra_degree=np.bincount(intra_rows, minlength=qubits.size)
+            + np.bincount(intra_cols, minlength=qubits.size),
+        )
+
+    def _structure(self, keys: Tuple[Tuple[Hashable, Hashable], ...]) -> _Structure:
+        """Returns the (cached) embedded sparsity structure of the QUBO keys"""
+        if keys in self._structures:
+            return self._structures[keys]
+
+        variables = sorted({v for key in keys for v in key})
+        index = {v: idx for idx, v in enumerate(variables)}
+        layout = self._layout(variables)
+        n_variables = len(variables)
+        rows = np.array([index[u] for u, _ in keys], dtype=int)
+        cols = np.array([index[v] for _, v in keys], dtype=int)
+        diagonal = rows == cols
+
+        lo = np.minimum(rows[~diagonal], cols[~diagonal])
+        hi = np.maximum(rows[~diagonal], cols[~diagonal])
+        pair_keys = lo * n_variables + hi
+        _, pairs = np.unique(pair_keys, return_inverse=True)
+        start = np.searchsorted(layout.inter_keys, pair_keys, side="left")
+        n_couplers = np.searchsorted(layout.inter_keys, pair_keys, side="right") - start
+        if np.any(n_couplers == 0):
+            missing = n_couplers == 0
+            raise ValueError(
+                "No couplers between the chains of "
+                f"{[(variables[u], variables[v]) for u, v in zip(lo[missing], hi[missing])]}"
+            )
+        couplers = np.repeat(start - np.cumsum(n_couplers) + n_couplers, n_couplers)
+        couplers += np.arange(couplers.size)
+
+        # Symmetric couplings of inter chain (first) and intra chain couplers in csr
+        # order, the data of the upper triangle is repeated for the lower triangle
+        n_qubits = layout.qubits.size
+        upper_rows = np.concatenate([layout.inter_rows[couplers], layout.intra_rows])
+        upper_cols = np.concatenate([layout.inter_cols[couplers], layout.intra_cols])
+        W_rows = np.concatenate([upper_rows, upper_cols])
+        W_cols = np.concatenate([upper_cols, upper_rows])
+        order = np.lexsort((W_cols, W_rows))
+
+        structure = _Structure(
+            variables=variables,
+            layout=layout,
+            rows=rows,
+            cols=cols,
+            diagonal=diagonal,
+            pairs=pairs.ravel(),
+            n_couplers=n_couplers,
+            order=order,
+            W_rows=W_rows[order],
+            W_indices=W_cols[order],
+            W_indptr=np.concatenate(
+                [[0], np.cumsum(np.bincount(W_rows, minlength=n_qubits))]
+            ),
+        )
+        if len(self._structures) >= self.cache_size:
+            self._structures.clear()
+        self._structures[keys] = structure
+        return structure
+
+    def sample_qubo(
+            self,
+            Q: Union[Dict[Tuple[Hashable, Hashable], float], Any],
+            chain_strength: Optional[float] = None,
+            chain_break_fraction: bool = True,
+            initial_state: Optional[
+                Union[Dict[Hashable, int], List[Tuple[Hashable, int]]]
+            ] = None,
+            **params,
+    ) -> SampleSet:
+        """Samples the logical QUBO on the embedding
+
+        Arguments:
+            Q: The QUBO on the embedded variables.
+            chain_strength: Coupling of qubits within chains in Ising units.
+                Defaults to ``uniform_torque_compensation``.
+            chain_break_fraction: Add the fraction of broken chains to the samples.
+            initial_state: Bits of the variables as dict or ``(variable, bit)``
+                pairs. Applied to all qubits of the chain.
+            params: Parameters of the child sampler, see
+                ``LocalDWaveSampler.parameters``.
+
+        Raises:
+            ValueError: If the QUBO does not fit the embedding.
+        """
+        if issparse(Q) or not isinstance(Q, dict):
+            qubo, labels = _as_qubo(Q)
+            coo = qubo.tocoo()
+            Q = {
+                (labels[u], labels[v]): value
+                for u, v, value in zip(coo.row.tolist(), coo.col.tolist(), coo.data)
+            }
+        structure = self._structure(tuple(Q))
+        layout = structure.layout
+        values = np.fromiter(Q.values(), dtype=float, count=len(Q))
+        off_diagonal = values[~structure.diagonal]
+
+        if chain_strength is None:
+            J = np.bincount(structure.pairs, weights=off_diagonal) / 4.0
+            chain_strength = _torque(J, len(structure.variables), 1.414)
+        # Ising coupling -c s_p s_q equals 2 c (x_p + x_q - 2 x_p x_q) - c
+        penalty = 2.0 * chain_strength
+        linear = np.bincount(
+            structure.rows[structure.diagonal],
+            weights=values[structure.diagonal],
+            minlength=len(structure.variables),
+        )
+        diag = (
+            linear[layout.chain_of] / layout.counts[layout.chain_of]
+            + penalty * layout.intra_degree
+        )
+        upper = np.concatenate(
+            [
+                np.repeat(off_diagonal / structure.n_couplers, structure.n_couplers),
+                np.full(layout.intra_rows.size, -2.0 * penalty),
+            ]
+        )
+        data = np.concatenate([upper, upper])[structure.order]
+        beta_range = self.child.beta_range or _beta_range(
+            np.abs(diag)
+            + np.bincount(
+                structure.W_rows, weights=np.abs(data), minlength=layout.qubits.size
+            ),
+            np.concatenate([diag, upper]),
+        )
+
+        if initial_state is not None:
+            state = dict(initial_state)
+            initial_state = np.array([state[v] for v in structure.variables])[
+                layout.chain_of
+            ]
+        physical, occurrences, info = self.child._anneal(  # pylint: disable=W0212
+            structure.W_indptr,
+            structure.W_indices,
+            data,
+            diag,
+            layout.qubits,
+            beta_range,
+            initial_state=initial_state,
+            **params,
+        )
+
+        sums = (
+            np.add.reduceat(physical, layout.starts, axis=1, dtype=int)
+            if layout.qubits.size
+            else np.zeros((physical.shape[0], 0), dtype=int)
+        )
+        samples = (2 * sums >= layout.counts).astype(np.int8)
+        energies = (
+            samples[:, structure.rows] * samples[:, structure.cols]
+        ) @ values
+        vectors = {}
+        if chain_break_fraction:
+            broken = (sums > 0) & (sums < layout.counts)
+            vectors["chain_break_fraction"] = (
+                broken.mean(axis=1) if layout.counts.size else np.zeros(len(samples))
+            )
+        return SampleSet(
+            samples, energies, occurrences, structure.variables, info, vectors
+        )
@@ -325,6 +325,22 @@ def generate_limited_corona_graph(k: int, n: int):
     return ring, f"lC19({k},{n})"
 
 
+def graph_fingerprint(graph: Set[Tuple[int, int]], iterations: int = 3) -> str:
+    """Returns the Weisfeiler-Lehman hash of the graph.
+
+    Isomorphic graphs have the same fingerprint. Different fingerprints imply
+    non-isomorphic graphs, equal fingerprints must be confirmed by an isomorphism
+    check.
+
+    Arguments:
+        graph: The edges of the graph.
+        iterations: Number of Weisfeiler-Lehman refinements.
+    """
+    G = nx.Graph()
+    G.add_edges_from(tuple(edge) for edge in graph)
+    return nx.weisfeiler_lehman_graph_hash(G, iterations=iterations)
+
+
 def get_plot_mpl(
     graph: Set[Tuple[int]],
     color_nodes: Optional[List[int]] = None,
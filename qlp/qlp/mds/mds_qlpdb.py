@@ -1,148 +1,317 @@
 import numpy as np
 import hashlib
+from multiprocessing import Pool
+from queue import Queue
+from contextlib import closing
+from itertools import islice
+from time import sleep
 
 from minorminer import find_embedding
 from dwave.system.composites import FixedEmbeddingComposite
 
 import matplotlib.pyplot as plt
-import yaml
+import networkx as nx
+
+from qlp.mds import transformation
+from qlp.mds.graph_tools import graph_fingerprint
+
+
+OFFSET_FUNCTIONS = {}
+
+
+def register_offset(tag, label):
+    """Registers a vectorized anneal offset function under ``tag``
+
+    The function is called as ``fcn(h, offset_min, offset_range, graph_params)`` and
+    must support numpy broadcasting: ``h`` has shape (..., n_qubits) and
+    ``offset_min``, ``offset_range`` have shape (..., 1). Reductions over qubits
+    must use ``axis=-1, keepdims=True``.
+
+    .. code-block:: python
+
+        @register_offset("half", "Half_{offset_min}_{offset_range}")
+        def half(h, offset_min, offset_range, graph_params):
+            return 0.5 * (offset_min + offset_range) * np.ones_like(h)
+
+    Arguments:
+        tag: Name used in ``AnnealOffset(tag)``.
+        label: Format string of the offset tag with fields ``offset_min`` and
+            ``offset_range``.
+    """
+
+    def decorator(fcn):
+        OFFSET_FUNCTIONS[tag] = (fcn, label)
+        return fcn
+
+    return decorator
+
+
+def _max(h):
+    return np.max(h, axis=-1, keepdims=True)
+
+
+def _min(h):
+    return np.min(h, axis=-1, keepdims=True)
+
+
+def _hmid(h):
+    """Midpoint of the range of abs(h)"""
+    return (_max(abs(h)) - _min(abs(h))) * 0.5 + _min(abs(h))
+
+
+def _advanced(offset_min, offset_range):
+    """Offset moved by offset_range towards zero"""
+    return np.where(offset_min < 0, offset_min + offset_range, offset_min - offset_range)
+
+
+def _vertex_mask(graph_params):
+    return np.arange(graph_params["total_qubits"]) < graph_params["total_vertices"]
+
+
+@register_offset("advproblem", "FixEmbedding_AdvanceProblem_{offset_min}_{offset_range}")
+def _advproblem(h, offset_min, offset_range, graph_params):
+    return np.where(
+        _vertex_mask(graph_params), offset_min + offset_range, offset_min
+    )
+
+
+@register_offset(
+    "advconstraint", "FixEmbedding_AdvanceConstraint_{offset_min}_{offset_range}"
+)
+def _advconstraint(h, offset_min, offset_range, graph_params):
+    return np.where(
+        _vertex_mask(graph_params), offset_min, offset_min + offset_range
+    )
+
+
+@register_offset("constant", "FixEmbedding_Constant_{offset_min}_{offset_range}_v3_1")
+def _constant(h, offset_min, offset_range, graph_params):
+    return np.zeros(np.broadcast_shapes(h.shape, offset_min.shape))
+
+
+@register_offset("single_sided_binary", "FixEmbedding_Single_Sided_Binary_{offset_min}_z4")
+def _single_sided_binary(h, offset_min, offset_range, graph_params):
+    negative = offset_min < 0
+    return np.where(
+        abs(h) <= _hmid(h),
+        np.where(negative, offset_min, 0.0),
+        np.where(negative, 0.0, -1 * offset_min),
+    )
+
+
+@register_offset("binary", "FixEmbedding_Binary_{offset_min}_{offset_range}_z0")
+def _binary(h, offset_min, offset_range, graph_params):
+    return np.where(
+        abs(h) <= _hmid(h), offset_min, _advanced(offset_min, offset_range)
+    )
+
+
+@register_offset("test0", "test0")
+def _test0(h, offset_min, offset_range, graph_params):
+    return np.where(np.arange(2) == 0, offset_min, 0.0)
+
+
+@register_offset("test1", "test1")
+def _test1(h, offset_min, offset_range, graph_params):
+    return np.where(np.arange(2) == 1, offset_min, 0.0)
+
+
+@register_offset("negbinary", "FixEmbedding_NegBinary_{offset_min}_{offset_range}_v3_1")
+def _negbinary(h, offset_min, offset_range, graph_params):
+    return np.where(
+        abs(h) >= _hmid(h), offset_min, _advanced(offset_min, offset_range)
+    )
+
+
+@register_offset("shiftlinear", "FixEmbedding_ShiftLinear_{offset_min}_{offset_range}")
+def _shiftlinear(h, offset_min, offset_range, graph_params):
+    abshrange = _max(abs(h)) - _min(abs(h))
+    shiftnormh = (abs(h) - _min(abs(h))) / abshrange
+    return shiftnormh * offset_range + offset_min
+
+
+@register_offset(
+    "negshiftlinear", "FixEmbedding_NegShiftLinear_{offset_min}_{offset_range}"
+)
+def _negshiftlinear(h, offset_min, offset_range, graph_params):
+    abshrange = _max(abs(h)) - _min(abs(h))
+    invhnorm = -1 * (abs(h) - _max(abs(h))) / abshrange
+    return invhnorm * offset_range + offset_min
+
+
+@register_offset(
+    "signedshiftlinear", "FixEmbedding_SignedShiftLinear_{offset_min}_{offset_range}"
+)
+def _signedshiftlinear(h, offset_min, offset_range, graph_params):
+    normh = (h - _min(h)) / (_max(h) - _min(h))
+    return normh * offset_range + offset_min
+
+
+@register_offset(
+    "signednegshiftlinear",
+    "FixEmbedding_SignedNegShiftLinear_{offset_min}_{offset_range}",
+)
+def _signednegshiftlinear(h, offset_min, offset_range, graph_params):
+    shifth = -1 * (h - _max(h)) / (_max(h) - _min(h))
+    return shifth * offset_range + offset_min
+
+
+@register_offset("linear", "Linear_{offset_min}_{offset_range}")
+def _linear(h, offset_min, offset_range, graph_params):
+    hnorm = abs(h) / _max(abs(h))
+    return hnorm * offset_range * 0.9 + offset_min * 0.9
+
+
+@register_offset("neglinear", "Neglinear_{offset_min}_{offset_range}")
+def _neglinear(h, offset_min, offset_range, graph_params):
+    hnorm = abs(h) / _max(abs(h))
+    return -1.0 * hnorm * offset_range * 0.9 + offset_range + offset_min * 0.9
+
+
+@register_offset("signedlinear", "Signedlinear_{offset_min}_{offset_range}")
+def _signedlinear(h, offset_min, offset_range, graph_params):
+    hnorm = 0.5 * (1.0 + h / _max(abs(h)))
+    return hnorm * offset_range * 0.9 + offset_min * 0.9
+
+
+@register_offset("negsignedlinear", "Negsignedlinear_{offset_min}_{offset_range}")
+def _negsignedlinear(h, offset_min, offset_range, graph_params):
+    hnorm = 0.5 * (1.0 - h / _max(abs(h)))
+    return hnorm * offset_range * 0.9 + offset_min * 0.9
 
 
 class AnnealOffset:
     """https://docs.dwavesys.com/docs/latest/c_qpu_0.html#anneal-offsets
+
+    Offset functions are looked up in ``OFFSET_FUNCTIONS``,
+    see ``register_offset`` for adding new ones.
     """
 
     def __init__(self, tag, graph_params={}):
+        if tag not in OFFSET_FUNCTIONS:
+            raise KeyError(
+                f"Anneal offset {tag} not defined. Register it with"
+                " qlp.mds.mds_qlpdb.register_offset."
+            )
         self.tag = tag
         self.graph_params = graph_params
 
     def fcn(self, h, offset_min, offset_range):
-        h = np.array(h)
-        abshrange = max(abs(h)) - min(abs(h))
-        fullrange = max(h) - min(h)
-
-        if self.tag == "advproblem":
-            offset_tag = f"FixEmbedding_AdvanceProblem_{offset_min}_{offset_range}"
-            adv = offset_min + offset_range
-            offset_fcn = [adv for q in range(self.graph_params["total_vertices"])]
-            nconstraint = self.graph_params["total_qubits"] - self.graph_params["total_vertices"]
-            offset_constraint = [offset_min for q in range(nconstraint)]
-            offset_fcn.extend(offset_constraint)
-            return offset_fcn, offset_tag
-        if self.tag == "advconstraint":
-            offset_tag = f"FixEmbedding_AdvanceConstraint_{offset_min}_{offset_range}"
-            offset_fcn = [offset_min for q in range(self.graph_params["total_vertices"])]
-            adv = offset_min + offset_range
-            nconstraint = self.graph_params["total_qubits"] - self.graph_params["total_vertices"]
-            offset_constraint = [adv for q in range(nconstraint)]
-            offset_fcn.extend(offset_constraint)
-            return offset_fcn, offset_tag
-        if self.tag == "constant":
-            return (
-                np.zeros(len(h)),
-                f"FixEmbedding_Constant_{offset_min}_{offset_range}_v3_1",
-            )
-        if self.tag == "single_sided_binary":
-            offset_tag = f"FixEmbedding_Single_Sided_Binary_{offset_min}_z4"
-            offset_fcn = []
-            hmid = abshrange * 0.5 + min(abs(h))
-            for hi in h:
-                if abs(hi) <= hmid:
-                    if offset_min < 0:
-                        offset_fcn.append(offset_min)
-                    else:
-                        offset_fcn.append(0)
-                else:
-                    if offset_min < 0:
-                        offset_fcn.append(0)
-                    else:
-                        offset_fcn.append(-1*offset_min)
-            return offset_fcn, offset_tag
-        if self.tag == "binary":
-            offset_tag = f"FixEmbedding_Binary_{offset_min}_{offset_range}_z0"
-            offset_fcn = []
-            hmid = abshrange * 0.5 + min(abs(h))
-            for hi in h:
-                if abs(hi) <= hmid:
-                    offset_fcn.append(offset_min)
-                else:
-                    if offset_min < 0:
-                        offset_fcn.append(offset_min + offset_range)
-                    else:
-                        offset_fcn.append(offset_min - offset_range)
-            return offset_fcn, offset_tag
-        if self.tag == "test0":
-            offset_tag = "test0"
-            offset_fcn = [offset_min, 0]
-            return offset_fcn, offset_tag
-        if self.tag == "test1":
-            offset_tag = "test1"
-            offset_fcn = [0, offset_min]
-            return offset_fcn, offset_tag
-        if self.tag == "negbinary":
-            offset_tag = f"FixEmbedding_NegBinary_{offset_min}_{offset_range}_v3_1"
-            offset_fcn = []
-            hmid = abshrange * 0.5 + min(abs(h))
-            for hi in h:
-                if abs(hi) >= hmid:
-                    offset_fcn.append(offset_min)
-                else:
-                    if offset_min < 0:
-                        offset_fcn.append(offset_min + offset_range)
-                    else:
-                        offset_fcn.append(offset_min - offset_range)
-            return offset_fcn, offset_tag
-        if self.tag == "shiftlinear":
-            offset_tag = f"FixEmbedding_ShiftLinear_{offset_min}_{offset_range}"
-            absshifth = abs(h) - min(abs(h))
-            shiftnormh = absshifth / abshrange
-            offset_fcn = shiftnormh * offset_range + offset_min
-            return offset_fcn, offset_tag
-        if self.tag == "negshiftlinear":
-            offset_tag = f"FixEmbedding_NegShiftLinear_{offset_min}_{offset_range}"
-            invhnorm = -1 * (abs(h) - max(abs(h))) / abshrange
-            offset_fcn = invhnorm * offset_range + offset_min
-            return offset_fcn, offset_tag
-        if self.tag == "signedshiftlinear":
-            offset_tag = f"FixEmbedding_SignedShiftLinear_{offset_min}_{offset_range}"
-            shifth = h - min(h)
-            normh = shifth / fullrange
-            offset_fcn = normh * offset_range + offset_min
-            return offset_fcn, offset_tag
-        if self.tag == "signednegshiftlinear":
-            offset_tag = (
-                f"FixEmbedding_SignedNegShiftLinear_{offset_min}_{offset_range}"
-            )
-            shifth = -1 * (h - max(h)) / fullrange
-            offset_fcn = shifth * offset_range + offset_min
-            return offset_fcn, offset_tag
-        if self.tag == "linear":
-            offset_tag = f"Linear_{offset_min}_{offset_range}"
-            hnorm = abs(h) / max(abs(h))
-            offset_fcn = hnorm * offset_range * 0.9 + offset_min * 0.9
-            return offset_fcn, offset_tag
-        if self.tag == "neglinear":
-            hnorm = abs(h) / max(abs(h))
-            return (
-                -1.0 * hnorm * offset_range * 0.9 + offset_range + offset_min * 0.9,
-                f"Neglinear_{offset_min}_{offset_range}",
-            )
-        if self.tag == "signedlinear":
-            hnorm = 0.5 * (1.0 + h / max(abs(h)))
-            return (
-                hnorm * offset_range * 0.9 + offset_min * 0.9,
-                f"Signedlinear_{offset_min}_{offset_range}",
-            )
-        if self.tag == "negsignedlinear":
-            hnorm = 0.5 * (1.0 - h / max(abs(h)))
-            return (
-                hnorm * offset_range * 0.9 + offset_min * 0.9,
-                f"Negsignedlinear_{offset_min}_{offset_range}",
-            )
-        else:
-            print(
-                "Anneal offset not defined.\nDefine in AnnealOffset class inside qlp.mds.mds_qlpdb"
-            )
+        """Returns the offsets for each qubit and the offset tag"""
+        _, label = OFFSET_FUNCTIONS[self.tag]
+        offsets = self.batch(h, offset_min, offset_range)
+        return offsets, label.format(offset_min=offset_min, offset_range=offset_range)
+
+    def batch(self, h, offset_min, offset_range):
+        """Evaluates the offsets for batches of h and offset parameters in one call
+
+        Arguments:
+            h: Array of shape H + (n_qubits,).
+            offset_min, offset_range: Arrays of (broadcastable) shape P.
+
+        Returns:
+            Offsets of shape P + H + (n_qubits,).
+        """
+        fcn, _ = OFFSET_FUNCTIONS[self.tag]
+        h = np.asarray(h, dtype=float)
+        offset_min, offset_range = np.broadcast_arrays(
+            np.asarray(offset_min, dtype=float), np.asarray(offset_range, dtype=float)
+        )
+        params_shape = offset_min.shape
+        expand = (slice(None),) * len(params_shape) + (None,) * h.ndim
+        h_expand = h[(None,) * len(params_shape)]
+        offsets = fcn(
+            h_expand, offset_min[expand], offset_range[expand], self.graph_params
+        )
+        shape = np.broadcast_shapes(
+            offsets.shape, params_shape + h.shape[:-1] + (1,)
+        )
+        return np.array(np.broadcast_to(offsets, shape))
+
+
+def _offset_window(embedding, anneal_offset_ranges):
+    """Returns the offset range shared by all qubits of the embedding"""
+    embedding_idx = [idx for embed_list in embedding.values() for idx in embed_list]
+    ranges = anneal_offset_ranges[embedding_idx]
+    return ranges[:, 0].max(), ranges[:, 1].min()
+
+
+def _embedding_attempt(args):
+    """Runs ``find_embedding`` once
+
+    Returns ``(embedding, min_offset, max_offset)`` if the embedding leaves enough
+    offset range for inhomogeneous driving, else None.
+    """
+    (
+        qubo_dict,
+        qpu_graph,
+        anneal_offset_ranges,
+        target_min,
+        target_range,
+        seed,
+        embedding_kwargs,
+    ) = args
+    embedding = find_embedding(
+        qubo_dict, qpu_graph, random_seed=seed, **embedding_kwargs
+    )
+    if not embedding:
+        return None
+    min_offset, max_offset = _offset_window(embedding, anneal_offset_ranges)
+    if (target_range > max_offset - target_min) or (min_offset > target_min):
+        return None
+    return embedding, min_offset, max_offset
+
+
+def _embedding_score(result, target_min, target_range):
+    """Sort key of valid embeddings: longest chain, number of qubits and negative
+    offset headroom (smaller is better)
+    """
+    embedding, min_offset, max_offset = result
+    headroom = min(target_min - min_offset, max_offset - target_min - target_range)
+    chains = [len(chain) for chain in embedding.values()]
+    return max(chains), sum(chains), -headroom
+
+
+def _completed(function, tasks, n_processes):
+    """Yields ``function(task)`` in order of completion
+
+    At most ``n_processes`` tasks are in flight. Closing the generator terminates
+    the worker processes, so running tasks are stopped and no further tasks start.
+    """
+    tasks = iter(tasks)
+    if n_processes <= 1:
+        for task in tasks:
+            yield function(task)
+        return
+
+    results = Queue()
+    pool = Pool(processes=n_processes)
+
+    def submit(task):
+        pool.apply_async(
+            function,
+            (task,),
+            callback=lambda result: results.put((True, result)),
+            error_callback=lambda error: results.put((False, error)),
+        )
+
+    try:
+        n_pending = 0
+        for task in islice(tasks, n_processes):
+            submit(task)
+            n_pending += 1
+        while n_pending:
+            success, result = results.get()
+            n_pending -= 1
+            if not success:
+                raise result
+            for task in islice(tasks, 1):
+                submit(task)
+                n_pending += 1
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
 
 
 def retry_embedding(
@@ -153,56 +322,190 @@ def retry_embedding(
         target_min=-0.1,
         target_range=0.12,
         n_tries=100,
-        save=False, # save
+        save=False,
+        composite=FixedEmbeddingComposite,
+        n_processes=1,
+        best_of=1,
+        seed=None,
+        **embedding_kwargs,
 ):
+    """Searches an embedding with enough anneal offset range on all chains
+
+    Embedding attempts use different seeds and run over ``n_processes`` worker
+    processes. The search stops as soon as ``best_of`` embeddings satisfy
+    ``target_min`` and ``target_range``; of these, the one with the shortest longest
+    chain, fewest qubits and largest offset headroom is returned.
+
+    The embedded sampler is ``composite(sampler, embedding)``. Use
+    ``qlp.mds.emulator.LocalEmbeddingComposite`` with a ``LocalDWaveSampler`` to run
+    without an annealer.
+
+    Arguments:
+        graph_tag: Tag stored with new embeddings.
+        save: Look up the embedding in the qlpdb embedding store first and store
+            newly found embeddings, see ``get_stored_embedding``.
+        n_tries: Maximal number of embedding attempts.
+        n_processes: Number of worker processes.
+        best_of: Number of valid embeddings to compare.
+        seed: Seed for the seeds of the attempts.
+        embedding_kwargs: Options of ``minorminer.find_embedding``, e.g., ``timeout``.
+
+    Returns:
+        The embedded sampler, the embedding and the shared offset range of the
+        embedding or None if no attempt succeeded.
+    """
     def get_embed_min_max_offset(sampler, embedding):
-        embed = FixedEmbeddingComposite(sampler, embedding)
-        embedding_idx = [idx for embed_list in embedding.values() for idx in embed_list]
+        embed = composite(sampler, embedding)
         anneal_offset_ranges = np.array(
             embed.properties["child_properties"]["anneal_offset_ranges"]
         )
-        min_offset = max(
-            [offsets[0] for offsets in anneal_offset_ranges[embedding_idx]]
-        )
-        max_offset = min(
-            [offsets[1] for offsets in anneal_offset_ranges[embedding_idx]]
-        )
+        min_offset, max_offset = _offset_window(embedding, anneal_offset_ranges)
         return embed, min_offset, max_offset
     if save:
-        try:
-            with open(
-                    f"../qlp/qlp/mds/embeddings/{graph_tag}_{target_min}_{target_range}_v6.yaml", "r"
-            ) as file:
-                embedding = yaml.safe_load(file)
+        keys = (
+            qubo_structure_hash(qubo_dict),
+            target_graph_hash(sampler),
+            target_min,
+            target_range,
+        )
+        embedding = get_stored_embedding(*keys)
+        if embedding is not None:
             embed, min_offset, max_offset = get_embed_min_max_offset(sampler, embedding)
-            embedding_set = {k: set(embedding[k]) for k in embedding}
             return embed, embedding, min_offset, max_offset
-        except Exception as e:
-            print(e)
-            pass
 
-    for i in range(n_tries):
-        try:
-            embedding = find_embedding(qubo_dict, qpu_graph)
-            embed, min_offset, max_offset = get_embed_min_max_offset(sampler, embedding)
-            if (target_range > max_offset - target_min) or (min_offset > target_min):
-                raise ValueError(
-                    f"\n{target_range} > {max_offset - target_min}: Not enough offset range for inhomogeneous driving."
-                    f"\n{min_offset} > {target_min}: min_offset needs to be lower."
-                    "Try another embedding."
-                )
-            else:
-                if save:
-                    with open(
-                            f"../qlp/qlp/mds/embeddings/{graph_tag}_{target_min}_{target_range}_v6.yaml",
-                            "w",
-                    ) as file:
-                        safe_embed = {int(k): list(embedding[k]) for k in embedding}
-                        yaml.safe_dump(safe_embed, file)
-                return embed, embedding, min_offset, max_offset
-        except Exception as e:
-            # print(e)
-            continue
+    anneal_offset_ranges = np.array(sampler.properties["anneal_offset_ranges"])
+    seeds = np.random.default_rng(seed).integers(0, 2 ** 31 - 1, size=n_tries).tolist()
+    tasks = (
+        (
+            qubo_dict,
+            qpu_graph,
+            anneal_offset_ranges,
+            target_min,
+            target_range,
+            attempt_seed,
+            embedding_kwargs,
+        )
+        for attempt_seed in seeds
+    )
+    found = []
+    with closing(_completed(_embedding_attempt, tasks, n_processes)) as results:
+        for result in results:
+            if result is not None:
+                found.append(result)
+            if len(found) >= best_of:
+                break
+    if not found:
+        return None
+
+    embedding, min_offset, max_offset = min(
+        found, key=lambda result: _embedding_score(result, target_min, target_range)
+    )
+    if save:
+        store_embedding(
+            embedding,
+            *keys,
+            machine=sampler.properties.get("chip_id", ""),
+            min_offset=min_offset,
+            max_offset=max_offset,
+            tag=graph_tag,
+        )
+    return composite(sampler, embedding), embedding, min_offset, max_offset
+
+
+def _hash(obj):
+    """Returns the md5 hash of the white space free string of obj"""
+    return hashlib.md5(str(obj).replace(" ", "").encode("utf-8")).hexdigest()
+
+
+def _label(variable):
+    """Returns numpy scalars as python scalars for json"""
+    return variable.item() if hasattr(variable, "item") else variable
+
+
+def qubo_structure_hash(qubo_dict):
+    """Returns the md5 hash of the variables and couplings of the QUBO
+
+    Biases are ignored, thus QUBOs which only differ by the penalty share the hash.
+    """
+    variables = sorted({_label(v) for key in qubo_dict for v in key})
+    couplings = sorted(
+        {tuple(sorted(map(_label, key))) for key in qubo_dict if key[0] != key[1]}
+    )
+    return _hash([variables, couplings])
+
+
+def target_graph_hash(sampler):
+    """Returns the md5 hash of machine name and couplers of the sampler"""
+    properties = sampler.properties
+    couplers = sorted(tuple(sorted(coupler)) for coupler in properties["couplers"])
+    return _hash([properties.get("chip_id", ""), couplers])
+
+
+def get_stored_embedding(source_hash, target_hash, target_min, target_range):
+    """Returns the embedding stored in qlpdb for the hashes and offset targets
+
+    Arguments:
+        source_hash: See ``qubo_structure_hash``.
+        target_hash: See ``target_graph_hash``.
+        target_min, target_range: Offset targets of ``retry_embedding``.
+
+    Returns:
+        The embedding as dict or None if not present.
+    """
+    from qlpdb.embedding.models import Embedding as embedding_Embedding
+
+    entry = (
+        embedding_Embedding.objects.filter(
+            source_hash=source_hash,
+            target_hash=target_hash,
+            target_min=target_min,
+            target_range=target_range,
+        )
+        .only("embedding")
+        .first()
+    )
+    if entry is None:
+        return None
+    return {variable: chain for variable, chain in entry.embedding}
+
+
+def store_embedding(
+        embedding,
+        source_hash,
+        target_hash,
+        target_min,
+        target_range,
+        machine,
+        min_offset,
+        max_offset,
+        tag="",
+):
+    """Stores the embedding in qlpdb unless an entry with the same keys exists
+
+    Concurrent writers of the same keys are safe, all of them return the first
+    stored entry.
+    """
+    from qlpdb.embedding.models import Embedding as embedding_Embedding
+
+    chains = [[int(qubit) for qubit in chain] for chain in embedding.values()]
+    entry, _ = embedding_Embedding.objects.get_or_create(
+        source_hash=source_hash,
+        target_hash=target_hash,
+        target_min=target_min,
+        target_range=target_range,
+        defaults={
+            "tag": tag,
+            "machine": machine,
+            "embedding": [
+                [_label(variable), chain] for variable, chain in zip(embedding, chains)
+            ],
+            "min_offset": float(min_offset),
+            "max_offset": float(max_offset),
+            "max_chain_length": max(len(chain) for chain in chains),
+            "total_qubits": sum(len(chain) for chain in chains),
+        },
+    )
+    return entry
 
 
 def plot_anneal_offset(sampler):
@@ -244,43 +547,60 @@ def find_offset(h, fcn, embedding, offset_min, offset_range):
     return list(anneal_offset), tag, offset_list
 
 
-def insert_result(graph_params, experiment_params, data_params):
+def get_graph_entry(graph_params, save=True):
+    """Selects an isomorphic graph from the database or inserts a new one.
+
+    Candidates are restricted to graphs with the same Weisfeiler-Lehman
+    fingerprint and size, only those are checked for isomorphism.
+
+    Arguments:
+        graph_params: Graph summary as returned by `graph_summary`.
+        save: Insert the graph if no isomorphic graph exists. Else returns an
+            unsaved instance.
+    """
     from qlpdb.graph.models import Graph as graph_Graph
-    from qlpdb.experiment.models import DWaveExperiment as experiment_Experiment
-    from qlpdb.data.models import Data as data_Data
 
-    from networkx.readwrite.edgelist import parse_edgelist
-    from networkx.algorithms.isomorphism import is_isomorphic
-
-    def get_graph_entry(graph_params):
-        # select or insert row in graph
-        adjset0 = [f"{i[0]} {i[1]}" for i in graph_params["adjacency"]]
-        G0 = parse_edgelist(adjset0)
-
-        existing_graphs = graph_Graph.objects.filter(total_vertices=graph_params["total_vertices"])
-        for egraph in existing_graphs:
-            adjset = [f"{edge[0]} {edge[1]}" for edge in egraph.adjacency]
-            Gi = parse_edgelist(adjset)
-            if is_isomorphic(G0, Gi):
-                print("Return exising graph")
-                return egraph
-
-        graph, _ = graph_Graph.objects.get_or_create(
-            tag=graph_params["tag"],  # Tag for graph type (e.g. Hamming(n,m) or K(n,m))
-            total_vertices=graph_params[
-                "total_vertices"
-            ],  # Total number of vertices in graph
-            total_edges=graph_params["total_edges"],  # Total number of edges in graph
-            max_edges=graph_params["max_edges"],  # Maximum number of edges per vertex
-            adjacency=graph_params[
-                "adjacency"
-            ],  # Sorted adjacency matrix of dimension [N, 2]
-            adjacency_hash=graph_params[
-                "adjacency_hash"
-            ],  # md5 hash of adjacency list used for unique constraint
-        )
-        print("Creating new graph")
-        return graph
+    fields = ["tag", "total_vertices", "total_edges", "max_edges", "adjacency"]
+    params = {key: graph_params[key] for key in fields + ["adjacency_hash"]}
+    params["fingerprint"] = graph_params.get("fingerprint") or graph_fingerprint(
+        graph_params["adjacency"]
+    )
+
+    G0 = nx.Graph()
+    G0.add_edges_from(tuple(edge) for edge in params["adjacency"])
+    candidates = graph_Graph.objects.filter(
+        fingerprint=params["fingerprint"],
+        total_vertices=params["total_vertices"],
+        total_edges=params["total_edges"],
+    )
+    for egraph in candidates:
+        Gi = nx.Graph()
+        Gi.add_edges_from(tuple(edge) for edge in egraph.adjacency)
+        if nx.is_isomorphic(G0, Gi):
+            return egraph
+
+    if not save:
+        return graph_Graph(**params)
+
+    graph, _ = graph_Graph.objects.get_or_create(
+        tag=params["tag"],
+        adjacency_hash=params["adjacency_hash"],
+        defaults={key: params[key] for key in fields[1:] + ["fingerprint"]},
+    )
+    return graph
+
+
+def insert_result(graph_params, experiment_params, data_params, compact=False):
+    """Inserts the graph, experiment and samples of a D-Wave run.
+
+    Arguments:
+        graph_params: Graph summary as returned by `graph_summary`.
+        experiment_params: Experiment summary as returned by `experiment_summary`.
+        data_params: Sample summary as returned by `data_summary`.
+        compact: Store unique spin configurations with occurrence counts as
+            `Sample` entries instead of one `Data` entry per measurement.
+    """
+    from qlpdb.experiment.models import DWaveExperiment as experiment_Experiment
 
     graph = get_graph_entry(graph_params)
 
@@ -297,28 +617,138 @@ def insert_result(graph_params, experiment_params, data_params):
         tag=experiment_params["tag"],
     )
 
-    # select or insert row in data
-    for idx in range(len(data_params["spin_config"])):
-        measurement = data_Data.objects.filter(experiment=experiment).order_by(
-            "-measurement"
-        )
-        if measurement.exists():
-            measurement = measurement.first().measurement + 1
-        else:
-            measurement = 0
-        data, created = data_Data.objects.get_or_create(
-            experiment=experiment,  # Foreign Key to `experiment`
-            measurement=measurement,  # Increasing integer field labeling measurement number
-            spin_config=list(
-                data_params["spin_config"][idx]
-            ),  # Spin configuration of solution, limited to 0, 1
-            chain_break_fraction=9999, #data_params["chain_break_fraction"][idx],
-            energy=data_params["energy"][
-                idx
-            ],  # Energy corresponding to spin_config and QUBO
-            constraint_satisfaction=data_params["constraint_satisfaction"][idx],
+    if compact:
+        data = insert_samples(experiment, data_params)
+    else:
+        data = insert_data(experiment, data_params)
+    return data[-1] if data else None
+
+
+def _chain_break_fraction(data_params):
+    """Returns the chain break fractions of the samples, 9999 if not recorded."""
+    if "chain_break_fraction" in data_params:
+        return np.asarray(data_params["chain_break_fraction"], dtype=float)
+    return np.full(len(data_params["spin_config"]), 9999.0)
+
+
+def _locked_write(experiment, write, retries):
+    """Runs `write` in a transaction holding a row lock on the experiment.
+
+    On backends without row locks, a clash on a unique constraint or a locked
+    database rolls back and retries after a random backoff.
+    """
+    from django.db import IntegrityError, OperationalError, transaction
+    from qlpdb.experiment.models import Experiment as experiment_Experiment
+
+    for attempt in range(retries):
+        try:
+            with transaction.atomic():
+                experiment_Experiment.objects.select_for_update().get(pk=experiment.pk)
+                return write()
+        except (IntegrityError, OperationalError):
+            if attempt == retries - 1:
+                raise
+            sleep(np.random.uniform(0, 0.1 * 2 ** attempt))
+
+
+def insert_data(experiment, data_params, batch_size=1000, retries=5):
+    """Inserts all samples of an experiment in one transaction.
+
+    The experiment row is locked while the next block of measurement numbers is
+    reserved, so concurrent ingestion processes append consecutive blocks.
+
+    Arguments:
+        experiment: The experiment entry the samples belong to.
+        data_params: Sample summary as returned by `data_summary`.
+        batch_size: Number of rows per insert query.
+        retries: Number of attempts if the reserved block clashes.
+
+    Returns:
+        The list of inserted data entries.
+    """
+    from django.db.models import Max
+    from qlpdb.data.models import Data as data_Data
+
+    spin_config = np.asarray(data_params["spin_config"]).tolist()
+    energy = np.asarray(data_params["energy"], dtype=float).tolist()
+    satisfied = np.asarray(data_params["constraint_satisfaction"], dtype=bool).tolist()
+    chain_break_fraction = _chain_break_fraction(data_params).tolist()
+
+    def write():
+        last = data_Data.objects.filter(experiment=experiment).aggregate(
+            last=Max("measurement")
+        )["last"]
+        first = 0 if last is None else last + 1
+        data = [
+            data_Data(
+                experiment=experiment,
+                measurement=first + idx,
+                spin_config=spin_config[idx],
+                chain_break_fraction=chain_break_fraction[idx],
+                energy=energy[idx],
+                constraint_satisfaction=satisfied[idx],
+            )
+            for idx in range(len(spin_config))
+        ]
+        return data_Data.objects.bulk_create(data, batch_size=batch_size)
+
+    return _locked_write(experiment, write, retries)
+
+
+def insert_samples(experiment, data_params, batch_size=1000, retries=5):
+    """Inserts the unique spin configurations of an experiment with occurrence counts.
+
+    Configurations already stored for the experiment are merged: occurrences add
+    up and chain break statistics are combined.
+
+    Arguments:
+        experiment: The experiment entry the samples belong to.
+        data_params: Sample summary as returned by `data_summary`.
+        batch_size: Number of rows per insert or update query.
+        retries: Number of attempts if concurrent writers clash.
+
+    Returns:
+        The list of inserted or updated samples.
+    """
+    from qlpdb.data.models import Sample as data_Sample
+
+    samples = data_Sample.aggregate(
+        experiment,
+        data_params["spin_config"],
+        data_params["energy"],
+        data_params["constraint_satisfaction"],
+        _chain_break_fraction(data_params),
+    )
+
+    def write():
+        existing = {
+            bytes(sample.spin_config): sample
+            for sample in data_Sample.objects.filter(experiment=experiment)
+        }
+        created, updated = [], []
+        for sample in samples:
+            stored = existing.get(bytes(sample.spin_config))
+            if stored is None:
+                created.append(sample)
+                continue
+            occurrences = stored.occurrences + sample.occurrences
+            stored.chain_break_fraction = (
+                stored.chain_break_fraction * stored.occurrences
+                + sample.chain_break_fraction * sample.occurrences
+            ) / occurrences
+            stored.max_chain_break_fraction = max(
+                stored.max_chain_break_fraction, sample.max_chain_break_fraction
+            )
+            stored.occurrences = occurrences
+            updated.append(stored)
+        data_Sample.objects.bulk_update(
+            updated,
+            ["occurrences", "chain_break_fraction", "max_chain_break_fraction"],
+            batch_size=batch_size,
         )
-    return data
+        return updated + data_Sample.objects.bulk_create(created, batch_size=batch_size)
+
+    return _locked_write(experiment, write, retries)
 
 
 def graph_summary(tag, graph, qubo):
@@ -346,6 +776,7 @@ def graph_summary(tag, graph, qubo):
     params["adjacency_hash"] = hashlib.md5(
         str(np.sort(list(graph))).replace(" ", "").encode("utf-8")
     ).hexdigest()
+    params["fingerprint"] = graph_fingerprint(graph)
     return params
 
 
@@ -372,7 +803,8 @@ def data_summary(raw, graph_params, experiment_params):
     params["energy"] = (
             raw["energy"].values + experiment_params["p"] * graph_params["total_vertices"]
     )
-    #params["chain_break_fraction"] = raw["chain_break_fraction"].values
+    if "chain_break_fraction" in raw:
+        params["chain_break_fraction"] = raw["chain_break_fraction"].values
     params["constraint_satisfaction"] = np.equal(
         params["energy"],
         np.sum(np.array(params["spin_config"])[:, : graph_params["total_vertices"]], axis=1),
@@ -381,19 +813,12 @@ def data_summary(raw, graph_params, experiment_params):
 
 
 def QUBO_to_Ising(Q):
-    q = np.diagonal(Q)
-    QD = np.copy(Q)
-    for i in range(len(QD)):
-        QD[i, i] = 0.0
-    QQ = np.copy(QD + np.transpose(QD))
-    J = np.triu(QQ) / 4.0
-    uno = np.ones(len(QQ))
-    h = q / 2 + np.dot(QQ, uno) / 4
-    g = np.dot(uno, np.dot(QD, uno)) / 4.0 + np.dot(q, uno) / 2.0
-    # 0-1 basis transform
-    h=(-1)*h
-    return (J, h, g)
+    """Maps QUBO to Ising model in the simulator basis, see qlp.mds.transformation
+    """
+    return transformation.QUBO_to_Ising(Q, basis="simulator")
+
 
 def Ising_to_QUBO(J, h):
-    Q = None
-    return Q
+    """Maps Ising model in the simulator basis to QUBO, see qlp.mds.transformation
+    """
+    return transformation.Ising_to_QUBO(J, h, basis="simulator")
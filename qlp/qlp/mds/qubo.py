@@ -1,55 +1,100 @@
 """Tools to generate a Minimum Dominating Set QUBO from a graph
 """
-from typing import Set, Tuple, List, Optional
-from scipy.sparse import dok_matrix, bmat, triu, tril
+from typing import Set, Tuple, List, Optional, Union, Dict
+from scipy.sparse import (
+    bmat,
+    triu,
+    tril,
+    csr_matrix,
+    identity,
+    diags,
+    spmatrix,
+)
 import numpy as np
 
+from qlp.mds.transformation import QUBO_to_Ising
 
-def get_adjacency(graph: Set[Tuple[int]], directed: bool = False) -> dok_matrix:
-    """This routine computes the adjecency matrix for a given graph.
+Graph = Union[Set[Tuple[int]], np.ndarray]
+SparseQubo = Union[spmatrix, Dict[Tuple[int, int], float]]
 
-    It assumes the graph is connected and nodes are labeled from 0...N-1.
-    Self loops are forbidden.
+
+def to_format(matrix: spmatrix, format: str) -> SparseQubo:  # pylint: disable=W0622
+    """Converts a sparse matrix to the requested format
 
     Arguments:
-        graph: The graph. If the graph is directed, first entry points to second.
-        directed: Whether or not this is a directed graph. If not directed, the graph
-            is symmeterized.
+        matrix: The sparse matrix.
+        format: One of "csr", "csc", "coo", "dok" or "dict". The latter returns
+            ``{(row, col): value}`` for all non-zero entries.
 
+    Raises:
+        KeyError: If the format is not reckognized
     """
-    if not isinstance(graph, set):
-        raise TypeError("Graph must be a set of tuples")
+    if format == "dict":
+        coo = matrix.tocoo()
+        return {
+            (row, col): val
+            for row, col, val in zip(coo.row.tolist(), coo.col.tolist(), coo.data.tolist())
+        }
+    if format in ("csr", "csc", "coo", "dok"):
+        return matrix.asformat(format)
+    raise KeyError(f"Format {format} not reckognized")
+
 
-    nodes = set()
-    adj = dict()
+def get_edges(graph: Graph) -> Tuple[np.ndarray, np.ndarray, int]:
+    """Returns edges as arrays of node indices and the number of nodes
 
-    for v1, v2 in graph:
-        if v1 == v2:
-            raise KeyError(f"Self loops are not allowed (v={v1}).")
+    Nodes are relabeled to 0...N-1 according to their sorted labels.
 
-        nodes.add(v1)
-        nodes.add(v2)
-        adj[(v1, v2)] = 1
+    Arguments:
+        graph: The graph as a set of tuples or an array of shape (n_edges, 2).
+
+    Raises:
+        TypeError: If the graph is neither a set nor an array.
+        KeyError: If the graph contains self loops.
+    """
+    if isinstance(graph, set):
+        edges = np.array(list(graph)).reshape(-1, 2)
+    elif isinstance(graph, np.ndarray) and graph.ndim == 2 and graph.shape[1] == 2:
+        edges = graph
+    else:
+        raise TypeError("Graph must be a set of tuples or an array of shape (n_edges, 2)")
+
+    loops = edges[:, 0] == edges[:, 1]
+    if np.any(loops):
+        raise KeyError(f"Self loops are not allowed (v={edges[loops][0, 0]}).")
 
-    nodes = {key: idx for idx,key in enumerate(sorted(list(nodes)))}
-    n_nodes = len(nodes)
+    labels, idx = np.unique(edges, return_inverse=True)
+    idx = idx.reshape(-1, 2)
+    return idx[:, 0], idx[:, 1], labels.size
 
-    # if nodes != list(range(n_nodes)):
-    #    raise KeyError("Nodes must be from 0 ... n_nodes")
 
-    adjacency = dok_matrix((n_nodes, n_nodes), dtype=int)
-    for (v1, v2), val in adj.items():
-        adjacency[(nodes[v1], nodes[v2])] = val
-        if not directed: #huh?
-            adjacency[(nodes[v2], nodes[v1])] = val
+def get_adjacency(
+        graph: Graph, directed: bool = False, format: str = "dok"  # pylint: disable=W0622
+) -> SparseQubo:
+    """This routine computes the adjecency matrix for a given graph.
 
-    if not all([val == 1 for val in adjacency.values()]):
-        raise KeyError("Double entries in graph")
+    It assumes the graph is connected and nodes are labeled from 0...N-1.
+    Self loops are forbidden. Repeated edges are counted once.
 
-    return adjacency
+    Arguments:
+        graph: The graph. If the graph is directed, first entry points to second.
+            Either a set of tuples or an array of shape (n_edges, 2).
+        directed: Whether or not this is a directed graph. If not directed, the graph
+            is symmeterized.
+        format: Output format, see ``to_format``.
+    """
+    rows, cols, n_nodes = get_edges(graph)
+    if not directed:
+        rows, cols = np.concatenate([rows, cols]), np.concatenate([cols, rows])
+    flat = np.unique(rows.astype(np.int64) * n_nodes + cols)
+    adjacency = csr_matrix(
+        (np.ones(flat.size, dtype=int), (flat // n_nodes, flat % n_nodes)),
+        shape=(n_nodes, n_nodes),
+    )
+    return to_format(adjacency, format)
 
 
-def get_bitmap(n_neigbors: List[int]) -> dok_matrix:
+def get_bitmap(n_neigbors: List[int], format: str = "dok") -> SparseQubo:  # pylint: disable=W0622
     r"""Computes the map of slack-bits to slack integers.
 
     This matrix B maps the bit vector b to slack variables s.
@@ -63,90 +108,208 @@ def get_bitmap(n_neigbors: List[int]) -> dok_matrix:
 
     Arguments:
         n_neigbors: The number of neighbors for each vertex.
+        format: Output format, see ``to_format``.
     """
-    n_nodes = len(n_neigbors)
+    n_neigbors = np.asarray(n_neigbors)
+    n_nodes = n_neigbors.size
 
     # Figure out how many bits we need for each neighborhood
-    n_bits = np.array(
-        [np.floor(np.log2(nn) + 1).astype(int) if nn > 0 else 0 for nn in n_neigbors]
+    n_bits = np.where(
+        n_neigbors > 0, np.floor(np.log2(np.maximum(n_neigbors, 1)) + 1), 0
+    ).astype(int)
+    total = int(n_bits.sum())
+    rows = np.repeat(np.arange(n_nodes), n_bits)
+    power = np.arange(total) - np.repeat(np.cumsum(n_bits) - n_bits, n_bits)
+    bitmap = csr_matrix(
+        (2 ** power, (rows, np.arange(total))), shape=(n_nodes, total), dtype=int
     )
-    bitmap = dok_matrix((n_nodes, int(n_bits.sum())), dtype=int)
+    return to_format(bitmap, format)
 
-    acc = 0
-    for v, n_bit in enumerate(n_bits):
-        for n in range(n_bit):
-            bitmap[(v, acc)] = 2 ** n
-            acc += 1
 
-    return bitmap
+class PenaltyQubo:
+    """QUBO which is affine in the penalty ``Q(p) = Q_obj + p Q_pen``
 
+    Both components share one CSR sparsity structure such that ``Q(p)`` for any ``p``
+    costs one axpy of the data arrays.
 
-def get_mds_qubo(
-    graph: Set[Tuple[int]],
+    .. code-block:: python
+
+        mds_qubo = get_mds_penalty_qubo(graph, triangularize=True)
+        qubo_dict = mds_qubo.dict(penalty=5)
+        J, h, offset = mds_qubo.ising(np.arange(1, 10))
+
+    Attributes:
+        indices, indptr: array
+            Shared CSR structure.
+        objective, penalty: array
+            CSR data of the objective and penalty component.
+        shape: Tuple[int, int]
+            Shape of the QUBO.
+        default_penalty: int
+            Penalty used if None is given.
+    """
+
+    def __init__(
+            self, objective: spmatrix, penalty: spmatrix, default_penalty: int = 1
+    ):
+        """Aligns both components on the union of their sparsity structures"""
+        objective, penalty = csr_matrix(objective), csr_matrix(penalty)
+        for component in (objective, penalty):
+            component.sum_duplicates()
+            component.eliminate_zeros()
+        self.shape = objective.shape
+        pattern = csr_matrix((objective != 0) + (penalty != 0))
+        pattern.sum_duplicates()
+        self.indices = pattern.indices
+        self.indptr = pattern.indptr
+
+        def flat(matrix):
+            rows = np.repeat(np.arange(self.shape[0]), np.diff(matrix.indptr))
+            return rows.astype(np.int64) * self.shape[1] + matrix.indices
+
+        keys = flat(pattern)
+        self.objective = np.zeros(keys.size, dtype=objective.dtype)
+        self.objective[np.searchsorted(keys, flat(objective))] = objective.data
+        self.penalty = np.zeros(keys.size, dtype=penalty.dtype)
+        self.penalty[np.searchsorted(keys, flat(penalty))] = penalty.data
+        self.default_penalty = default_penalty
+
+    def data(self, penalty=None) -> np.ndarray:
+        """Returns CSR data of ``Q(p)``, of shape (len(p), nnz) for arrays of ``p``"""
+        penalty = self.default_penalty if penalty is None else penalty
+        if np.ndim(penalty) == 0:
+            return self.objective + penalty * self.penalty
+        return self.objective[None, :] + np.asarray(penalty)[:, None] * self.penalty
+
+    def csr(self, penalty=None) -> Union[csr_matrix, List[csr_matrix]]:
+        """Returns ``Q(p)`` as CSR matrix or a list of those for arrays of ``p``
+
+        Matrices keep the shared structure, i.e., may contain explicit zeros.
+        """
+        data = self.data(penalty)
+        if data.ndim == 1:
+            return csr_matrix((data, self.indices, self.indptr), shape=self.shape)
+        return [
+            csr_matrix((row, self.indices, self.indptr), shape=self.shape)
+            for row in data
+        ]
+
+    def dict(self, penalty=None) -> Dict[Tuple[int, int], float]:
+        """Returns the non-zero entries of ``Q(p)`` as ``{(row, col): value}``"""
+        if np.ndim(penalty) != 0:
+            raise TypeError("Penalty must be a scalar.")
+        qubo = self.csr(penalty)
+        qubo.eliminate_zeros()
+        return to_format(qubo, "dict")
+
+    def ising(
+            self, penalty=None
+    ) -> Tuple[Union[csr_matrix, List[csr_matrix]], np.ndarray, np.ndarray]:
+        """Returns the Ising model (J, h, offset) of ``Q(p)``, see ``QUBO_to_Ising``
+
+        As the map is linear, only the two components are converted and combined.
+        For arrays of ``p``, J is a list and h and offset have a leading penalty axis.
+        """
+        penalty = self.default_penalty if penalty is None else penalty
+        J_obj, h_obj, offset_obj = QUBO_to_Ising(self.csr(0))
+        J_pen, h_pen, offset_pen = QUBO_to_Ising(
+            csr_matrix((self.penalty, self.indices, self.indptr), shape=self.shape)
+        )
+        if np.ndim(penalty) == 0:
+            return (
+                J_obj + penalty * J_pen,
+                h_obj + penalty * h_pen,
+                offset_obj + penalty * offset_pen,
+            )
+        penalty = np.asarray(penalty)
+        return (
+            [J_obj + p * J_pen for p in penalty],
+            h_obj[None, :] + penalty[:, None] * h_pen[None, :],
+            offset_obj + penalty * offset_pen,
+        )
+
+
+def get_mds_penalty_qubo(
+    graph: Graph,
     directed: bool = False,
     triangularize: bool = False,
-    penalty: Optional[int] = None,
     dtype: str = "i",
-) -> dok_matrix:
-    """This routine computes Minimum Dominating Set QUBO for a given graph.
-
-    It assumes the graph is connected and nodes are labeled from 0...N-1.
-    Self loops are forbidden.
+) -> PenaltyQubo:
+    """Computes the Minimum Dominating Set QUBO as function of the penalty.
 
-    Arguments:
-        graph: The graph. If the graph is directed, first entry points to second.
-        directed: Whether or not this is a directed graph.
-        triangularize: Put lower triangular entries in the upper diagonal.
-        penalty: Energy penalty for violating constraints. Defaults to `n_nodes + 1`.
-        dtype: Data type of qubo arrays. Defaults to "i" (integer). Float is "d".
+    Adjacency and bitmaps are computed once. See ``get_mds_qubo`` for the arguments.
+    The default penalty of the returned object is `n_nodes + 1`.
     """
 
     ## This is J
-    adjacency = get_adjacency(graph, directed=directed).astype(dtype)
+    adjacency = get_adjacency(graph, directed=directed, format="csr").astype(dtype)
+    n_nodes = adjacency.shape[0]
 
     ## Id in x-space
-    one = dok_matrix(adjacency.shape, dtype=dtype)
-    for n in range(adjacency.shape[0]):
-        one[(n, n)] = 1
+    one = identity(n_nodes, dtype=dtype, format="csr")
 
     ## |J| (note that this is different than the n_neighbors)
-    adjacency_sum = adjacency.sum(axis=0).flatten().tolist()[0]
+    adjacency_sum = np.asarray(adjacency.sum(axis=0)).flatten()
 
     ## diag(|N|)
-    diag_neighbor = dok_matrix(adjacency.shape, dtype=dtype)
-    for n, el in enumerate(adjacency_sum):
-        diag_neighbor[(n, n)] = el
+    diag_neighbor = diags(adjacency_sum, format="csr", dtype=dtype)
 
     ## T (note that this is different than the adjacency_sum)
-    n_neigbors = adjacency.sum(axis=1).flatten().tolist()[0]
-    bitmap = get_bitmap(n_neigbors).astype(dtype)
-    n_bits = bitmap.shape[1]
+    n_neigbors = np.asarray(adjacency.sum(axis=1)).flatten()
+    bitmap = get_bitmap(n_neigbors, format="csr").astype(dtype)
 
     ## diag(|T|)
-    diag_bitmap = dok_matrix((n_bits, n_bits), dtype=dtype)
-    for n, el in enumerate(bitmap.sum(axis=0).tolist()[0]):
-        diag_bitmap[(n, n)] = el
+    diag_bitmap = diags(
+        np.asarray(bitmap.sum(axis=0)).flatten(), format="csr", dtype=dtype
+    )
 
     ## Compute QUBO components
     q_xx = adjacency.T @ adjacency + adjacency + adjacency.T - 2 * diag_neighbor - one
     q_xs = -2 * (one + adjacency.T) @ bitmap
     q_ss = bitmap.T @ bitmap + 2 * diag_bitmap
 
-    ## Multiply by penalty factor
-    penalty = penalty or len(n_neigbors) + 1
-    q_xx *= penalty
-    q_xs *= penalty
-    q_ss *= penalty
+    ## Construct penalty term and minimization condition
+    q_pen = bmat([[q_xx, q_xs], [None, q_ss]], format="csr")
+    q_obj = bmat([[one, None], [None, csr_matrix(q_ss.shape, dtype=dtype)]], format="csr")
 
-    ## Add in minimization condition
-    q_xx += one
+    if triangularize:
+        q_pen = (triu(q_pen) + tril(q_pen, -1).T).tocsr()
+    q_pen.eliminate_zeros()
+    q_obj.eliminate_zeros()
+    return PenaltyQubo(q_obj, q_pen, default_penalty=n_nodes + 1)
 
-    ## Construt QUBO
-    q = bmat([[q_xx, q_xs], [None, q_ss]])
 
-    if triangularize:
-        q = triu(q) + tril(q, -1).T
-    return q.todok()
+def get_mds_qubo(
+    graph: Graph,
+    directed: bool = False,
+    triangularize: bool = False,
+    penalty: Optional[int] = None,
+    dtype: str = "i",
+    format: str = "dok",  # pylint: disable=W0622
+) -> SparseQubo:
+    """This routine computes Minimum Dominating Set QUBO for a given graph.
+
+    It assumes the graph is connected and nodes are labeled from 0...N-1.
+    Self loops are forbidden.
+    All blocks are assembled as sparse matrices, thus the cost scales linearly with
+    the number of edges (for bounded degree).
+    For penalty sweeps, use ``get_mds_penalty_qubo``.
+
+    Arguments:
+        graph: The graph. If the graph is directed, first entry points to second.
+            Either a set of tuples or an array of shape (n_edges, 2).
+        directed: Whether or not this is a directed graph.
+        triangularize: Put lower triangular entries in the upper diagonal.
+        penalty: Energy penalty for violating constraints. Defaults to `n_nodes + 1`.
+        dtype: Data type of qubo arrays. Defaults to "i" (integer). Float is "d".
+        format: Output format, see ``to_format``. Use "csr" or "dict" for large graphs.
+    """
+    mds_qubo = get_mds_penalty_qubo(
+        graph, directed=directed, triangularize=triangularize, dtype=dtype
+    )
+    q = mds_qubo.csr(penalty or None)
+    q.eliminate_zeros()
+    return to_format(q, format)
 
 
 def main(col_wrap: int = 4):  # pylint: disable=R0914
@@ -210,20 +373,5 @@ def main(col_wrap: int = 4):  # pylint: disable=R0914
     plt.show()
 
 
-def QUBO_to_Ising(Q):
-    """Maps QUBO to Ising model
-    """
-    q = np.diagonal(Q)
-    QD = np.copy(Q)
-    for i in range(len(QD)):
-        QD[i, i] = 0.0
-    QQ = np.copy(QD + np.transpose(QD))
-    J = np.triu(QQ) / 4.0
-    uno = np.ones(len(QQ))
-    h = q / 2 + np.dot(QQ, uno) / 4
-    g = np.dot(uno, np.dot(QD, uno)) / 4.0 + np.dot(q, uno) / 2.0
-    return (J, h, g)
-
-
 if __name__ == "__main__":
     main()
@@ -0,0 +1,426 @@
+"""Classical multi-replica samplers for QUBOs.
+
+Simulated annealing and parallel tempering with single-flip Metropolis updates run
+in numba kernels over the CSR structure of the QUBO. Replicas are distributed over
+cores and each replica has its own seeded random number stream, thus results are
+reproducible independent of the number of threads.
+
+.. code-block:: python
+
+    qubo = get_mds_qubo(graph, triangularize=True, format="csr")
+    sampleset = SimulatedAnnealingSampler().sample_qubo(qubo, num_reads=1000, seed=1)
+    raw = sampleset.to_pandas_dataframe()
+"""
+from typing import Dict, Any, List, Optional, Tuple, Union, Hashable
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from numba import jit, prange
+from scipy.sparse import csr_matrix, issparse
+
+Sample = namedtuple("Sample", ["sample", "energy", "num_occurrences"])
+
+
+@lru_cache(maxsize=None)
+def _sample_type(vectors: Tuple[str, ...]) -> type:
+    """Returns the named tuple type of samples with extra fields ``vectors``"""
+    if not vectors:
+        return Sample
+    return namedtuple("Sample", Sample._fields + vectors)
+
+
+@jit(nopython=True)
+def _splitmix(seed: np.uint64) -> np.uint64:
+    """Scrambles a seed into a non-zero random state"""
+    z = seed + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    z = z ^ (z >> np.uint64(31))
+    return z if z != np.uint64(0) else np.uint64(1)
+
+
+@jit(nopython=True)
+def _random(rng: np.ndarray) -> float:
+    """Returns a uniform random number in [0, 1) from a xorshift64* state"""
+    x = rng[0]
+    x ^= x >> np.uint64(12)
+    x ^= x << np.uint64(25)
+    x ^= x >> np.uint64(27)
+    rng[0] = x
+    return float((x * np.uint64(2685821657736338717)) >> np.uint64(11)) * (
+        1.0 / 9007199254740992.0
+    )
+
+
+@jit(nopython=True)
+def _fields(indptr, indices, data, x) -> np.ndarray:
+    """Returns the local fields ``W x``"""
+    n = x.size
+    field = np.zeros(n)
+    for i in range(n):
+        for k in range(indptr[i], indptr[i + 1]):
+            field[i] += data[k] * x[indices[k]]
+    return field
+
+
+@jit(nopython=True)
+def _sweep(indptr, indices, data, diag, beta, x, field, rng) -> float:
+    """Metropolis sweep over all bits, returns the energy change
+
+    ``beta`` has one entry shared by all bits or one entry per bit.
+    """
+    change = 0.0
+    uniform = beta.size == 1
+    for i in range(x.size):
+        sign = 1.0 - 2.0 * x[i]
+        delta = sign * (diag[i] + field[i])
+        b = beta[0] if uniform else beta[i]
+        if delta <= 0.0 or _random(rng) < np.exp(-b * delta):
+            x[i] = 1 - x[i]
+            change += delta
+            for k in range(indptr[i], indptr[i + 1]):
+                field[indices[k]] += sign * data[k]
+    return change
+
+
+@jit(nopython=True, parallel=True)
+def _simulated_annealing(indptr, indices, data, diag, betas, states, seeds):
+    """Anneals each replica (row of ``states``) through ``betas`` in place
+
+    ``betas`` has shape (n_sweeps, 1) or (n_sweeps, n) for bit dependent schedules.
+    """
+    for r in prange(states.shape[0]):  # pylint: disable=E1133
+        rng = np.array([_splitmix(seeds[r])], dtype=np.uint64)
+        x = states[r]
+        field = _fields(indptr, indices, data, x)
+        for sweep in range(betas.shape[0]):
+            _sweep(indptr, indices, data, diag, betas[sweep], x, field, rng)
+
+
+@jit(nopython=True, parallel=True)
+def _parallel_tempering(indptr, indices, data, diag, betas, n_sweeps, states, seeds):
+    """Runs parallel tempering for each chain of ``states`` (chains, betas, n)
+
+    The state at the largest beta is ``states[:, -1]``.
+    """
+    n_temperatures = betas.size
+    for c in prange(states.shape[0]):  # pylint: disable=E1133
+        rng = np.array([_splitmix(seeds[c])], dtype=np.uint64)
+        fields = np.zeros(states.shape[1:])
+        energies = np.zeros(n_temperatures)
+        for t in range(n_temperatures):
+            fields[t] = _fields(indptr, indices, data, states[c, t])
+            for i in range(states.shape[2]):
+                energies[t] += states[c, t, i] * (diag[i] + 0.5 * fields[t, i])
+        for _ in range(n_sweeps):
+            for t in range(n_temperatures):
+                energies[t] += _sweep(
+                    indptr,
+                    indices,
+                    data,
+                    diag,
+                    betas[t : t + 1],
+                    states[c, t],
+                    fields[t],
+                    rng,
+                )
+            for t in range(n_temperatures - 1):
+                log_accept = (betas[t + 1] - betas[t]) * (energies[t + 1] - energies[t])
+                if log_accept >= 0.0 or _random(rng) < np.exp(log_accept):
+                    for i in range(states.shape[2]):
+                        tmp = states[c, t, i]
+                        states[c, t, i] = states[c, t + 1, i]
+                        states[c, t + 1, i] = tmp
+                        tmp_field = fields[t, i]
+                        fields[t, i] = fields[t + 1, i]
+                        fields[t + 1, i] = tmp_field
+                    tmp_energy = energies[t]
+                    energies[t] = energies[t + 1]
+                    energies[t + 1] = tmp_energy
+
+
+class SampleSet:
+    """Samples with energies and occurrences, mirroring the parts of
+    ``dimod.SampleSet`` used in this package.
+
+    Attributes:
+        variables: List of variable labels.
+        record: Structured array with fields "sample", "energy", "num_occurrences"
+            and one field per extra vector, e.g., "chain_break_fraction".
+        info: Dict of sampler information.
+    """
+
+    def __init__(
+            self,
+            samples: np.ndarray,
+            energies: np.ndarray,
+            num_occurrences: Optional[np.ndarray] = None,
+            variables: Optional[List[Hashable]] = None,
+            info: Optional[Dict[str, Any]] = None,
+            vectors: Optional[Dict[str, np.ndarray]] = None,
+    ):
+        samples = np.atleast_2d(np.asarray(samples, dtype=np.int8))
+        if num_occurrences is None:
+            num_occurrences = np.ones(samples.shape[0], dtype=int)
+        vectors = vectors or {}
+        self.variables = (
+            list(range(samples.shape[1])) if variables is None else list(variables)
+        )
+        self.record = np.rec.fromarrays(
+            [samples, np.asarray(energies, dtype=float), np.asarray(num_occurrences)]
+            + [np.asarray(vector, dtype=float) for vector in vectors.values()],
+            dtype=[
+                ("sample", np.int8, (samples.shape[1],)),
+                ("energy", float),
+                ("num_occurrences", int),
+            ]
+            + [(name, float) for name in vectors],
+        )
+        self.info = info or {}
+
+    def __len__(self) -> int:
+        return self.record.size
+
+    def __iter__(self):
+        return iter(self.samples())
+
+    @property
+    def vectors(self) -> List[str]:
+        """Names of the per sample fields besides sample, energy and occurrences"""
+        return list(self.record.dtype.names[3:])
+
+    def _sample(self, idx: int) -> Sample:
+        """Returns the sample at record index ``idx`` as named tuple"""
+        values = [
+            dict(zip(self.variables, self.record.sample[idx].tolist())),
+            float(self.record.energy[idx]),
+            int(self.record.num_occurrences[idx]),
+        ] + [float(self.record[name][idx]) for name in self.vectors]
+        return _sample_type(tuple(self.vectors))(*values)
+
+    def _subset(self, idx: np.ndarray) -> "SampleSet":
+        """Returns the samples at record indices ``idx``"""
+        return SampleSet(
+            self.record.sample[idx],
+            self.record.energy[idx],
+            self.record.num_occurrences[idx],
+            self.variables,
+            self.info,
+            {name: self.record[name][idx] for name in self.vectors},
+        )
+
+    def samples(self) -> List[Dict[Hashable, int]]:
+        """Returns samples as dicts ordered by energy"""
+        order = np.argsort(self.record.energy, kind="stable")
+        return [dict(zip(self.variables, self.record.sample[idx].tolist())) for idx in order]
+
+    def data(self) -> List[Sample]:
+        """Returns (sample, energy, num_occurrences, *vectors) ordered by energy"""
+        order = np.argsort(self.record.energy, kind="stable")
+        return [self._sample(idx) for idx in order]
+
+    @property
+    def first(self) -> Sample:
+        """The sample with the lowest energy"""
+        return self._sample(int(np.argmin(self.record.energy)))
+
+    def aggregate(self) -> "SampleSet":
+        """Merges identical samples and sums their occurrences
+
+        Vectors are taken from the first occurrence of each sample.
+        """
+        samples, first, inverse = np.unique(
+            self.record.sample, axis=0, return_index=True, return_inverse=True
+        )
+        inverse = inverse.flatten()
+        occurrences = np.bincount(
+            inverse, weights=self.record.num_occurrences, minlength=samples.shape[0]
+        ).astype(int)
+        return SampleSet(
+            samples,
+            self.record.energy[first],
+            occurrences,
+            self.variables,
+            self.info,
+            {name: self.record[name][first] for name in self.vectors},
+        )
+
+    def lowest(self, atol: float = 1e-9) -> "SampleSet":
+        """Returns the samples with the lowest energy"""
+        return self._subset(self.record.energy <= self.record.energy.min() + atol)
+
+    def to_pandas_dataframe(self) -> pd.DataFrame:
+        """Returns one column per variable, one per vector and "energy" and
+        "num_occurrences", as expected by ``qlp.mds.mds_qlpdb.data_summary``.
+        """
+        frame = pd.DataFrame(self.record.sample, columns=self.variables)
+        for name in self.vectors:
+            frame[name] = self.record[name]
+        frame["energy"] = self.record.energy
+        frame["num_occurrences"] = self.record.num_occurrences
+        return frame
+
+
+def _as_qubo(
+        Q: Union[Dict[Tuple[Hashable, Hashable], float], Any]
+) -> Tuple[csr_matrix, List[Hashable]]:
+    """Returns the QUBO as csr matrix and the variable labels"""
+    # dok_matrix subclasses dict, so check for sparse matrices first
+    if issparse(Q):
+        qubo = csr_matrix(Q, dtype=float)
+        return qubo, list(range(qubo.shape[0]))
+    if isinstance(Q, dict):
+        variables = sorted({v for key in Q for v in key})
+        index = {v: idx for idx, v in enumerate(variables)}
+        rows = [index[u] for u, _ in Q]
+        cols = [index[v] for _, v in Q]
+        qubo = csr_matrix(
+            (np.array(list(Q.values()), dtype=float), (rows, cols)),
+            shape=(len(variables), len(variables)),
+        )
+        return qubo, variables
+    qubo = csr_matrix(np.asarray(Q), dtype=float)
+    return qubo, list(range(qubo.shape[0]))
+
+
+def _couplings(qubo: csr_matrix) -> Tuple[csr_matrix, np.ndarray]:
+    """Returns the symmetric couplings ``W = Q + Q^T`` without diagonal and the
+    diagonal of ``Q`` as used by the sweep kernels
+    """
+    diag = qubo.diagonal().astype(float)
+    W = (qubo + qubo.T).tocsr()
+    W.setdiag(0)
+    W.eliminate_zeros()
+    W.sort_indices()
+    return W, diag
+
+
+def default_beta_range(qubo: csr_matrix) -> Tuple[float, float]:
+    """Returns inverse temperatures at which the largest energy change is accepted with
+    probability 1/2 and the smallest non-zero change with probability 1/100.
+
+    The smallest change is the greatest common divisor of integer coefficients (as for
+    the MDS QUBOs) and the smallest coefficient else.
+    """
+    W = abs(qubo + qubo.T).tocsr()
+    W.setdiag(0)
+    bound = abs(qubo.diagonal()) + np.asarray(W.sum(axis=1)).flatten()
+    return _beta_range(bound, qubo.data)
+
+
+def _beta_range(bound: np.ndarray, coefficients: np.ndarray) -> Tuple[float, float]:
+    """Returns ``default_beta_range`` for the largest energy changes of each bit
+    ``bound`` and the QUBO coefficients
+    """
+    nonzero = np.abs(coefficients[coefficients != 0])
+    if nonzero.size == 0:
+        return 0.1, 1.0
+    if np.all(nonzero == np.round(nonzero)):
+        step = float(np.gcd.reduce(nonzero.astype(np.int64)))
+    else:
+        step = nonzero.min()
+    return np.log(2) / bound.max(), np.log(100) / step
+
+
+class SimulatedAnnealingSampler:
+    """Multi-replica simulated annealing and parallel tempering sampler for QUBOs
+
+    ``sample_qubo`` accepts dicts ``{(u, v): bias}`` as well as dense or sparse
+    matrices, e.g., from ``get_mds_qubo(..., format="csr")``.
+    """
+
+    parameters = {
+        "num_reads": [],
+        "num_sweeps": [],
+        "beta_range": [],
+        "beta_schedule": [],
+        "method": [],
+        "num_temperatures": [],
+        "initial_states": [],
+        "seed": [],
+    }
+
+    def sample_qubo(
+            self,
+            Q,
+            num_reads: int = 10,
+            num_sweeps: int = 1000,
+            beta_range: Optional[Tuple[float, float]] = None,
+            beta_schedule: Optional[np.ndarray] = None,
+            method: str = "sa",
+            num_temperatures: int = 16,
+            initial_states: Optional[np.ndarray] = None,
+            seed: Optional[int] = None,
+            aggregate: bool = False,
+    ) -> SampleSet:
+        """Samples low energy states of ``x^T Q x``
+
+        Arguments:
+            Q: The QUBO.
+            num_reads: Number of independent replicas (chains for tempering).
+            num_sweeps: Number of sweeps per replica.
+            beta_range: Smallest and largest inverse temperature. Defaults to
+                ``default_beta_range``.
+            beta_schedule: Explicit inverse temperatures; one per sweep for "sa",
+                one per temperature for "pt". Overrides ``beta_range``. For "sa",
+                a schedule of shape (n_sweeps, n) anneals each bit separately.
+            method: "sa" (simulated annealing with a geometric schedule) or "pt"
+                (parallel tempering over geometrically spaced temperatures).
+            num_temperatures: Number of temperatures for "pt".
+            initial_states: Initial bits of shape (num_reads, n). Random if None.
+            seed: Seed of the replica random streams.
+            aggregate: Merge identical samples.
+
+        Raises:
+            KeyError: If the method is not reckognized
+        """
+        qubo, variables = _as_qubo(Q)
+        n = qubo.shape[0]
+        W, diag = _couplings(qubo)
+
+        rng = np.random.default_rng(seed)
+        seeds = rng.integers(0, 2 ** 63, size=num_reads, dtype=np.uint64)
+        if beta_range is None:
+            beta_range = default_beta_range(qubo)
+        if initial_states is None:
+            initial_states = rng.integers(0, 2, size=(num_reads, n))
+        states = np.array(initial_states, dtype=np.int8).reshape(num_reads, n)
+
+        if method == "sa":
+            betas = (
+                np.geomspace(*beta_range, num=num_sweeps)
+                if beta_schedule is None
+                else np.asarray(beta_schedule, dtype=float)
+            )
+            betas = np.ascontiguousarray(betas.reshape(betas.shape[0], -1))
+            _simulated_annealing(W.indptr, W.indices, W.data, diag, betas, states, seeds)
+        elif method == "pt":
+            betas = (
+                np.geomspace(*beta_range, num=num_temperatures)
+                if beta_schedule is None
+                else np.asarray(beta_schedule, dtype=float)
+            )
+            chains = np.repeat(states[:, None, :], betas.size, axis=1)
+            _parallel_tempering(
+                W.indptr, W.indices, W.data, diag, betas, num_sweeps, chains, seeds
+            )
+            states = np.ascontiguousarray(chains[:, -1])
+        else:
+            raise KeyError(f"Method {method} not reckognized")
+
+        energies = np.einsum("ij,ij->i", states @ qubo.T, states) if n else np.zeros(
+            num_reads
+        )
+        sampleset = SampleSet(
+            states,
+            energies,
+            variables=variables,
+            info={
+                "method": method,
+                "beta_range": (float(betas.min()), float(betas.max())),
+                "seed": seed,
+            },
+        )
+        return sampleset.aggregate() if aggregate else sampleset
@@ -1,21 +1,162 @@
 """QUBO solver routines to obtain global optimal solution.
 """
 from typing import List, Tuple, Union, Optional, Set, Dict, Any
-from itertools import product
+from concurrent.futures import ProcessPoolExecutor
+import warnings
 
 import numpy as np
+from numba import jit
+from scipy.optimize import linprog
+from scipy.sparse import csr_matrix
 
-from tqdm import tqdm
+from qlp.mds.qubo import get_mds_penalty_qubo, get_edges, Graph
 
-from qlp.mds.qubo import get_mds_qubo
+
+@jit(nopython=True)
+def _gray_code_search(
+        W: np.ndarray,
+        diag: np.ndarray,
+        x: np.ndarray,
+        n_free: int,
+        max_solutions: int,
+        atol: float,
+) -> Tuple[float, np.ndarray, int]:
+    """Enumerates the first ``n_free`` bits of ``x`` in Gray code order
+
+    Flipping bit k changes the energy by ``(1 - 2 x_k) (Q_kk + sum_j W_kj x_j)``
+    where ``W = Q + Q^T`` without diagonal. The local fields ``W x`` are updated
+    in O(n) per flip.
+
+    Arguments:
+        W: Symmetric coupling matrix without diagonal.
+        diag: Diagonal of the QUBO.
+        x: Initial bits; bits beyond n_free stay fixed.
+        n_free: Number of enumerated bits.
+        max_solutions: Maximal number of stored degenerate minima.
+        atol: Absolute tolerance for degenerate energies.
+
+    Returns:
+        The minimal energy, stored minima as bit masks and the number of minima.
+    """
+    n = x.size
+    x = x.copy()
+    field = W @ x
+    energy = 0.0
+    state = 0
+    for i in range(n):
+        energy += x[i] * (diag[i] + 0.5 * field[i])
+        if x[i] == 1:
+            state |= 1 << i
+
+    best = energy
+    solutions = np.zeros(max_solutions, dtype=np.int64)
+    solutions[0] = state
+    n_minima = 1
+    for step in range(1, 1 << n_free):
+        k = 0
+        while (step >> k) & 1 == 0:
+            k += 1
+        sign = 1.0 - 2.0 * x[k]
+        energy += sign * (diag[k] + field[k])
+        x[k] = 1.0 - x[k]
+        state ^= 1 << k
+        for j in range(n):
+            field[j] += sign * W[j, k]
+
+        if energy < best - atol:
+            best = energy
+            solutions[0] = state
+            n_minima = 1
+        elif energy <= best + atol:
+            if n_minima < max_solutions:
+                solutions[n_minima] = state
+            n_minima += 1
+    return best, solutions[: min(n_minima, max_solutions)], n_minima
+
+
+def _search_prefix(args) -> Tuple[float, np.ndarray, int]:
+    """Runs ``_gray_code_search`` for a fixed prefix of the last bits"""
+    W, diag, prefix, n_free, max_solutions, atol = args
+    x = np.zeros(diag.size)
+    x[n_free:] = [(prefix >> bit) & 1 for bit in range(diag.size - n_free)]
+    return _gray_code_search(W, diag, x, n_free, max_solutions, atol)
+
+
+def exhaustive_search(
+    qubo: "SparseMatrix",
+    max_solutions: int = 1000,
+    n_processes: int = 1,
+    prefix_bits: Optional[int] = None,
+    atol: Optional[float] = None,
+) -> Tuple[float, np.ndarray, int]:
+    """Exactly minimizes ``x^T Q x`` over all bit vectors in Gray code order.
+
+    Each step flips one bit and updates the energy in O(n), only the running
+    minimum and its degenerate solutions are kept. The last ``prefix_bits`` bits
+    are fixed per task and the tasks are distributed over ``n_processes``.
+
+    Arguments:
+        qubo: The QUBO to optimize (dense or sparse, at most 62 variables).
+        max_solutions: Maximal number of stored degenerate minima.
+        n_processes: Number of worker processes.
+        prefix_bits: Number of bits enumerated over tasks. Defaults to
+            ``log2(4 * n_processes)`` for more than one process, else zero.
+        atol: Absolute tolerance for degenerate energies. Defaults to zero for
+            integer QUBOs and ``1e-9 * sum |Q|`` else.
+
+    Returns:
+        e_min: The minimal energy.
+        solutions: Array of shape (n_solutions, n) of minimal bit vectors sorted
+            lexicographically.
+        n_minima: The number of minimal bit vectors (may exceed ``max_solutions``).
+    """
+    Q = qubo.toarray() if hasattr(qubo, "toarray") else np.asarray(qubo)
+    n = Q.shape[0]
+    if n > 62:
+        raise ValueError("Exhaustive search supports at most 62 variables.")
+    if atol is None:
+        atol = 0.0 if np.issubdtype(Q.dtype, np.integer) else 1e-9 * np.abs(Q).sum()
+    diag = np.diagonal(Q).astype(float)
+    W = (Q + Q.T).astype(float)
+    np.fill_diagonal(W, 0)
+
+    if prefix_bits is None:
+        prefix_bits = int(np.ceil(np.log2(4 * n_processes))) if n_processes > 1 else 0
+    prefix_bits = min(prefix_bits, n)
+    tasks = [
+        (W, diag, prefix, n - prefix_bits, max_solutions, atol)
+        for prefix in range(2 ** prefix_bits)
+    ]
+    if n_processes > 1:
+        with ProcessPoolExecutor(max_workers=n_processes) as executor:
+            results = list(executor.map(_search_prefix, tasks))
+    else:
+        results = [_search_prefix(task) for task in tasks]
+
+    e_min = min(best for best, _, _ in results)
+    states = []
+    n_minima = 0
+    for best, solutions, count in results:
+        if best <= e_min + atol:
+            states.extend(solutions.tolist())
+            n_minima += count
+    bits = (np.array(states, dtype=np.int64)[:, None] >> np.arange(n)) & 1
+    bits = bits[np.lexsort(bits.T[::-1])]
+    if np.issubdtype(Q.dtype, np.integer):
+        e_min = int(round(e_min))
+    return e_min, bits[:max_solutions], n_minima
 
 
 def classical_search(
-    qubo: "SparseMatrix", n_nodes: Optional[int] = None
+    qubo: "SparseMatrix",
+    n_nodes: Optional[int] = None,
+    max_solutions: Optional[int] = None,
+    **kwargs
 ) -> Union[int, List[Tuple[int]]]:
     """Classicaly searches minimal energy for all integer solutions.
 
     Assumes that the first n_nodes entries correspond to sorted vertex numbers.
+    Uses ``exhaustive_search``.
 
     Arguments:
         qubo: The QUBO to optimize.
@@ -23,32 +164,28 @@ def classical_search(
             solutions accounting for entries from zero to n_nodes (exclusive).
             This means that the energy and slack contributions are excluced from the
             presentation of the solution.
+        max_solutions: Maximal number of returned minima. Defaults to all minima,
+            which repeats the search if there are more than 1000. A warning is
+            issued if minima are dropped.
+        kwargs: Options of ``exhaustive_search``.
 
     Returns:
         e_min: The minimal energy.
         solutions: A list of vertices (qubo entries) which are non-zero.
     """
-    energies = []
-    vecs = []
-
-    n_iterations = 2 ** qubo.shape[1]
-    if n_iterations > 10 ** 5:
-        go_on = input(
-            f"This search will execute {n_iterations} iterations. Continue (y/n)?"
+    e_min, bits, n_minima = exhaustive_search(
+        qubo, max_solutions=max_solutions or 1000, **kwargs
+    )
+    if max_solutions is None and n_minima > len(bits):
+        e_min, bits, n_minima = exhaustive_search(
+            qubo, max_solutions=n_minima, **kwargs
         )
-        if go_on.lower() != "y":
-            raise KeyboardInterrupt("Too many iterations abort.")
-
-    # Brute force iterate space
-    for vv in tqdm(list(product(*[(0, 1)] * qubo.shape[1]))):
-        ee = (vv @ qubo @ vv).flatten()[0]
-        energies.append(ee)
-        vecs.append(vv)
-
-    # Find minimal energy
-    e_min = np.min(energies)
-    # And corresponding vectors
-    solutions = [tuple(vv) for vv, ee in zip(vecs, energies) if ee == e_min]
+    if n_minima > len(bits):
+        warnings.warn(
+            f"Found {n_minima} degenerate minima but only {len(bits)} are returned"
+            " (increase max_solutions)."
+        )
+    solutions = [tuple(vv) for vv in bits.tolist()]
 
     if n_nodes is not None:
         # Reduce solutions to n_nodes entries
@@ -62,6 +199,190 @@ def classical_search(
     return e_min, solutions
 
 
+def _popcount(mask: int) -> int:
+    return bin(mask).count("1")
+
+
+def _bits(mask: int) -> List[int]:
+    """Returns the indices of set bits"""
+    bits = []
+    while mask:
+        low = mask & -mask
+        bits.append(low.bit_length() - 1)
+        mask ^= low
+    return bits
+
+
+def mds_branch_and_bound(
+    graph: Graph, all_solutions: bool = False
+) -> Tuple[int, List[Tuple[int]]]:
+    """Exactly solves the Minimum Dominating Set problem on the graph.
+
+    Vertices and closed neighborhoods are represented as bitsets. The search starts
+    from a greedy dominating set, branches on the dominators of the undominated
+    vertex with the fewest candidates and prunes with lower bounds: first
+    ``|chosen| + |P|`` where ``P`` is a greedy set of undominated vertices with
+    pairwise disjoint candidate dominators, then the linear relaxation of the
+    remaining set cover problem. The LP duals of a node also bound its children
+    and remove candidates by reduced cost fixing.
+    Unless all optimal sets are requested, candidates whose closed neighborhood is
+    contained in another one are removed first (covers degree-1 vertices).
+
+    Nodes are relabeled as in ``get_mds_qubo``, thus solutions are comparable to
+    ``classical_search(get_mds_qubo(graph), n_nodes)``.
+    The QUBO energy of ``classical_search`` is ``e_min - penalty * n_nodes``.
+
+    Arguments:
+        graph: The undirected graph as set of tuples or array of shape (n_edges, 2).
+        all_solutions: Enumerate all minimum dominating sets instead of one.
+
+    Note:
+        The run time depends on the gap between the LP relaxation and the
+        domination number. Sparse graphs up to about 100 vertices take seconds,
+        200 vertex random graphs may take minutes (as for MIP solvers).
+
+    Returns:
+        e_min: The domination number.
+        solutions: Minimum dominating sets as sorted tuples of vertex indices.
+    """
+    rows, cols, n_nodes = get_edges(graph)
+    closed = [1 << v for v in range(n_nodes)]
+    for v1, v2 in zip(rows.tolist(), cols.tolist()):
+        closed[v1] |= 1 << v2
+        closed[v2] |= 1 << v1
+
+    candidates = (1 << n_nodes) - 1
+    if not all_solutions:
+        # Reduction: drop candidates dominated by another candidate
+        for v in range(n_nodes):
+            for w in range(n_nodes):
+                if (
+                    v != w
+                    and (candidates >> w) & 1
+                    and closed[v] | closed[w] == closed[w]
+                    and (closed[v] != closed[w] or w < v)
+                ):
+                    candidates &= ~(1 << v)
+                    break
+
+    margin = 0 if all_solutions else 1
+
+    # Greedy incumbent: repeatedly choose the candidate dominating the most vertices
+    greedy, undominated = [], (1 << n_nodes) - 1
+    while undominated:
+        w = max(_bits(candidates), key=lambda w: _popcount(closed[w] & undominated))
+        greedy.append(w)
+        undominated &= ~closed[w]
+    best = [len(greedy)]
+    # When enumerating, the search visits the greedy set again if it is optimal
+    solutions = [] if all_solutions else [tuple(sorted(greedy))]
+
+    def packing_bound(undominated: int, allowed: int) -> int:
+        """Number of undominated vertices with pairwise disjoint dominators"""
+        used = 0
+        count = 0
+        for u in sorted(_bits(undominated), key=lambda u: _popcount(closed[u] & allowed)):
+            dominators = closed[u] & allowed
+            if not dominators & used:
+                used |= dominators
+                count += 1
+        return count
+
+    def lp_duals(
+        undominated: int, allowed: int
+    ) -> Optional[Tuple[Dict[int, float], Dict[int, float]]]:
+        """Optimal dual of the linear relaxation of the remaining set cover
+
+        Returns the multipliers of the covering constraints of undominated vertices
+        and of the upper bounds of allowed candidates, None if infeasible.
+        """
+        variables = _bits(allowed)
+        vertices = _bits(undominated)
+        columns = {w: idx for idx, w in enumerate(variables)}
+        row_idx, col_idx = [], []
+        for row, u in enumerate(vertices):
+            for w in _bits(closed[u] & allowed):
+                row_idx.append(row)
+                col_idx.append(columns[w])
+        constraints = csr_matrix(
+            (-np.ones(len(row_idx)), (row_idx, col_idx)),
+            shape=(len(vertices), len(variables)),
+        )
+        result = linprog(
+            np.ones(len(variables)),
+            A_ub=constraints,
+            b_ub=-np.ones(len(vertices)),
+            bounds=(0, 1),
+            method="highs",
+        )
+        if result.status != 0:
+            return None
+        covering = np.maximum(-result.ineqlin.marginals, 0)
+        upper = np.maximum(-result.upper.marginals, 0)
+        return dict(zip(vertices, covering.tolist())), dict(zip(variables, upper.tolist()))
+
+    def fix(duals, undominated: int, allowed: int, slack: int) -> Optional[int]:
+        """Prunes with the dual bound and removes candidates by reduced cost fixing
+
+        Any cover containing candidate w has at least ``bound + reduced[w]`` elements.
+        Returns the remaining candidates, None if the node is pruned.
+        """
+        covering, upper = duals
+        candidates = _bits(allowed)
+        bound = sum(covering[u] for u in _bits(undominated)) - sum(
+            upper[w] for w in candidates
+        )
+        if np.ceil(bound - 1e-7) > slack:
+            return None
+        for w in candidates:
+            reduced = 1.0 + upper[w] - sum(
+                covering[u] for u in _bits(closed[w] & undominated)
+            )
+            if np.ceil(bound + reduced - 1e-7) > slack:
+                allowed &= ~(1 << w)
+        return allowed
+
+    def search(chosen: List[int], undominated: int, allowed: int, duals):
+        if not undominated:
+            # Siblings of a new incumbent were admitted with the old bound
+            if len(chosen) > best[0] - margin:
+                return
+            if len(chosen) < best[0]:
+                best[0] = len(chosen)
+                solutions.clear()
+            solutions.append(tuple(sorted(chosen)))
+            return
+
+        slack = best[0] - margin - len(chosen)
+        if packing_bound(undominated, allowed) > slack:
+            return
+        # The parent's multipliers stay dual feasible on fewer vertices and candidates
+        if duals is not None:
+            allowed = fix(duals, undominated, allowed, slack)
+            if allowed is None:
+                return
+        duals = lp_duals(undominated, allowed)
+        if duals is None:
+            return
+        allowed = fix(duals, undominated, allowed, slack)
+        if allowed is None:
+            return
+
+        # Branch on the undominated vertex with the fewest dominators
+        u = min(_bits(undominated), key=lambda u: _popcount(closed[u] & allowed))
+        dominators = _bits(closed[u] & allowed)
+        dominators.sort(key=lambda w: -_popcount(closed[w] & undominated))
+        for w in dominators:
+            chosen.append(w)
+            search(chosen, undominated & ~closed[w], allowed & ~(1 << w), duals)
+            chosen.pop()
+            # Later branches exclude w, thus each set is visited once
+            allowed &= ~(1 << w)
+
+    search([], (1 << n_nodes) - 1, candidates, None)
+    return best[0], sorted(solutions)
+
+
 def mds_schedule_submit(
     graph: Set[Tuple[int, int]],
     p_schedules: List[Dict[str, Any]],
@@ -118,6 +439,8 @@ def mds_schedule_submit(
     }
     base_params.update(kwargs)
 
+    mds_qubo = get_mds_penalty_qubo(graph, triangularize=True)
+
     results = []
     initial_state = None
     for inputs in p_schedules:
@@ -129,8 +452,7 @@ def mds_schedule_submit(
             dwave_config.pop("initial_state")
             dwave_config.pop("reinitialize_state")
 
-        qubo = get_mds_qubo(graph, triangularize=True, penalty=inputs["penalty"])
-        quobo_dict = {key: val for key, val in zip(qubo.keys(), qubo.values())}
+        quobo_dict = mds_qubo.dict(inputs["penalty"] or None)
         result = embbedding.sample_qubo(quobo_dict, **dwave_config)
         sample = result.first
 
@@ -1,50 +1,194 @@
+"""Conversions between QUBO and Ising models.
+
+The QUBO energy is ``x^T Q x`` for bits ``x_i in {0, 1}``, the Ising energy is
+``sum_{i<j} J_ij s_i s_j + sum_i h_i s_i + offset`` for spins ``s_i in {-1, 1}``.
+The relation between bits and spins is set by the basis:
+
+* ``"dwave"``: ``x = (1 + s) / 2``, i.e., bit 1 is spin up (D-Wave convention).
+* ``"simulator"``: ``x = (1 - s) / 2``, i.e., bit 0 is ``Z = +1`` as in ``qlp.tdse``.
+
+Both bases differ by the sign of ``h``. Matrices can be given dense, as scipy sparse
+matrices or as dicts ``{(i, j): value}``. Sparse conversions cost O(nnz).
+"""
+from typing import Tuple, Union, Dict, List, Optional
+
 import numpy as np
+from scipy.sparse import csr_matrix, diags, triu, block_diag, spmatrix, issparse
 
+Matrix = Union[np.ndarray, spmatrix, Dict[Tuple[int, int], float]]
+Bias = Union[np.ndarray, Dict[int, float]]
 
-# QUBO to Dwave Ising
-def QUBO_to_Ising(Q):
-    q = np.diagonal(Q)
-    QD = np.copy(Q)
-    for i in range(len(QD)):
-        QD[i, i] = 0.0
-    QQ = np.copy(QD + np.transpose(QD))
-    J = np.triu(QQ) / 4.0
-    uno = np.ones(len(QQ))
-    h = q / 2 + np.dot(QQ, uno) / 4
-    g = np.dot(uno, np.dot(QD, uno)) / 4.0 + np.dot(q, uno) / 2.0
-    return (J, h, g)
+BASES = {"dwave": 1, "simulator": -1}
 
 
-# Dwave Ising to QUBO
-def Ising_to_QUBO(J, h):
-    Q = 4.0*J+2.0*np.diag(h-(np.sum(J,axis=0)+np.sum(J,axis=1)))
-    return Q
+def _basis_sign(basis: str) -> int:
+    """Returns the sign of h in the given basis relative to the D-Wave basis"""
+    if basis not in BASES:
+        raise KeyError(f"Basis {basis} not reckognized")
+    return BASES[basis]
 
 
-# Dwave Ising to simulator Ising
-# 0-1 basis transform
-def Ising_Dwave_to_Simulator(J, h):
-    return (J, (-1)*h)
+def _as_csr(matrix: Matrix, size: Optional[int] = None) -> Tuple[csr_matrix, str]:
+    """Returns the matrix as canonical csr matrix and its format
+
+    Arguments:
+        matrix: Dense, sparse or dict matrix.
+        size: Dimension of dict matrices. Defaults to the largest index plus one.
+    """
+    if isinstance(matrix, dict):
+        keys = np.array(list(matrix.keys()), dtype=int).reshape(-1, 2)
+        size = size or (int(keys.max()) + 1 if keys.size else 0)
+        csr = csr_matrix(
+            (np.array(list(matrix.values())), (keys[:, 0], keys[:, 1])),
+            shape=(size, size),
+        )
+        kind = "dict"
+    elif issparse(matrix):
+        csr = csr_matrix(matrix)
+        kind = "csr"
+    else:
+        csr = csr_matrix(np.asarray(matrix))
+        kind = "dense"
+    csr.sum_duplicates()
+    return csr, kind
+
+
+def _as_array(bias: Bias, size: int) -> np.ndarray:
+    """Returns biases as array"""
+    if isinstance(bias, dict):
+        array = np.zeros(size)
+        array[list(bias.keys())] = list(bias.values())
+        return array
+    return np.asarray(bias).flatten()
+
 
+def _output(matrix: csr_matrix, bias: np.ndarray, kind: str) -> Tuple[Matrix, Bias]:
+    """Converts a csr matrix and bias array to the requested format"""
+    if kind == "dense":
+        return matrix.toarray(), bias
+    if kind == "csr":
+        return matrix, bias
+    if kind == "dict":
+        coo = matrix.tocoo()
+        return (
+            {
+                (row, col): val
+                for row, col, val in zip(
+                    coo.row.tolist(), coo.col.tolist(), coo.data.tolist()
+                )
+            },
+            dict(enumerate(bias.tolist())),
+        )
+    raise KeyError(f"Format {kind} not reckognized")
 
-# unit test: randomly generate 100 qubo, transform to Ising and transform back and print difference
 
-for i in range(100):
+def QUBO_to_Ising(
+        Q: Matrix, basis: str = "dwave", format: Optional[str] = None  # pylint: disable=W0622
+) -> Tuple[Matrix, Bias, float]:
+    """Maps QUBO to Ising model
 
-    n=np.random.choice(10)+2
-    Q=np.random.rand(n,n)
-    for i in range(n):
-        for j in range(i):
-            Q[i,j]=0.0
+    Arguments:
+        Q: The QUBO, upper triangular or not.
+        basis: Relation of bits and spins, "dwave" or "simulator".
+        format: Output format "dense", "csr" or "dict". Defaults to the input format.
+            For "dict", h is returned as ``{i: h_i}``.
 
-    #print("Q")
-    #print(Q)
+    Returns:
+        Upper triangular couplings J, biases h and the constant offset.
+    """
+    sign = _basis_sign(basis)
+    qubo, kind = _as_csr(Q)
+    q = qubo.diagonal()
+    QD = (qubo - diags(q, format="csr")).tocsr()
+    QD.eliminate_zeros()
+    QQ = (QD + QD.T).tocsr()
+    J = triu(QQ, k=1, format="csr") / 4.0
+    h = sign * (q / 2 + np.asarray(QQ.sum(axis=1)).flatten() / 4)
+    g = QD.sum() / 4.0 + q.sum() / 2.0
+    J, h = _output(J, h, format or kind)
+    return J, h, g
 
-    (J,h,g)=QUBO_to_Ising(Q)
-    Q2=Ising_to_QUBO(J, h)
 
-    #print("Q2")
-    #print(Q2)
-    #print("difference",np.amax(np.absolute(Q-Q2)))
+def Ising_to_QUBO(
+        J: Matrix,
+        h: Bias,
+        basis: str = "dwave",
+        format: Optional[str] = None,  # pylint: disable=W0622
+) -> Matrix:
+    """Maps Ising model to QUBO
 
+    The constant ``sum J - sum h`` (D-Wave basis) is dropped.
 
+    Arguments:
+        J: Couplings without diagonal, upper triangular or not.
+        h: Biases.
+        basis: Relation of bits and spins, "dwave" or "simulator".
+        format: Output format "dense", "csr" or "dict". Defaults to the input format.
+    """
+    sign = _basis_sign(basis)
+    size = len(h) if not isinstance(h, dict) else None
+    if isinstance(J, dict) and isinstance(h, dict):
+        size = max([i + 1 for i in h] + [max(key) + 1 for key in J])
+    couplings, kind = _as_csr(J, size=size)
+    h = sign * _as_array(h, couplings.shape[0])
+    Q = 4.0 * couplings + 2.0 * diags(
+        h
+        - (
+            np.asarray(couplings.sum(axis=0)).flatten()
+            + np.asarray(couplings.sum(axis=1)).flatten()
+        ),
+        format="csr",
+    )
+    Q = Q.tocsr()
+    Q.eliminate_zeros()
+    return _output(Q, h, format or kind)[0]
+
+
+def QUBO_to_Ising_batch(
+        Qs: Union[np.ndarray, List[Matrix]],
+        basis: str = "dwave",
+        format: Optional[str] = None,  # pylint: disable=W0622
+) -> Tuple[Union[np.ndarray, List[Matrix]], Union[np.ndarray, List[Bias]], np.ndarray]:
+    """Maps many QUBOs to Ising models at once
+
+    Arguments:
+        Qs: Array of shape (n_qubos, n, n) or list of QUBOs of any size and format.
+        basis: Relation of bits and spins, "dwave" or "simulator".
+        format: Output format for lists of QUBOs, see ``QUBO_to_Ising``.
+
+    Returns:
+        For arrays, J of shape (n_qubos, n, n) and h of shape (n_qubos, n).
+        For lists, lists of J and h. The offsets are always an array.
+    """
+    sign = _basis_sign(basis)
+    if isinstance(Qs, np.ndarray) and Qs.ndim == 3:
+        q = np.diagonal(Qs, axis1=1, axis2=2)
+        QD = Qs - q[:, :, None] * np.eye(Qs.shape[1])[None]
+        QQ = QD + np.transpose(QD, (0, 2, 1))
+        J = np.triu(QQ, k=1) / 4.0
+        h = sign * (q / 2 + QQ.sum(axis=2) / 4)
+        g = QD.sum(axis=(1, 2)) / 4.0 + q.sum(axis=1) / 2.0
+        return J, h, g
+
+    # Converts the block diagonal matrix of all QUBOs in one pass
+    qubos, kinds = zip(*[_as_csr(Q) for Q in Qs])
+    bounds = np.cumsum([0] + [qubo.shape[0] for qubo in qubos])
+    J, h, _ = QUBO_to_Ising(block_diag(qubos, format="csr"), basis=basis)
+    totals = np.array([qubo.sum() for qubo in qubos], dtype=float)
+    traces = np.array([qubo.diagonal().sum() for qubo in qubos], dtype=float)
+    g = (totals - traces) / 4.0 + traces / 2.0
+
+    Js, hs = [], []
+    for kind, start, end in zip(kinds, bounds[:-1], bounds[1:]):
+        J_block, h_block = _output(
+            J[start:end, start:end], h[start:end], format or kind
+        )
+        Js.append(J_block)
+        hs.append(h_block)
+    return Js, hs, g
+
+
+# Dwave Ising to simulator Ising
+# 0-1 basis transform
+def Ising_Dwave_to_Simulator(J, h):
+    return (J, (-1)*h)
@@ -3,4 +3,6 @@
 
 from qlp.tdse.schedule import AnnealSchedule
 from qlp.tdse.example import embed_qubo_example
-from qlp.tdse.computation import TDSE, convert_params, add_jchaos
\ No newline at end of file
+from qlp.tdse.computation import TDSE, convert_params, add_jchaos
+from qlp.tdse.mps import MPSTDSE
+from qlp.tdse.meanfield import MeanFieldTDSE
@@ -0,0 +1,187 @@
+"""Process wide cache for Fock space operators shared by all TDSE instances.
+
+Operators are keyed by the number of qubits and the operator kind. The in-memory tier
+is bounded by a byte budget with least recently used eviction. Optionally, operators
+are stored as ``.npy`` files in a directory and loaded as read-only memory maps such
+that worker processes share the same pages.
+
+Cached operators are shared between instances and must not be modified in place.
+"""
+from typing import Callable, List, Optional
+
+from collections import OrderedDict
+import os
+import tempfile
+import threading
+import shutil
+
+import numpy as np
+from scipy import sparse as sp
+
+
+CACHE_VERSION = "v1"
+
+
+def _nbytes(operators: List[sp.csr_matrix]) -> int:
+    """Returns the memory used by the arrays of a list of csr matrices"""
+    return sum(
+        op.data.nbytes + op.indices.nbytes + op.indptr.nbytes for op in operators
+    )
+
+
+class OperatorCache:
+    """LRU cache of lists of sparse Fock space operators
+
+    .. code-block:: python
+
+        FockX = OPERATOR_CACHE.get(total_qubits, "X", builder)
+        OPERATOR_CACHE.configure(max_bytes=2 ** 30, directory="/tmp/qlp-operators")
+        print(OPERATOR_CACHE.stats)
+
+    Attributes:
+        max_bytes: int
+            Memory budget of the in-memory tier.
+        directory: Optional[str]
+            Directory of the on-disk tier. Disabled if None.
+        stats: Dict[str, int]
+            Number of memory hits, disk hits, misses, disk writes and evictions.
+    """
+
+    def __init__(self, max_bytes: int = 2 ** 30, directory: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self.stats = {}
+        self.clear()
+
+    def configure(
+            self, max_bytes: Optional[int] = None, directory: Optional[str] = None
+    ):
+        """Sets the memory budget and (enables) the on-disk tier"""
+        with self._lock:
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            if directory is not None:
+                os.makedirs(directory, exist_ok=True)
+                self.directory = directory
+            self._evict()
+
+    def clear(self):
+        """Removes all in-memory entries and resets the statistics"""
+        with self._lock:
+            self._entries.clear()
+            self.stats = {
+                "hits": 0,
+                "disk_hits": 0,
+                "misses": 0,
+                "disk_writes": 0,
+                "evictions": 0,
+            }
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the in-memory tier"""
+        return sum(nbytes for _, nbytes in self._entries.values())
+
+    def get(
+            self,
+            total_qubits: int,
+            kind: str,
+            builder: Callable[[], List[sp.csr_matrix]],
+    ) -> List[sp.csr_matrix]:
+        """Returns cached operators or builds and caches them
+
+        Arguments:
+            total_qubits: Number of qubits of the Fock space.
+            kind: Name of the operator kind, e.g., "X" or "ZZ".
+            builder: Function returning the list of operators if not cached.
+        """
+        key = (total_qubits, kind)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return self._entries[key][0]
+
+            operators = self._load(key)
+            if operators is not None:
+                self.stats["disk_hits"] += 1
+            else:
+                self.stats["misses"] += 1
+                operators = [sp.csr_matrix(op) for op in builder()]
+                for op in operators:
+                    op.sum_duplicates()
+                self._store(key, operators)
+                operators = self._load(key) or operators
+
+            # memory maps are backed by the page cache and do not count
+            nbytes = 0 if self.directory is not None else _nbytes(operators)
+            if nbytes <= self.max_bytes:
+                self._entries[key] = (operators, nbytes)
+                self._evict()
+            return operators
+
+    def _evict(self):
+        """Drops least recently used entries until the budget is met"""
+        while self._entries and self.nbytes > self.max_bytes:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _path(self, key) -> str:
+        total_qubits, kind = key
+        return os.path.join(
+            self.directory, f"fock_{total_qubits}_{kind}_{CACHE_VERSION}"
+        )
+
+    def _load(self, key) -> Optional[List[sp.csr_matrix]]:
+        """Loads operators as read-only memory maps if present on disk"""
+        if self.directory is None or not os.path.exists(self._path(key)):
+            return None
+        path = self._path(key)
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+            for name in ["data", "indices", "indptr", "offsets", "shape"]
+        }
+        operators = []
+        for n, (start, end) in enumerate(zip(arrays["offsets"][:-1], arrays["offsets"][1:])):
+            op = sp.csr_matrix(
+                (
+                    arrays["data"][start:end],
+                    arrays["indices"][start:end],
+                    arrays["indptr"][n],
+                ),
+                shape=tuple(arrays["shape"]),
+                copy=False,
+            )
+            op.has_sorted_indices = True
+            op.has_canonical_format = True
+            operators.append(op)
+        return operators
+
+    def _store(self, key, operators: List[sp.csr_matrix]):
+        """Writes operators to disk; concurrent writers of the same key are safe"""
+        if self.directory is None or not operators:
+            return
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+        arrays = {
+            "data": np.concatenate([op.data for op in operators]),
+            "indices": np.concatenate([op.indices for op in operators]),
+            "indptr": np.array([op.indptr for op in operators]),
+            "offsets": np.cumsum([0] + [op.nnz for op in operators]),
+            "shape": np.array(operators[0].shape),
+        }
+        tmp = tempfile.mkdtemp(dir=self.directory)
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp, f"{name}.npy"), array)
+        try:
+            os.rename(tmp, path)
+            self.stats["disk_writes"] += 1
+        except OSError:
+            # another process stored the same operators first
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+OPERATOR_CACHE = OperatorCache()
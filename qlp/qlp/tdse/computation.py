@@ -3,7 +3,7 @@
 
 This module contains the core computations
 """
-from typing import Dict, Any, Tuple, List
+from typing import Dict, Any, Tuple, List, Callable, Optional
 
 import hashlib
 import pickle
@@ -13,16 +13,19 @@ import numpy as np
 from numpy.linalg import eigh
 
 from scipy.integrate import solve_ivp
-from scipy.linalg import logm
+from scipy.linalg import logm, expm
 from scipy import sparse as sp
+from scipy.sparse.csgraph import connected_components
 
-from random import normalvariate as rnormal
+import networkx as nx
+from networkx.algorithms.isomorphism import GraphMatcher
 
-from numba import jit
+from random import normalvariate as rnormal
 
 from qlp.tdse.schedule import AnnealSchedule
+from qlp.tdse.cache import OPERATOR_CACHE
+from qlp.mds.mds_qlpdb import get_graph_entry
 
-from qlpdb.graph.models import Graph
 from qlpdb.tdse.models import Tdse
 
 from django.core.files.base import ContentFile
@@ -67,6 +70,111 @@ class PureSolutionInterface:
         self.y = np.zeros((y1.size, 0))
 
 
+class KrylovSolutionInterface(PureSolutionInterface):
+    """Interface for a density matrix solution of the Krylov exponential integrator
+
+    Mirrors the attributes of the ``solve_ivp`` solution used by the correlation
+    functions.
+
+    Attributes:
+        t: array
+        y: array
+        nfev: Number of Liouvillian actions
+        n_steps: Number of accepted steps
+        n_rejected: Number of rejected steps
+        success: Whether the integration reached the final time
+        message: Termination reason
+    """
+
+    def __init__(self, y1):
+        super().__init__(y1)
+        self.nfev = 0
+        self.n_steps = 0
+        self.n_rejected = 0
+        self.success = False
+        self.message = ""
+
+
+# Gauss nodes and weights of the fourth order commutator free Magnus integrator
+# exp(dt (a2 L1 + a1 L2)) exp(dt (a1 L1 + a2 L2)) with a1,2 = 1/4 +- sqrt(3)/6
+# (Blanes & Moan 2006)
+_CFM4_NODES = (0.5 - np.sqrt(3) / 6, 0.5 + np.sqrt(3) / 6)
+_CFM4_WEIGHTS = (
+    (0.25 + np.sqrt(3) / 6, 0.25 - np.sqrt(3) / 6),
+    (0.25 - np.sqrt(3) / 6, 0.25 + np.sqrt(3) / 6),
+)
+# Embedded third order scheme at the same nodes, its second exponential is O(dt^2)
+_CFM3_WEIGHTS = (
+    (0.5 + np.sqrt(3) / 6, 0.5 - np.sqrt(3) / 6),
+    (-np.sqrt(3) / 6, np.sqrt(3) / 6),
+)
+
+
+def _expm_krylov(
+    matvec: Callable[[ndarray], ndarray],
+    v: ndarray,
+    krylov_dim: int,
+    tau: Optional[float] = None,
+    tol: float = 0.0,
+) -> Tuple[Callable[[float], Tuple[ndarray, float]], int]:
+    r"""Arnoldi approximation of ``exp(tau L) v``
+
+    Builds the Krylov space ``span(v, L v, ..., L^(m-1) v)`` once. The returned
+    function evaluates ``beta V_m exp(tau H_m) e_1`` for any ``tau`` together with
+    the a posteriori error estimate ``beta h_{m+1,m} |e_m^T tau phi_1(tau H_m) e_1|``.
+
+    Arguments:
+        matvec: Action of the (constant) Liouvillian L.
+        v: Vector to propagate.
+        krylov_dim: Maximal dimension of the Krylov space.
+        tau: If given, the Krylov space is only extended until the error estimate at
+            ``tau`` drops below ``tol``.
+        tol: Absolute tolerance of the error estimate at ``tau``.
+
+    Returns:
+        Propagation function of tau and the number of calls to matvec.
+    """
+    beta = np.linalg.norm(v)
+    m = min(krylov_dim, v.size)
+    V = np.zeros((m + 1, v.size), dtype=complex)
+    H = np.zeros((m + 1, m), dtype=complex)
+    if beta == 0:
+        return lambda tau: (np.zeros_like(v), 0.0), 0
+
+    def project(tau: float, m: int, h_next: float) -> Tuple[ndarray, float]:
+        Haug = np.zeros((m + 1, m + 1), dtype=complex)
+        Haug[:m, :m] = tau * H[:m, :m]
+        Haug[0, m] = 1.0
+        F = expm(Haug)
+        return F[:m, 0], beta * h_next * abs(tau * F[m - 1, m])
+
+    V[0] = v / beta
+    h_next = 0.0
+    for j in range(m):
+        w = matvec(V[j])
+        for i in range(j + 1):
+            H[i, j] = np.vdot(V[i], w)
+            w = w - H[i, j] * V[i]
+        h_next = np.linalg.norm(w)
+        if h_next < 1e-12 * beta:
+            # happy breakdown: Krylov space is invariant and the result exact
+            m = j + 1
+            h_next = 0.0
+            break
+        if tau is not None and project(tau, j + 1, h_next)[1] <= tol:
+            m = j + 1
+            break
+        if j + 1 < m:
+            H[j + 1, j] = h_next
+            V[j + 1] = w / h_next
+
+    def propagate(tau: float) -> Tuple[ndarray, float]:
+        coefficients, error = project(tau, m, h_next)
+        return beta * (coefficients @ V[:m]), error
+
+    return propagate, m
+
+
 def convert_params(params):
     for key in params:
         if key in ["hi_for_offset", "hi"]:
@@ -178,6 +286,9 @@ class TDSE:
         )
         self.IsingH_exact = self._constructIsingH(np.array(self.ising["Jij"]), self.ising["hi"])
         self.gammadict = {"g": [], "glocal": [], "s": []}
+        self._liouville = None
+        self._zdiag = None
+        self._symmetry = None
 
     def hash_dict(self, d):
         hash = hashlib.md5(
@@ -229,8 +340,7 @@ class TDSE:
         tdse_params["prob"] = list(probability)
 
         # select or insert row in graph
-        gp = {key: self.graph[key] for key in self.graph if key not in ["total_qubits"]}
-        graph = get_or_create(Model=Graph, save=save, **gp)
+        graph = get_graph_entry(self.graph, save=save)
         tdse_params["graph"] = graph
         # select or insert row in tdse
         tdse = get_or_create(Model=Tdse, save=save, **tdse_params)
@@ -256,6 +366,164 @@ class TDSE:
         """Computes `i H(t) psi`"""
         return -1j * self.annealingH(t) @ psi
 
+    def qubit_automorphism_generators(self, tol: float = 1e-9) -> List[Tuple[int]]:
+        """Returns generators of the qubit permutations which leave ``Jij``, ``hi`` and
+        offsets invariant
+
+        The permutation ``perm`` maps qubit ``i`` to qubit ``perm[i]``.
+        Since the anneal schedule of each qubit only depends on its offset, these
+        permutations commute with H(s) for all s.
+        The full group can be factorially large, so only a generating set is searched:
+        for each qubit ``k``, one permutation fixing the qubits ``0, ..., k-1`` and
+        mapping ``k`` to ``t`` is collected for every ``t`` not already reached by the
+        previous generators (the coset representatives of a stabilizer chain).
+
+        Arguments:
+            tol: Absolute tolerance for comparing couplings, fields and offsets.
+        """
+        n_qubits = self.graph["total_qubits"]
+        Jij = np.array(self.ising["Jij"], dtype=float)
+        Jij = np.triu(Jij, 1) + np.triu(Jij, 1).T
+        hi = np.array(self.ising["hi"], dtype=float)
+        offsets = np.array(self.AS.offset_list, dtype=float) * np.ones(n_qubits)
+
+        graph = nx.Graph()
+        for i in range(n_qubits):
+            graph.add_node(i, h=hi[i], offset=offsets[i], pin=-1)
+        for i, j in zip(*np.nonzero(np.triu(Jij, 1))):
+            graph.add_edge(i, j, J=Jij[i, j])
+
+        def node_match(n1, n2):
+            return (
+                n1["pin"] == n2["pin"]
+                and abs(n1["h"] - n2["h"]) < tol
+                and abs(n1["offset"] - n2["offset"]) < tol
+            )
+
+        def edge_match(e1, e2):
+            return abs(e1["J"] - e2["J"]) < tol
+
+        def closure(orbit, perms):
+            stack = list(orbit)
+            while stack:
+                i = stack.pop()
+                for perm in perms:
+                    if perm[i] not in orbit:
+                        orbit.add(perm[i])
+                        stack.append(perm[i])
+            return orbit
+
+        generators = []
+        for k in range(n_qubits):
+            # Generators found so far which fix the qubits 0, ..., k-1
+            stabilizer = [perm for perm in generators if perm[:k] == tuple(range(k))]
+            orbit = closure({k}, stabilizer)
+
+            source = graph.copy()
+            for i in range(k + 1):
+                source.nodes[i]["pin"] = i
+            for target in range(k + 1, n_qubits):
+                if target in orbit or graph.degree(target) != graph.degree(k):
+                    continue
+                pinned = graph.copy()
+                for i in range(k):
+                    pinned.nodes[i]["pin"] = i
+                pinned.nodes[target]["pin"] = k
+                mapping = next(
+                    GraphMatcher(
+                        source, pinned, node_match=node_match, edge_match=edge_match
+                    ).isomorphisms_iter(),
+                    None,
+                )
+                if mapping is None:
+                    continue
+                perm = tuple(mapping[i] for i in range(n_qubits))
+                generators.append(perm)
+                stabilizer.append(perm)
+                orbit = closure(orbit, stabilizer)
+        return generators
+
+    def _init_symmetry(self) -> Dict[str, Any]:
+        r"""Computes the basis of the symmetric sector and the reduced Hamiltonian parts
+
+        The symmetric sector is spanned by normalized sums over orbits of
+        computational basis states under ``qubit_automorphism_generators``.
+        Orbits are the connected components of the graph linking each state (qubit) to
+        its images under the generators.
+        Because the offsets are invariant, ``A_i(s)`` is constant on orbits of qubits
+        and the transverse Hamiltonian is reduced for each qubit orbit once.
+        The Ising Hamiltonian stays diagonal in the reduced basis.
+
+        Returns:
+            Dictionary with the isometry ``basis`` (full x reduced), a representative
+            qubit and the reduced transverse operator for each qubit orbit, and the
+            index map of basis states to orbits.
+        """
+        n_qubits = self.graph["total_qubits"]
+        size = 2 ** n_qubits
+        perms = np.array(
+            [tuple(range(n_qubits))] + self.qubit_automorphism_generators()
+        )
+
+        states = np.arange(size)
+        bits = (states[:, None] >> (n_qubits - 1 - np.arange(n_qubits))) & 1
+        rows, cols = [], []
+        for perm in perms:
+            rows.append(states)
+            cols.append(bits @ (1 << (n_qubits - 1 - perm)))
+        rows, cols = np.concatenate(rows), np.concatenate(cols)
+        n_orbits, orbits = connected_components(
+            sp.csr_matrix((np.ones(rows.size), (rows, cols)), shape=(size, size)),
+            directed=False,
+        )
+        orbit_size = np.bincount(orbits, minlength=n_orbits)
+        basis = sp.csr_matrix(
+            (1 / np.sqrt(orbit_size[orbits]), (states, orbits)), shape=(size, n_orbits)
+        )
+
+        n_qubit_orbits, qubit_orbits = connected_components(
+            sp.csr_matrix(
+                (np.ones(perms.size), (np.tile(np.arange(n_qubits), len(perms)), perms.flatten())),
+                shape=(n_qubits, n_qubits),
+            ),
+            directed=False,
+        )
+        representatives = []
+        transverse = []
+        for k in range(n_qubit_orbits):
+            members = np.flatnonzero(qubit_orbits == k)
+            representatives.append(members[0])
+            transverse.append(
+                (basis.T @ sum(self.FockX[i] for i in members) @ basis).tocsr()
+            )
+        return {
+            "basis": basis,
+            "orbits": orbits,
+            "orbit_size": orbit_size,
+            "representatives": np.array(representatives),
+            "transverse": transverse,
+        }
+
+    def annealingH_symmetric(self, s: float) -> ndarray:
+        """Computes ``annealingH(s)`` in the symmetric sector of the qubit automorphisms
+        """
+        if self._symmetry is None:
+            self._symmetry = self._init_symmetry()
+        symmetry = self._symmetry
+        A, B = self.AS.AB(s)
+        A = A + self.offset["Aoffset"]
+        energy = np.bincount(
+            symmetry["orbits"], weights=self._isingH_diagonal(B)
+        ) / symmetry["orbit_size"]
+        H = sp.diags(energy, format="csr")
+        for idx, transverse in zip(symmetry["representatives"], symmetry["transverse"]):
+            H = H - A[idx] * transverse
+        return self.ising["energyscale"] * H
+
+    def _apply_H_symmetric(self, t, psi: ndarray) -> ndarray:
+        """Computes `i H(t) psi` in the symmetric sector"""
+        return -1j * self.annealingH_symmetric(t) @ psi
+
     def ground_state_degeneracy(
             self, H: ndarray, degeneracy_tol: float = 1e-6, debug: bool = False
     ) -> Tuple[ndarray, ndarray, ndarray]:
@@ -371,11 +639,26 @@ class TDSE:
             ``sigma^z_i \otimes 1``,
             ``sigma^z_i \otimes sigma^z_j \otimes 1``
         """
+        total_qubits = self.graph["total_qubits"]
         FockX, FockZ, FockProj_0, Fockproj1, Fockplus, Fockminus = (
-            [sp.csr_matrix(mmat) for mmat in mat]
-            for mat in _init_Fock(self.graph["total_qubits"])
+            OPERATOR_CACHE.get(
+                total_qubits, kind, lambda local=local: _init_Fock(total_qubits, local)
+            )
+            for kind, local in [
+                ("X", _SIG_X),
+                ("Z", _SIG_Z),
+                ("proj0", _PROJ_0),
+                ("proj1", _PROJ_1),
+                ("plus", _SIG_PLUS),
+                ("minus", _SIG_MINUS),
+            ]
+        )
+        FockZZ = OPERATOR_CACHE.get(
+            total_qubits, "ZZ", lambda: [m1 @ m2 for m2 in FockZ for m1 in FockZ]
         )
-        FockZZ = [[m1 @ m2 for m1 in FockZ] for m2 in FockZ]
+        FockZZ = [
+            FockZZ[i * total_qubits: (i + 1) * total_qubits] for i in range(total_qubits)
+        ]
         return FockX, FockZ, FockZZ, FockProj_0, Fockproj1, Fockplus, Fockminus
 
     def pushtoFock(self, i: int, local: ndarray) -> ndarray:
@@ -433,42 +716,136 @@ class TDSE:
             ]
         )
 
+    def _segments(self, start: float, end: float) -> ndarray:
+        """Returns ``start``, the schedule breakpoints in between and ``end``"""
+        breakpoints = self.AS.breakpoints
+        inside = breakpoints[(breakpoints > start) & (breakpoints < end)]
+        return np.concatenate([[start], inside, [end]])
+
     def annealingH(self, s: float) -> ndarray:
         """Computes ``H(s) = A(s) H_init + B(s) H_final`` in units of "energyscale"
         """
+        A, B = self.AS.AB(s)
         AxtransverseH = self._constructtransverseH(
-            (self.AS.A(s) + self.offset["Aoffset"]) * np.ones(self.graph["total_qubits"])
+            (A + self.offset["Aoffset"]) * np.ones(self.graph["total_qubits"])
         )
         BxIsingH = self._constructIsingH(
-            self._Bij(self.AS.B(s)) * self.ising["Jij"], self.AS.B(s) * self.ising["hi"]
+            self._Bij(B) * self.ising["Jij"], B * self.ising["hi"]
         )
         H = self.ising["energyscale"] * (-1 * AxtransverseH + BxIsingH)
         return H
 
+    def adaptive_t_eval(
+            self,
+            num: int = 100,
+            n_scan: int = 51,
+            uniform_fraction: float = 0.2,
+            degeneracy_tol: float = 1e-6,
+    ) -> ndarray:
+        """Returns output times concentrated around the minimal gap of H(s)
+
+        Scans the gap of ``annealingH`` between the ground state and the first level
+        outside the (possibly degenerate) final ground manifold on ``n_scan`` points.
+        That is, if the final ground state is ``k``-fold degenerate, the gap is
+        ``E_k(s) - E_0(s)``, which does not close at the end of the anneal.
+        The ``num`` output times are distributed according to the density
+        ``uniform_fraction + (1 - uniform_fraction) * 1 / gap(s)`` (normalized).
+        The uniform part guarantees a minimal resolution everywhere.
+
+        Arguments:
+            num: Total number of output times including start and end.
+            n_scan: Number of diagonalizations used for the gap scan.
+            uniform_fraction: Fraction of output times distributed uniformly.
+            degeneracy_tol: Final levels closer to the ground state than this fraction
+                of the final spectral width belong to the ground manifold.
+        """
+        start, end = self.offset["normalized_time"]
+        scan = np.linspace(start, end, n_scan)
+        energies = np.array(
+            [np.linalg.eigvalsh(self.annealingH(s).toarray()) for s in scan]
+        )
+        final = energies[-1] - energies[-1, 0]
+        n_ground = np.count_nonzero(final <= degeneracy_tol * final[-1])
+        if n_ground == final.size:
+            return np.linspace(start, end, num)
+        gap = energies[:, n_ground] - energies[:, 0]
+        inverse_gap = 1 / np.maximum(gap, 1e-3 * gap.max())
+        density = uniform_fraction + (1 - uniform_fraction) * inverse_gap / np.mean(
+            inverse_gap
+        )
+        cdf = np.concatenate(
+            [[0], np.cumsum((density[1:] + density[:-1]) / 2 * np.diff(scan))]
+        )
+        t_eval = np.interp(np.linspace(0, cdf[-1], num), cdf, scan)
+        t_eval[0], t_eval[-1] = start, end
+        return t_eval
+
     # @jit(nopython=True)
     def solve_pure(
-            self, y1: ndarray, ngrid: int = 11, debug: bool = False
+            self,
+            y1: ndarray,
+            ngrid: int = 11,
+            debug: bool = False,
+            t_eval: Optional[ndarray] = None,
+            symmetric: bool = False,
     ) -> PureSolutionInterface:
         """Solves time depepdent Schrödinger equation for pure inital state
+
+        The integration is restarted at the ``breakpoints`` of the anneal schedule
+        such that no step straddles a slope discontinuity.
+
+        Arguments:
+            y1: Initial wave function.
+            ngrid: Number of intervals after which the wave function is normalized.
+            debug: More output.
+            t_eval: Output times. Defaults to 100 uniformly spaced points,
+                see also ``adaptive_t_eval``.
+            symmetric: Evolve in the sector symmetric under the qubit automorphisms.
+                The solution is mapped back to the full Fock space.
+
+        Raises:
+            ValueError: If symmetric and y1 is not in the symmetric sector.
         """
+        apply_H = self._apply_H
+        if symmetric:
+            self.annealingH_symmetric(self.offset["normalized_time"][0])
+            basis = self._symmetry["basis"]
+            y_full = y1
+            y1 = basis.T @ y_full
+            if np.linalg.norm(basis @ y1 - y_full) > 1e-8 * np.linalg.norm(y_full):
+                raise ValueError("Initial state is not in the symmetric sector.")
+            apply_H = self._apply_H_symmetric
+
         start = self.offset["normalized_time"][0]
         end = self.offset["normalized_time"][1]
-        interval = np.linspace(start, end, ngrid)
+        interval = np.union1d(np.linspace(start, end, ngrid), self._segments(start, end))
+        if t_eval is None:
+            t_eval = np.linspace(start, end, num=100)
+        t_eval = np.asarray(t_eval)
 
         sol = PureSolutionInterface(y1)
 
-        for jj in range(ngrid - 1):
+        for jj in range(interval.size - 1):
             y1 = y1 / (np.sqrt(np.absolute(y1.conj().T @ y1)))
+            last = jj == interval.size - 2
+            mask = (t_eval >= interval[jj]) & (
+                (t_eval <= interval[jj + 1]) if last else (t_eval < interval[jj + 1])
+            )
             tempsol = solve_ivp(
-                fun=self._apply_H,
+                fun=apply_H,
                 t_span=[interval[jj], interval[jj + 1]],
                 y0=y1,
-                t_eval=np.linspace(*self.offset["normalized_time"], num=100),
-                **self.solver,
+                **{**self.solver, "dense_output": True},
             )
             y1 = tempsol.y[:, tempsol.t.size - 1]
-            sol.t = np.hstack((sol.t, tempsol.t))
-            sol.y = np.hstack((sol.y, tempsol.y))
+            if mask.any():
+                sol.t = np.hstack((sol.t, t_eval[mask]))
+                sol.y = np.hstack(
+                    (sol.y, tempsol.sol(t_eval[mask]).reshape(y1.size, -1))
+                )
+
+        if symmetric:
+            sol.y = basis @ sol.y
 
         if debug:
             print(
@@ -477,18 +854,241 @@ class TDSE:
             )
         return sol
 
+    def _init_liouville(self) -> Dict[str, ndarray]:
+        r"""Precomputes the time independent parts of ``H(s) otimes 1 - 1 otimes H(s)``
+
+        The transverse commutator ``sigma^x_i otimes 1 - 1 otimes sigma^x_i`` of all
+        qubits is stored as one sparse matrix. Each non-zero entry belongs to exactly
+        one qubit, thus the ``A_i(s)`` coefficients can be written into the data
+        array without rebuilding the sparsity structure.
+        The Ising commutator is diagonal and computed by ``_isingH_diagonal``.
+
+        Returns:
+            Dictionary with the transverse commutator and the qubit label and sign of
+            its data entries.
+        """
+        n_qubits = self.graph["total_qubits"]
+        size = 2 ** n_qubits
+        Fockid = sp.eye(size, dtype=np.int8)
+        rows, cols, signs, labels = [], [], [], []
+        for i in range(n_qubits):
+            for sign, mat in [
+                (1, sp.kron(self.FockX[i], Fockid, format="coo")),
+                (-1, sp.kron(Fockid, self.FockX[i], format="coo")),
+            ]:
+                rows.append(mat.row)
+                cols.append(mat.col)
+                signs.append(sign * mat.data)
+                labels.append(np.full(mat.nnz, i))
+        rows, cols, signs, labels = (
+            np.concatenate(arr) for arr in [rows, cols, signs, labels]
+        )
+        order = np.lexsort((cols, rows))
+        indptr = np.zeros(size ** 2 + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.bincount(rows, minlength=size ** 2))
+        transverse = sp.csr_matrix(
+            (signs[order].astype(float), cols[order], indptr), shape=(size ** 2, size ** 2)
+        )
+        return {
+            "transverse": transverse,
+            "signs": signs[order].astype(float),
+            "labels": labels[order],
+        }
+
+    def _isingH_diagonal(self, B: ndarray) -> ndarray:
+        """Diagonal of ``_constructIsingH(_Bij(B) * Jij, B * hi)`` in the computational basis
+        """
+        if self._zdiag is None:
+            self._zdiag = np.array([Z.diagonal() for Z in self.FockZ], dtype=float)
+        zdiag = self._zdiag
+        Jij = np.triu(self._Bij(B) * np.array(self.ising["Jij"]), 1)
+        return (B * np.array(self.ising["hi"])) @ zdiag + np.sum(
+            (Jij.T @ zdiag) * zdiag, axis=0
+        )
+
+    def _liouville_coefficients(self, s: float) -> Tuple[ndarray, ndarray]:
+        """Returns data of the transverse and diagonal of the Ising commutator at ``s``
+
+        Both are in units of "energyscale" and correspond to ``annealingH(s)``.
+        """
+        if self._liouville is None:
+            self._liouville = self._init_liouville()
+        A, B = self.AS.AB(s)
+        hx = -(A + self.offset["Aoffset"]) * np.ones(self.graph["total_qubits"])
+        energy = self._isingH_diagonal(B)
+        data = self.ising["energyscale"] * self._liouville["signs"] * hx[
+            self._liouville["labels"]
+        ]
+        diagonal = self.ising["energyscale"] * (energy[:, None] - energy[None, :])
+        return data, diagonal.reshape(-1)
+
+    def _init_liouville_local(self) -> Dict[str, Any]:
+        r"""Precomputes the local decoherence dissipator of ``get_lindblad2`` in Liouville space
+
+        Uses ``vec(A rho B) = (A otimes B^T) vec(rho)`` for row major vectorization.
+        For each qubit, the dissipator splits into a constant part and a part
+        proportional to the Boltzmann factor ``exp(-beta_local B_i(s) 2 |h_i|)``.
+        All parts and the Hamiltonian commutator are aligned on one sparsity pattern,
+        such that the Liouvillian at any ``s`` is a linear combination of data arrays.
+
+        Returns:
+            Dictionary with the ``indptr`` and ``indices`` of the pattern, the positions
+            of the transverse commutator data and of the diagonal in the pattern, the
+            summed constant part and the Boltzmann weighted parts (qubits x pattern).
+        """
+        n_qubits = self.graph["total_qubits"]
+        size = 2 ** n_qubits
+        Fockid = sp.eye(size, format="csr")
+
+        def dissipator(jump, jump_dag, proj):
+            return (
+                2.0 * sp.kron(jump, jump_dag.T)
+                - sp.kron(proj, Fockid)
+                - sp.kron(Fockid, proj.T)
+            ).tocoo()
+
+        constant = []
+        thermal = []
+        for i in range(n_qubits):
+            raising = dissipator(self.Fockplus[i], self.Fockminus[i], self.Fockproj0[i])
+            lowering = dissipator(
+                self.Fockminus[i], self.Fockplus[i], self.Fockproj1[i]
+            )
+            if (self.ising["hi"])[i] > 0:
+                constant.append(raising)
+                thermal.append(lowering)
+            else:
+                constant.append(lowering)
+                thermal.append(raising)
+
+        transverse = self._liouville["transverse"].tocoo()
+        diagonal = np.arange(size ** 2)
+        parts = [transverse] + constant + thermal
+        keys = np.unique(
+            np.concatenate(
+                [part.row.astype(np.int64) * size ** 2 + part.col for part in parts]
+                + [diagonal * (size ** 2 + 1)]
+            )
+        )
+
+        def position(part):
+            return np.searchsorted(keys, part.row.astype(np.int64) * size ** 2 + part.col)
+
+        constant_data = np.zeros(keys.size)
+        for part in constant:
+            np.add.at(constant_data, position(part), part.data)
+        thermal_data = sp.csr_matrix(
+            (
+                np.concatenate([part.data for part in thermal]),
+                (
+                    np.concatenate([np.full(part.nnz, i) for i, part in enumerate(thermal)]),
+                    np.concatenate([position(part) for part in thermal]),
+                ),
+            ),
+            shape=(n_qubits, keys.size),
+        )
+
+        rows = keys // size ** 2
+        indptr = np.zeros(size ** 2 + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.bincount(rows, minlength=size ** 2))
+        return {
+            "indptr": indptr,
+            "indices": keys % size ** 2,
+            "transverse": position(transverse),
+            "diagonal": np.searchsorted(keys, diagonal * (size ** 2 + 1)),
+            "constant": constant_data,
+            "thermal": thermal_data,
+        }
+
+    def _fullcounting_action(self, H: ndarray) -> Callable[[ndarray], ndarray]:
+        r"""Returns the action of the full counting dissipator of ``get_lindblad`` at fixed H
+
+        In the eigenbasis ``P_k = |v_k><v_k|`` of H, the dissipator is
+        ``V diag(2 R rho_d) V^dagger - (W rho + rho W)`` where ``rho_d`` is the
+        diagonal of rho in the eigenbasis, ``R`` the transition rate matrix and
+        ``W = V diag(w) V^dagger`` the total decay rates.
+        This avoids the loop over all pairs of eigenstates.
+        """
+        value, vector = np.linalg.eigh(H.toarray())
+        size = len(value)
+        upper = np.triu(np.ones((size, size)), 1)
+        boltzmann = upper * np.exp(
+            -self.beta * (value[None, :] - value[:, None]) * upper
+            / self.ising["energyscale"]
+        )
+        rates = 2.0 * (upper + boltzmann.T)
+        decay = vector @ np.diag(upper.sum(axis=0) + boltzmann.sum(axis=1)) @ vector.conj().T
+        vector_dag = vector.conj().T
+
+        def action(ymat: ndarray) -> ndarray:
+            rhod = np.sum(vector.conj() * (ymat @ vector), axis=0)
+            return (vector * (rates @ rhod)) @ vector_dag - (decay @ ymat + ymat @ decay)
+
+        return action
+
+    def _liouvillian(self, s: float) -> Callable[[ndarray], ndarray]:
+        """Returns the action of the Liouvillian of ``_apply_tdse_dense2`` at fixed ``s``
+
+        The Hamiltonian commutator and the local dissipator are assembled into one
+        sparse matrix on the cached pattern of ``_init_liouville_local``, the full
+        counting dissipator is applied in the eigenbasis of H(s).
+        """
+        data, diagonal = self._liouville_coefficients(s)
+        if self.gamma_local == 0:
+            commutator = self._liouville["transverse"].copy()
+            commutator.data = -1j * data
+            liouvillian = commutator + sp.diags(-1j * diagonal, format="csr")
+        else:
+            if "local" not in self._liouville:
+                self._liouville["local"] = self._init_liouville_local()
+            local = self._liouville["local"]
+            boltzmann = np.exp(
+                -self.beta_local * self.AS.B(s) * 2.0 * np.abs(self.ising["hi"])
+            )
+            values = self.gamma_local * (
+                local["constant"] + local["thermal"].T @ boltzmann
+            ).astype(complex)
+            values[local["transverse"]] -= 1j * data
+            values[local["diagonal"]] -= 1j * diagonal
+            liouvillian = sp.csr_matrix(
+                (values, local["indices"], local["indptr"]),
+                shape=(diagonal.size, diagonal.size),
+            )
+
+        if self.gamma == 0:
+            return liouvillian.dot
+
+        fullcounting = self._fullcounting_action(self.annealingH(s))
+
+        def action(y: ndarray) -> ndarray:
+            ymat = y.reshape((self.Focksize, self.Focksize))
+            return liouvillian.dot(y) + self.gamma * fullcounting(ymat).reshape(-1)
+
+        return action
+
     def _annealingH_densitymatrix(self, s: float) -> ndarray:
         """Tensor product of commutator of annealing Hamiltonian with id in Fock space
 
+        Assembled from the precomputed components of ``_init_liouville``.
+
         Code:
             H(s) otimes 1 - 1 otimes H(s)
         """
-        Fockid = sp.eye(self.Focksize)
-        return sp.kron(self.annealingH(s), Fockid) - sp.kron(Fockid, self.annealingH(s))
+        data, diagonal = self._liouville_coefficients(s)
+        transverse = self._liouville["transverse"].copy()
+        transverse.data = data
+        return transverse + sp.diags(diagonal, format="csr")
 
     def _apply_tdse_dense(self, t: float, y: ndarray) -> ndarray:
-        """Computes ``-i [H(s), rho(s)]`` for density vector `y`"""
-        f = -1j * self._annealingH_densitymatrix(t).dot(y)
+        """Computes ``-i [H(s), rho(s)]`` for density vector `y`
+
+        Updates the data of the precomputed transverse commutator in place instead of
+        assembling the superoperator.
+        """
+        data, diagonal = self._liouville_coefficients(t)
+        transverse = self._liouville["transverse"]
+        transverse.data = data
+        f = -1j * (transverse.dot(y) + diagonal * y)
         return f
 
     def _apply_tdse_dense2(self, t: float, y: ndarray) -> ndarray:
@@ -526,9 +1126,9 @@ class TDSE:
         ''' gamma: decoherence rate = 1/(decoherence time), the unit is the same as the Hamiltonian
         '''
         lindblad = np.zeros(((self.Focksize, self.Focksize)), dtype=complex)
+        # Boltzmann factors exp(-beta_local B_i(s) 2 |h_i|) of all qubits at once
+        e = np.exp(-self.beta_local * self.AS.B(t) * 2.0 * np.abs(self.ising["hi"]))
         for i in range(self.graph["total_qubits"]):
-            gap = 2.0 * abs((self.ising["hi"])[i])
-            e = np.exp(-self.beta_local * self.AS.B(t) * gap)
             if ((self.ising["hi"])[i] > 0):
                 lindblad = lindblad + 2.0 * (self.Fockplus[i]) @ (ymat) @ (self.Fockminus[i]) - (self.Fockproj0[i]) @ (
                     ymat) - (ymat) @ (self.Fockproj0[i])
@@ -624,17 +1224,150 @@ class TDSE:
         lindblad = gamma * lindblad
         return lindblad
 
-    def solve_mixed(self, rho: ndarray) -> ndarray:
+    def solve_mixed(self, rho: ndarray, t_eval: Optional[ndarray] = None) -> ndarray:
         """Solves the TDSE
+
+        If ``solver_params["method"]`` is ``"krylov"``, uses the exponential
+        integrator ``solve_mixed_krylov``, else ``solve_ivp``.
+        The integration is restarted at the ``breakpoints`` of the anneal schedule
+        such that no step straddles a slope discontinuity.
+
+        Arguments:
+            rho: Initial density matrix.
+            t_eval: Output times. Defaults to 100 uniformly spaced points,
+                see also ``adaptive_t_eval``.
         """
         self.Focksize = int(np.sqrt(len(rho)))
-        sol = solve_ivp(
-            fun=self._apply_tdse_dense2,
-            t_span=self.offset["normalized_time"],
-            y0=rho,
-            t_eval=np.linspace(*self.offset["normalized_time"], num=100),
-            **self.solver,
-        )
+        if t_eval is None:
+            t_eval = np.linspace(*self.offset["normalized_time"], num=100)
+        if self.solver.get("method") == "krylov":
+            return self.solve_mixed_krylov(rho, t_eval)
+        t_eval = np.asarray(t_eval)
+        segments = self._segments(*self.offset["normalized_time"])
+        sol = None
+        for jj in range(segments.size - 1):
+            last = jj == segments.size - 2
+            mask = (t_eval >= segments[jj]) & (
+                (t_eval <= segments[jj + 1]) if last else (t_eval < segments[jj + 1])
+            )
+            # the end of the segment is the initial value of the next one
+            extra = not last
+            segment_eval = t_eval[mask]
+            if extra:
+                segment_eval = np.append(segment_eval, segments[jj + 1])
+            tempsol = solve_ivp(
+                fun=self._apply_tdse_dense2,
+                t_span=segments[jj : jj + 2],
+                y0=rho,
+                t_eval=segment_eval,
+                **self.solver,
+            )
+            if extra:
+                rho = tempsol.y[:, -1]
+                tempsol.t = tempsol.t[:-1]
+                tempsol.y = tempsol.y[:, :-1]
+            if sol is None:
+                sol = tempsol
+            else:
+                sol.t = np.hstack((sol.t, tempsol.t))
+                sol.y = np.hstack((sol.y, tempsol.y))
+                for key in ["nfev", "njev", "nlu"]:
+                    sol[key] += tempsol[key]
+                sol.status = tempsol.status
+                sol.message = tempsol.message
+                sol.success = sol.success and tempsol.success
+        return sol
+
+    def solve_mixed_krylov(
+        self, rho: ndarray, t_eval: ndarray
+    ) -> KrylovSolutionInterface:
+        """Solves the Lindblad equation with a Krylov exponential integrator
+
+        Each step is a fourth order commutator free Magnus step: two exponentials of
+        Liouvillians combined from the Gauss nodes of the step, where the action
+        ``exp(dt L) rho`` is computed by an Arnoldi projection.
+        The local error is estimated by an embedded third order step which reuses both
+        Liouvillians (plus the Krylov projection error), and the step size is adapted
+        such that the error stays below ``atol + rtol * |rho|``. The Krylov spaces are
+        only extended until their projection error is negligible at the step size.
+        Steps end at the output times ``t_eval`` and at the ``breakpoints`` of the
+        anneal schedule.
+
+        Options read from ``solver_params``: ``rtol`` (1e-3), ``atol`` (1e-6),
+        ``krylov_dim`` (30), ``first_step`` and ``max_step``.
+        """
+        self.Focksize = int(np.sqrt(len(rho)))
+        start, end = self.offset["normalized_time"]
+        rtol = self.solver.get("rtol", 1e-3)
+        atol = self.solver.get("atol", 1e-6)
+        krylov_dim = self.solver.get("krylov_dim", 30)
+        max_step = self.solver.get("max_step", np.inf)
+        dt = min(self.solver.get("first_step", (end - start) / 100), max_step)
+
+        sol = KrylovSolutionInterface(rho)
+        t_eval = np.asarray(t_eval)
+        outputs = []
+        n_out = 0
+        while n_out < t_eval.size and t_eval[n_out] <= start:
+            outputs.append(rho)
+            n_out += 1
+
+        def step(t, tau, y):
+            """Fourth and embedded third order commutator free Magnus steps"""
+            L1 = self._liouvillian(t + _CFM4_NODES[0] * tau)
+            L2 = self._liouvillian(t + _CFM4_NODES[1] * tau)
+            # the a posteriori Krylov estimate is asymptotic, thus kept far below
+            # the tolerance
+            tol = 1e-3 * (atol + rtol * np.linalg.norm(y))
+            error = 0.0
+            results = []
+            for weights in [_CFM4_WEIGHTS, _CFM3_WEIGHTS]:
+                y_step = y
+                for w1, w2 in weights:
+                    propagate, nfev = _expm_krylov(
+                        lambda v: w1 * L1(v) + w2 * L2(v), y_step, krylov_dim, tau, tol
+                    )
+                    sol.nfev += 2 * nfev
+                    y_step, err = propagate(tau)
+                    error += err
+                results.append(y_step)
+            return results[0], np.linalg.norm(results[0] - results[1]) + error
+
+        segments = self._segments(start, end)
+        t = start
+        y = rho
+        while t < end:
+            # steps end at the next breakpoint of the schedule or output time
+            stop = segments[np.searchsorted(segments, t, side="right")]
+            if n_out < t_eval.size:
+                stop = min(stop, t_eval[n_out])
+            tau = min(dt, stop - t)
+            y_new, error = step(t, tau, y)
+            tolerance = atol + rtol * np.linalg.norm(y)
+            if error <= tolerance:
+                sol.n_steps += 1
+                t = t + tau if t + tau < stop else stop
+                y = y_new
+                while n_out < t_eval.size and t_eval[n_out] <= t:
+                    outputs.append(y)
+                    n_out += 1
+            else:
+                sol.n_rejected += 1
+            if tau < dt and error <= tolerance:
+                # shortened steps do not limit the next one
+                continue
+            factor = 5.0 if error == 0 else 0.9 * (tolerance / error) ** (1 / 4)
+            dt = min(tau * min(5.0, max(0.2, factor)), max_step)
+            if dt < 1e-12 * (end - start):
+                sol.message = "Required step size is less than spacing between numbers."
+                break
+        else:
+            sol.success = True
+            sol.message = "The solver successfully reached the end of the integration interval."
+
+        sol.t = t_eval[:n_out]
+        if outputs:
+            sol.y = np.array(outputs).T
         return sol
 
     # Compute Correlations
@@ -784,23 +1517,6 @@ class TDSE:
         return nA, esum
 
 
-@jit(nopython=True)
-def _pushtoFock(i: int, local: ndarray, total_qubits: int) -> ndarray:
-    """Tensor product of `local` at particle index i with 1 in fock space
-
-    Arguments:
-        i: particle index of matrix local
-        local: matrix operator
-    """
-    fock = np.array([[1]], dtype=np.int8)
-    for j in range(total_qubits):
-        if j == i:
-            fock = np.kron(fock, local)
-        else:
-            fock = np.kron(fock, ID2)
-    return fock
-
-
 _SIG_X = SIG_X.astype(np.int8)
 _SIG_Z = SIG_Z.astype(np.int8)
 _PROJ_0 = PROJ_0.astype(np.int8)
@@ -809,30 +1525,21 @@ _SIG_PLUS = SIG_PLUS.astype(np.int8)
 _SIG_MINUS = SIG_MINUS.astype(np.int8)
 
 
-@jit(nopython=True)
-def _init_Fock(total_qubits: int) -> Tuple[ndarray, ndarray, ndarray]:
-    r"""Computes pauli matrix tensor products
+def _init_Fock(total_qubits: int, local: ndarray) -> List[sp.csr_matrix]:
+    r"""Computes ``1 \otimes local_i \otimes 1`` for all particle indices i
 
-    Returns:
-        ``sigma^x_i \otimes 1``,
-        ``sigma^z_i \otimes 1``,
-        ``sigma^z_i \otimes sigma^z_j \otimes 1``
+    Arguments:
+        total_qubits: Number of particles
+        local: matrix operator
     """
-    shape = (total_qubits, 2 ** total_qubits, 2 ** total_qubits)
-    FockX = np.empty(shape, dtype=np.int8)
-    FockZ = np.empty(shape, dtype=np.int8)
-    Fockproj0 = np.empty(shape, dtype=np.int8)
-    Fockproj1 = np.empty(shape, dtype=np.int8)
-    Fockplus = np.empty(shape, dtype=np.int8)
-    Fockminus = np.empty(shape, dtype=np.int8)
-    for i in range(total_qubits):
-        FockX[i] = _pushtoFock(i, _SIG_X, total_qubits)
-        FockZ[i] = _pushtoFock(i, _SIG_Z, total_qubits)
-        Fockproj0[i] = _pushtoFock(i, _PROJ_0, total_qubits)
-        Fockproj1[i] = _pushtoFock(i, _PROJ_1, total_qubits)
-        Fockplus[i] = _pushtoFock(i, _SIG_PLUS, total_qubits)
-        Fockminus[i] = _pushtoFock(i, _SIG_MINUS, total_qubits)
-    return FockX, FockZ, Fockproj0, Fockproj1, Fockplus, Fockminus
+    return [
+        sp.kron(
+            sp.kron(sp.identity(2 ** i, dtype=np.int8), local),
+            sp.identity(2 ** (total_qubits - i - 1), dtype=np.int8),
+            format="csr",
+        )
+        for i in range(total_qubits)
+    ]
 
 
 """
@@ -0,0 +1,172 @@
+# pylint: disable=C0103, R0902, R0903
+"""Mean-field spin vector solver of the anneal dynamics for large graphs.
+
+Each qubit is represented by its Bloch vector ``m_i = (<X_i>, <Y_i>, <Z_i>)`` which
+precesses in the mean field of all other qubits. This approximation scales linearly
+in the number of qubits and is exact for uncoupled qubits.
+"""
+from typing import Dict, Any, List, Optional, Union, Tuple
+
+from numpy import ndarray
+import numpy as np
+from scipy.integrate import solve_ivp
+
+from qlp.tdse.schedule import AnnealSchedule
+
+
+class MeanFieldSolutionInterface:
+    """Interface for a mean-field solution
+
+    Attributes:
+        t: array
+            Output times.
+        y: array
+            Flattened Bloch vectors of shape (n_schedules * n_qubits * 3, t.size).
+        bloch: array
+            Bloch vectors of shape (t.size, n_schedules, n_qubits, 3).
+    """
+
+    def __init__(self, t: ndarray, y: ndarray, n_schedules: int, n_qubits: int):
+        self.t = t
+        self.y = y
+        self.bloch = y.T.reshape(t.size, n_schedules, n_qubits, 3)
+
+
+class MeanFieldTDSE:
+    """Mean-field solver for the anneal dynamics of many qubits and schedules at once
+
+    Uses the same parameters as ``TDSE``. The mean-field equations of motion for
+    ``H(s) = sum_i b_i(s) . sigma_i`` are ``d m_i / ds = 2 b_i(s) x m_i`` with
+    the effective field
+
+    ``b_i = energyscale * (-A_i(s), 0, B_i(s) h_i + sum_j sqrt(B_i B_j) J_ij m^z_j)``.
+
+    The right hand side is vectorized over qubits and over anneal schedules, i.e.,
+    ``offset_params`` can be a list of parameter dicts which are solved simultaneously.
+
+    .. code-block:: python
+
+        tdse = MeanFieldTDSE(graph_params, ising_params, [offset1, offset2], solver_params)
+        sol = tdse.solve()
+
+        zi = sol.bloch[-1, :, :, 2]  # final <Z_i> for each schedule
+    """
+
+    def __init__(
+            self,
+            graph_params: Dict[str, Any],
+            ising_params: Dict[str, Any],
+            offset_params: Union[Dict[str, Any], List[Dict[str, Any]]],
+            solver_params: Dict[str, Any],
+    ):
+        """Init the class with
+
+        Arguments:
+            graph_params: Parameters of input graph
+            ising_params: Parameters for the ising model, e.g., keys are
+                {"Jij", "hi", "c", "energyscale"}.
+            offset_params: Parameters for AnnealSchedule or a list of those.
+                All schedules must share "normalized_time".
+            solver_params: Parameters for solve_ivp
+        """
+        self.graph = graph_params
+        self.ising = ising_params
+        self.offset = [offset_params] if isinstance(offset_params, dict) else list(offset_params)
+        self.solver = solver_params
+        self.AS = [
+            AnnealSchedule(**offset, graph_params=graph_params) for offset in self.offset
+        ]
+        self.n_schedules = len(self.AS)
+
+        Jij = np.array(self.ising["Jij"], dtype=float)
+        self.Jij = np.triu(Jij, 1) + np.triu(Jij, 1).T
+        self.hi = np.array(self.ising["hi"], dtype=float)
+        self.Aoffset = np.array([[offset["Aoffset"]] for offset in self.offset])
+
+    def coefficients(self, s: float) -> Tuple[ndarray, ndarray]:
+        """Returns ``A_i(s)`` (including "Aoffset") and ``B_i(s)`` for all schedules
+
+        Both arrays are of shape (n_schedules, n_qubits).
+        """
+        n_qubits = self.graph["total_qubits"]
+        A, B = zip(*(AS.AB(s) for AS in self.AS))
+        A = np.array(A) * np.ones(n_qubits) + self.Aoffset
+        B = np.array(B) * np.ones(n_qubits)
+        return A, B
+
+    def init_bloch(self) -> ndarray:
+        """Returns the ground state of the transverse Hamiltonian ``m_i = (1, 0, 0)``
+        for all schedules and qubits.
+        """
+        bloch = np.zeros((self.n_schedules, self.graph["total_qubits"], 3))
+        bloch[..., 0] = 1.0
+        return bloch
+
+    def _apply_meanfield(self, t: float, y: ndarray) -> ndarray:
+        """Computes ``2 b_i(t) x m_i`` for flattened Bloch vectors ``y``"""
+        bloch = y.reshape(self.n_schedules, self.graph["total_qubits"], 3)
+        A, B = self.coefficients(t)
+        sqrtB = np.sqrt(B)
+        field = np.zeros_like(bloch)
+        field[..., 0] = -A
+        field[..., 2] = B * self.hi + sqrtB * ((sqrtB * bloch[..., 2]) @ self.Jij)
+        return (2.0 * self.ising["energyscale"] * np.cross(field, bloch)).reshape(-1)
+
+    def solve(
+            self, bloch: Optional[ndarray] = None, t_eval: Optional[ndarray] = None
+    ) -> MeanFieldSolutionInterface:
+        """Solves the mean-field equations of motion
+
+        Arguments:
+            bloch: Initial Bloch vectors of shape (n_schedules, n_qubits, 3).
+                Defaults to ``init_bloch``.
+            t_eval: Output times. Defaults to 100 uniformly spaced points.
+        """
+        normalized_time = self.offset[0]["normalized_time"]
+        if bloch is None:
+            bloch = self.init_bloch()
+        if t_eval is None:
+            t_eval = np.linspace(*normalized_time, num=100)
+        sol = solve_ivp(
+            fun=self._apply_meanfield,
+            t_span=normalized_time,
+            y0=np.asarray(bloch, dtype=float).reshape(-1),
+            t_eval=t_eval,
+            **self.solver,
+        )
+        return MeanFieldSolutionInterface(
+            sol.t, sol.y, self.n_schedules, self.graph["total_qubits"]
+        )
+
+    @staticmethod
+    def cZ(ti: int, xi: int, sol: MeanFieldSolutionInterface) -> ndarray:
+        """Returns ``<Z_xi>`` at output time index ``ti`` for all schedules"""
+        return sol.bloch[ti, :, xi, 2]
+
+    @staticmethod
+    def cZZ(ti: int, xi: int, xj: int, sol: MeanFieldSolutionInterface) -> ndarray:
+        """Returns the mean-field ``<Z_xi Z_xj> = <Z_xi><Z_xj>`` for all schedules"""
+        if xi == xj:
+            return np.ones(sol.bloch.shape[1])
+        return sol.bloch[ti, :, xi, 2] * sol.bloch[ti, :, xj, 2]
+
+    @staticmethod
+    def state_probability(
+            sol: MeanFieldSolutionInterface, states: List[Tuple[int]], ti: int = -1
+    ) -> ndarray:
+        """Returns the probability of measuring any of the bit strings in ``states``
+
+        The mean-field state is a product state, thus the probability of a bit string
+        is ``prod_i (1 + (1 - 2 b_i) <Z_i>) / 2`` where bit 0 corresponds to ``Z = +1``.
+
+        Arguments:
+            sol: Solution of ``solve``.
+            states: Bit strings, e.g., the Ising ground states.
+            ti: Output time index.
+
+        Returns:
+            Probability for each schedule.
+        """
+        z = sol.bloch[ti, :, :, 2]
+        spins = 1 - 2 * np.array(states, dtype=float)
+        return np.sum(np.prod((1 + spins[:, None, :] * z[None]) / 2, axis=2), axis=0)
@@ -0,0 +1,313 @@
+# pylint: disable=C0103, R0902, R0903
+"""Matrix product state solver of the time dependent Schrödinger equation for chains.
+
+This module provides a TEBD evolution for Ising models with nearest neighbor couplings
+``J_{i,i+1}`` which avoids constructing the many-body Fock space.
+"""
+from typing import Dict, Any, Tuple, List, Optional
+
+from numpy import ndarray
+import numpy as np
+from scipy.linalg import expm, svd, LinAlgError
+
+from qlp.tdse.schedule import AnnealSchedule
+
+
+SIG_X = np.array([[0.0, 1.0], [1.0, 0.0]])
+SIG_Z = np.array([[1.0, 0.0], [0.0, -1.0]])
+ID2 = np.identity(2)
+
+
+def _transfer(env: ndarray, A: ndarray, op: Optional[ndarray] = None) -> ndarray:
+    """Contracts the left environment with site tensor ``A`` and optional operator ``op``
+
+    Returns ``sum_{a,b,s,t} env[a, b] conj(A[a, s, c]) op[s, t] A[b, t, d]``.
+    """
+    ket = A if op is None else np.tensordot(op, A, axes=(1, 1)).transpose(1, 0, 2)
+    return np.tensordot(np.tensordot(env, A.conj(), axes=(0, 0)), ket, axes=([0, 1], [0, 1]))
+
+
+class MPSSolutionInterface:
+    """Interface for a matrix product state solution
+
+    Attributes:
+        t: array
+            Output times.
+        z: array
+            Expectation values ``<Z_i>`` at output times, shape (t.size, n_qubits).
+        mps: List[ndarray]
+            Final state. Site tensors of shape (chi_left, 2, chi_right) where the
+            first site is the orthogonality center.
+        truncation_error: float
+            Sum of discarded (normalized) singular value weights of all truncations.
+        max_bond_dim: int
+            Largest bond dimension reached during the evolution.
+    """
+
+    def __init__(self, n_qubits: int):
+        self.t = np.zeros((0))
+        self.z = np.zeros((0, n_qubits))
+        self.mps = []
+        self.truncation_error = 0.0
+        self.max_bond_dim = 1
+
+
+class MPSTDSE:
+    """Time dependent Schrödinger equation solver for nearest neighbor Ising chains
+
+    Uses the same parameters as ``TDSE`` but represents the wave function as a matrix
+    product state. The evolution is a second order TEBD sweep with a bond dimension
+    cap and therefore scales linearly in the number of qubits.
+
+    .. code-block:: python
+
+        tdse = MPSTDSE(graph_params, ising_params, offset_params, solver_params)
+        psi = tdse.init_wavefunction("transverse")
+        sol = tdse.solve_pure(psi)
+
+        zi = [tdse.cZ(-1, xi, sol) for xi in range(n)]
+        prob = tdse.ground_state_probability(sol)
+
+    ``solver_params`` keys are ``n_steps`` (1000), ``max_bond_dim`` (64) and
+    ``cutoff`` (1e-12, relative discarded weight per truncation).
+    """
+
+    def __init__(
+            self,
+            graph_params: Dict[str, Any],
+            ising_params: Dict[str, Any],
+            offset_params: Dict[str, Any],
+            solver_params: Dict[str, Any],
+    ):
+        """Init the class with
+
+        Arguments:
+            graph_params: Parameters of input graph
+            ising_params: Parameters for the ising model, e.g., keys are
+                {"Jij", "hi", "c", "energyscale"}.
+            offset_params: Parameters for AnnealSchedule
+            solver_params: Parameters for the TEBD evolution
+
+        Raises:
+            ValueError: If Jij couples qubits which are not nearest neighbors.
+        """
+        self.graph = graph_params
+        self.ising = ising_params
+        self.offset = offset_params
+        self.solver = solver_params
+        self.AS = AnnealSchedule(**offset_params, graph_params=graph_params)
+
+        n_qubits = self.graph["total_qubits"]
+        # like ``TDSE._constructIsingH``, only the upper triangle is used
+        Jij = np.triu(np.array(self.ising["Jij"], dtype=float), 1)
+        if np.any(np.triu(Jij, 2) != 0):
+            raise ValueError("MPSTDSE requires nearest neighbor couplings J_{i,i+1}.")
+        if n_qubits < 2:
+            raise ValueError("MPSTDSE requires at least two qubits.")
+        self.Jnn = np.diagonal(Jij, offset=1).copy()
+        self.hi = np.array(self.ising["hi"], dtype=float)
+
+    def _bond_hamiltonians(self, s: float) -> List[ndarray]:
+        """Two-site terms of ``annealingH(s)`` in units of "energyscale"
+
+        Site ``i`` contributes its single-site terms to bond ``(i, i+1)``,
+        the last site to the last bond.
+        """
+        n_qubits = self.graph["total_qubits"]
+        A, B = self.AS.AB(s)
+        A = (A + self.offset["Aoffset"]) * np.ones(n_qubits)
+        B = B * np.ones(n_qubits)
+        local = [-A[i] * SIG_X + B[i] * self.hi[i] * SIG_Z for i in range(n_qubits)]
+        bonds = []
+        for i in range(n_qubits - 1):
+            h = np.sqrt(B[i] * B[i + 1]) * self.Jnn[i] * np.kron(SIG_Z, SIG_Z)
+            h = h + np.kron(local[i], ID2)
+            if i == n_qubits - 2:
+                h = h + np.kron(ID2, local[i + 1])
+            bonds.append(self.ising["energyscale"] * h)
+        return bonds
+
+    def init_wavefunction(self, dtype: str = "transverse") -> List[ndarray]:
+        """Returns the ground state of the transverse Hamiltonian as a product state
+
+        Raises:
+            TypeError: If dtype is not "transverse".
+        """
+        if dtype != "transverse":
+            raise TypeError("MPSTDSE only implements the transverse initial state.")
+        plus = np.array([1.0, 1.0], dtype=complex) / np.sqrt(2)
+        return [plus.reshape(1, 2, 1).copy() for _ in range(self.graph["total_qubits"])]
+
+    def _apply_gate(
+            self,
+            mps: List[ndarray],
+            i: int,
+            gate: ndarray,
+            move_right: bool,
+            sol: MPSSolutionInterface,
+    ):
+        """Applies a two-site gate on ``(i, i+1)`` with the orthogonality center at the bond
+
+        Truncates the bond by SVD and moves the orthogonality center to ``i+1`` if
+        ``move_right`` else to ``i``.
+        """
+        chi_left, chi_right = mps[i].shape[0], mps[i + 1].shape[2]
+        theta = np.tensordot(mps[i], mps[i + 1], axes=(2, 0))
+        theta = np.tensordot(gate.reshape(2, 2, 2, 2), theta, axes=([2, 3], [1, 2]))
+        theta = theta.transpose(2, 0, 1, 3).reshape(chi_left * 2, 2 * chi_right)
+        try:
+            U, S, V = svd(theta, full_matrices=False)
+        except LinAlgError:
+            U, S, V = svd(theta, full_matrices=False, lapack_driver="gesvd")
+
+        weights = S ** 2 / np.sum(S ** 2)
+        keep = min(
+            self.solver.get("max_bond_dim", 64),
+            max(1, np.sum(weights > self.solver.get("cutoff", 1e-12))),
+        )
+        sol.truncation_error += np.sum(weights[keep:])
+        sol.max_bond_dim = max(sol.max_bond_dim, keep)
+        U, S, V = U[:, :keep], S[:keep] / np.linalg.norm(S[:keep]), V[:keep]
+        if move_right:
+            mps[i] = U.reshape(chi_left, 2, keep)
+            mps[i + 1] = (S[:, None] * V).reshape(keep, 2, chi_right)
+        else:
+            mps[i] = (U * S[None, :]).reshape(chi_left, 2, keep)
+            mps[i + 1] = V.reshape(keep, 2, chi_right)
+
+    def solve_pure(
+            self, psi: List[ndarray], t_eval: Optional[ndarray] = None
+    ) -> MPSSolutionInterface:
+        """Solves time depepdent Schrödinger equation for an initial matrix product state
+
+        Each step of size ``dt`` sweeps ``exp(-i dt/2 h_{i,i+1})`` from the first to the
+        last bond and back, which is a symmetric, second order splitting.
+        The Hamiltonian is evaluated at the step midpoint.
+
+        Arguments:
+            psi: Initial state with orthogonality center at the first site,
+                e.g., ``init_wavefunction``.
+            t_eval: Output times for ``<Z_i>``. Defaults to 100 uniformly spaced
+                points. Times are rounded to the nearest step.
+        """
+        start, end = self.offset["normalized_time"]
+        n_steps = self.solver.get("n_steps", 1000)
+        dt = (end - start) / n_steps
+        if t_eval is None:
+            t_eval = np.linspace(start, end, num=100)
+        out_steps = np.rint((np.asarray(t_eval) - start) / dt).astype(int)
+
+        n_qubits = self.graph["total_qubits"]
+        sol = MPSSolutionInterface(n_qubits)
+        mps = [A.astype(complex) for A in psi]
+
+        z = []
+        for step in range(n_steps + 1):
+            for _ in range(np.sum(out_steps == step)):
+                z.append(self._local_expectation(mps, SIG_Z))
+            if step == n_steps:
+                break
+            bonds = self._bond_hamiltonians(start + (step + 0.5) * dt)
+            gates = [expm(-1j * dt / 2 * h) for h in bonds]
+            for i in range(n_qubits - 1):
+                self._apply_gate(mps, i, gates[i], move_right=True, sol=sol)
+            for i in reversed(range(n_qubits - 1)):
+                self._apply_gate(mps, i, gates[i], move_right=False, sol=sol)
+
+        sol.t = start + out_steps * dt
+        sol.z = np.array(z).reshape(-1, n_qubits)
+        sol.mps = mps
+        return sol
+
+    @staticmethod
+    def _local_expectation(mps: List[ndarray], op: ndarray) -> ndarray:
+        """Computes ``<op_i>`` for all sites of an MPS with center at the first site
+        """
+        values = []
+        env = np.ones((1, 1), dtype=complex)
+        for A in mps:
+            values.append(np.trace(_transfer(env, A, op)).real)
+            env = _transfer(env, A)
+        return np.array(values) / np.trace(env).real
+
+    @staticmethod
+    def correlation_matrix(mps: List[ndarray], op: ndarray = SIG_Z) -> ndarray:
+        """Computes ``<op_i op_j>`` for all pairs of an MPS with center at the first site
+
+        Sites right of ``j`` are right canonical and contract to the identity, thus
+        each row costs one sweep.
+        """
+        n_qubits = len(mps)
+        values = np.identity(n_qubits)
+        env = np.ones((1, 1), dtype=complex)
+        for i, A in enumerate(mps):
+            corr = _transfer(env, A, op)
+            for j in range(i + 1, n_qubits):
+                values[i, j] = values[j, i] = np.trace(_transfer(corr, mps[j], op)).real
+                corr = _transfer(corr, mps[j])
+            env = _transfer(env, A)
+        return values
+
+    def cZ(self, ti: int, xi: int, sol: MPSSolutionInterface) -> float:
+        """Returns ``<Z_xi>`` at output time index ``ti``"""
+        return sol.z[ti, xi]
+
+    def cZZ(self, xi: int, xj: int, sol: MPSSolutionInterface) -> float:
+        """Returns ``<Z_xi Z_xj>`` of the final state"""
+        return self.correlation_matrix(sol.mps)[xi, xj]
+
+    def ising_ground_states(
+            self, tol: float = 1e-9, max_states: int = 10000
+    ) -> Tuple[float, List[Tuple[int]]]:
+        """Computes all ground states of the (exact) Ising chain by dynamic programming
+
+        Arguments:
+            tol: Tolerance for degenerate energies.
+            max_states: Maximal number of degenerate states returned.
+
+        Returns:
+            Ground state energy and list of bit strings (0 corresponds to ``Z = +1``).
+        """
+        n_qubits = self.graph["total_qubits"]
+        spin = np.array([1.0, -1.0])
+        # best[k][b]: minimal energy of sites 0..k with bit b at site k
+        best = [self.hi[0] * spin]
+        for k in range(1, n_qubits):
+            candidates = (
+                best[-1][:, None]
+                + self.Jnn[k - 1] * np.outer(spin, spin)
+                + self.hi[k] * spin[None, :]
+            )
+            best.append(candidates.min(axis=0))
+
+        e_min = best[-1].min()
+        states = [((b,), b) for b in range(2) if best[-1][b] - e_min <= tol]
+        for k in reversed(range(n_qubits - 1)):
+            new_states = []
+            for bits, b_next in states:
+                for b in range(2):
+                    energy = (
+                        best[k][b]
+                        + self.Jnn[k] * spin[b] * spin[b_next]
+                        + self.hi[k + 1] * spin[b_next]
+                    )
+                    if energy - best[k + 1][b_next] <= tol:
+                        new_states.append(((b,) + bits, b))
+            states = new_states[:max_states]
+        return e_min, [bits for bits, _ in states]
+
+    def ground_state_probability(self, sol: MPSSolutionInterface, **kwargs) -> float:
+        """Returns the probability of the final state to be in an Ising ground state
+
+        Arguments:
+            sol: Solution of ``solve_pure``.
+            kwargs: Parameters for ``ising_ground_states``.
+        """
+        _, states = self.ising_ground_states(**kwargs)
+        prob = 0.0
+        for bits in states:
+            amplitude = np.ones((1, 1), dtype=complex)
+            for A, b in zip(sol.mps, bits):
+                amplitude = amplitude @ A[:, b, :]
+            prob += abs(amplitude[0, 0]) ** 2
+        return prob
@@ -2,17 +2,150 @@
 
 """Functions and classes which define TDSE anneal schedule setups
 """
-from typing import Optional
+from typing import Optional, Tuple, Dict, List
 
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+
+import numpy as np
 from numpy import linspace, exp, array, ndarray
 from scipy.interpolate import interp1d
 from pandas import read_excel
+from numba import jit
 
 from matplotlib.pyplot import subplots, draw, show, savefig
 
 from qlp.mds.mds_qlpdb import AnnealOffset, find_offset
 
 
+class ScheduleRegistry:
+    """Registry of named anneal schedule curves shared by all ``s_to_offset`` instances
+
+    Spreadsheets are parsed once and stored as ``.npy`` files in ``directory``, keyed
+    by the hash of the spreadsheet. Later lookups, also in other processes, load the
+    curves as read-only memory maps. Relative spreadsheet paths are resolved against
+    ``data_directory`` when registering, independent of the working directory.
+
+    .. code-block:: python
+
+        SCHEDULE_REGISTRY.register("dw_2000q_5", "09-1212A-B_DW_2000Q_5_anneal_schedule.xlsx")
+        SCHEDULE_REGISTRY.register("pause", schedule={"s": ..., "C (normalized)": ..., ...})
+        s2o = s_to_offset("truncate", "dw_2000q_5")
+
+    Attributes:
+        directory: str
+            Directory of the parsed curves.
+        data_directory: str
+            Directory of spreadsheets registered by relative path.
+    """
+
+    def __init__(
+            self, directory: Optional[str] = None, data_directory: Optional[str] = None
+    ):
+        self.directory = directory or os.path.join(
+            tempfile.gettempdir(), "qlp-schedules"
+        )
+        self.data_directory = os.path.abspath(data_directory or os.getcwd())
+        self._sources = {}
+        self._schedules = {}
+        self._lock = threading.RLock()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._sources
+
+    def register(
+            self,
+            name: str,
+            io: Optional[str] = None,
+            schedule: Optional[Dict[str, ndarray]] = None,
+            sheet_name: int = 1,
+    ):
+        """Registers a schedule by name
+
+        Arguments:
+            name: Name used as ``anneal_curve`` in ``s_to_offset``.
+            io: Path of the spreadsheet of the schedule, relative paths are relative
+                to ``data_directory``.
+            schedule: Columns of the schedule. Must contain "s", "C (normalized)",
+                "A(s) (GHz)" and "B(s) (GHz)". Used instead of ``io``.
+            sheet_name: Sheet of the spreadsheet containing the schedule.
+
+        Raises:
+            ValueError: If not exactly one of ``io`` and ``schedule`` is given.
+        """
+        if (io is None) == (schedule is None):
+            raise ValueError("Specify either the spreadsheet or the schedule.")
+        if io is not None:
+            io = os.path.join(self.data_directory, io)
+        with self._lock:
+            self._sources[name] = (io, sheet_name)
+            self._schedules.pop(name, None)
+            if schedule is not None:
+                self._schedules[name] = (
+                    None,
+                    {key: np.asarray(val, dtype=float) for key, val in schedule.items()},
+                )
+
+    def get(self, name: str) -> Dict[str, ndarray]:
+        """Returns the columns of a registered schedule
+
+        Raises:
+            KeyError: If the schedule is not registered.
+        """
+        if name not in self._sources:
+            raise KeyError(f"Anneal curve {name} not reckognized")
+        io, sheet_name = self._sources[name]
+        with self._lock:
+            if io is None:
+                return self._schedules[name][1]
+            stat = os.stat(io)
+            key = (os.path.abspath(io), stat.st_mtime_ns, stat.st_size)
+            if name in self._schedules and self._schedules[name][0] == key:
+                return self._schedules[name][1]
+            schedule = self._load(io, sheet_name)
+            self._schedules[name] = (key, schedule)
+            return schedule
+
+    def _load(self, io: str, sheet_name: int) -> Dict[str, ndarray]:
+        """Loads parsed curves from disk or parses and stores the spreadsheet"""
+        with open(io, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        path = os.path.join(self.directory, f"schedule_{digest}_{sheet_name}")
+        if not os.path.exists(path):
+            print(f"anneal schedule from {io}")
+            anneal_schedule = read_excel(io=io, sheet_name=sheet_name)
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = tempfile.mkdtemp(dir=self.directory)
+            np.save(
+                os.path.join(tmp, "columns.npy"),
+                np.array([str(key) for key in anneal_schedule.columns]),
+            )
+            np.save(
+                os.path.join(tmp, "values.npy"),
+                np.ascontiguousarray(anneal_schedule.values, dtype=float),
+            )
+            try:
+                os.rename(tmp, path)
+            except OSError:
+                # another process stored the same schedule first
+                shutil.rmtree(tmp, ignore_errors=True)
+        columns = np.load(os.path.join(path, "columns.npy"))
+        values = np.load(os.path.join(path, "values.npy"), mmap_mode="r")
+        return {str(key): values[:, n] for n, key in enumerate(columns)}
+
+
+# Spreadsheets are looked up next to this module unless QLP_SCHEDULE_DIR is set
+SCHEDULE_REGISTRY = ScheduleRegistry(
+    data_directory=os.environ.get(
+        "QLP_SCHEDULE_DIR", os.path.dirname(os.path.abspath(__file__))
+    )
+)
+SCHEDULE_REGISTRY.register("dwave", "09-1216A-A_DW_2000Q_6_annealing_schedule.xlsx")
+
+
 class s_to_offset:
     """Class which provides anneal curves for A(s) (original Hamiltonian coefficient),
     B(s) (final Hamiltonian coefficient) and C(s) (anneal time) over normalized
@@ -29,11 +162,18 @@ class s_to_offset:
             Interpolated curve for B(s) in GHz.
         interpC: np.ndarray
             Interpolated curve for C(s).
+        fill_value: str
+            Fill value of A(s) and B(s), "extrapolate" or "truncate".
     """
 
     maxB = 11.8604700
 
-    def __init__(self, fill_value: str, anneal_curve: str):
+    def __init__(
+            self,
+            fill_value: str,
+            anneal_curve: str,
+            schedule: Optional[List[Tuple[float, float]]] = None,
+    ):
         """Allocates offset curves A(s), B(s), C(s) over normalized anneal time s in GHz.
 
         Arguments:
@@ -42,10 +182,18 @@ class s_to_offset:
                 or truncate it at the nearest value.
                 Options are "extrapolate" or "truncate".
             anneal_curve: Curve normalized time follows.
-                Options are "linear", "logistic" or "dwave" (reads in excel file).
+                Options are "linear", "logistic", "constantA", "constantB" or any
+                schedule of ``SCHEDULE_REGISTRY``, e.g., "dwave" (reads in excel file).
+            schedule: Piecewise linear anneal fraction C(s) as list of
+                ``(time, fraction)`` pairs in the format of the D-Wave
+                ``anneal_schedule`` parameter, e.g., a pause
+                ``[(0, 0.0), (100, 0.5), (200, 0.5), (300, 1.0)]``
+                or a reverse anneal ``[(0, 1.0), (100, 0.5), (200, 1.0)]``.
+                Times are normalized by the last time. Replaces C(s) of the curve.
 
         Raises:
             KeyError: If one of the inputs is not reckognized
+            ValueError: If the times of the schedule are not strictly increasing
         """
         if anneal_curve == "linear":
 
@@ -80,16 +228,9 @@ class s_to_offset:
                 "A(s) (GHz)": [0, 0],
                 "B(s) (GHz)": [self.maxB, self.maxB],
             }
-        elif anneal_curve == "dwave":
+        elif anneal_curve in SCHEDULE_REGISTRY:
             #io = "./09-1212A-B_DW_2000Q_5_anneal_schedule.xlsx"
-            io = "./09-1216A-A_DW_2000Q_6_annealing_schedule.xlsx"
-            print(f"anneal schedule from {io}")
-            anneal_schedule = read_excel(
-                io=io, sheet_name=1
-            )
-            self.anneal_schedule = {
-                key: anneal_schedule[key].values for key in anneal_schedule.columns
-            }
+            self.anneal_schedule = SCHEDULE_REGISTRY.get(anneal_curve)
             #for key in self.anneal_schedule:
             #    if key in ["A(s) (GHz)", "B(s) (GHz)"]:
             #        self.anneal_schedule[key] = [round(i, 3) for i in self.anneal_schedule[key]]
@@ -110,6 +251,7 @@ class s_to_offset:
             )
         else:
             raise KeyError(f"Fill value {fill_value} not reckognized")
+        self.fill_value = fill_value
 
         paramsA = {
             "kind": "linear",
@@ -122,9 +264,17 @@ class s_to_offset:
             "fill_value": fill_valueB,
         }  # linear makes for more sensible extrapolation.
         paramsC = {"kind": "linear", "fill_value": "extrapolate"}
-        self.interpC = interp1d(
-            self.anneal_schedule["s"], self.anneal_schedule["C (normalized)"], **paramsC
-        )
+        if schedule is not None:
+            time, fraction = np.array(schedule, dtype=float).T
+            if time.size < 2 or np.any(np.diff(time) <= 0):
+                raise ValueError("Schedule times must be strictly increasing.")
+            self.interpC = interp1d(time / time[-1], fraction, **paramsC)
+        else:
+            self.interpC = interp1d(
+                self.anneal_schedule["s"],
+                self.anneal_schedule["C (normalized)"],
+                **paramsC,
+            )
         self.interpA = interp1d(
             self.anneal_schedule["C (normalized)"],
             self.anneal_schedule["A(s) (GHz)"],
@@ -172,6 +322,97 @@ class s_to_offset:
         show()
 
 
+@jit(nopython=True)
+def interpolate_table(
+        s: float, grid: ndarray, values: ndarray, extrapolate: bool = True
+) -> ndarray:
+    """Linear interpolation of table rows
+
+    Can be called from numba kernels.
+
+    Arguments:
+        s: Normalized time.
+        grid: Sorted grid of normalized times of size K >= 2.
+        values: Table of shape (K, n_qubits).
+        extrapolate: Extrapolates linearly beyond the grid if True, else uses the
+            values at the boundaries.
+    """
+    if not extrapolate:
+        s = min(max(s, grid[0]), grid[-1])
+    idx = np.searchsorted(grid, s, side="right") - 1
+    idx = min(max(idx, 0), grid.size - 2)
+    weight = (s - grid[idx]) / (grid[idx + 1] - grid[idx])
+    return (1.0 - weight) * values[idx] + weight * values[idx + 1]
+
+
+def _crossings(y: ndarray, xk: ndarray, yk: ndarray) -> ndarray:
+    """Returns all x where the linearly extrapolated interpolation of (xk, yk) hits y
+
+    Arguments:
+        y: Target values.
+        xk: Sorted knots.
+        yk: Values at the knots, not necessarily monotonic.
+    """
+    y = np.asarray(y, dtype=float).reshape(-1)
+    xk, yk = np.asarray(xk, dtype=float), np.asarray(yk, dtype=float)
+    dx, dy = np.diff(xk), np.diff(yk)
+    # the first and last segments extend to infinity
+    lower = np.zeros(dx.size)
+    lower[0] = -np.inf
+    upper = np.ones(dx.size)
+    upper[-1] = np.inf
+    moving = dy != 0
+    t = (y[None, :] - yk[:-1][moving, None]) / dy[moving, None]
+    valid = (t >= lower[moving, None]) & (t <= upper[moving, None])
+    return (xk[:-1][moving, None] + t * dx[moving, None])[valid]
+
+
+class CoefficientTable:
+    """Piecewise linear table of A_i(s) and B_i(s) for all qubits
+
+    Attributes:
+        grid: array
+            Sorted normalized times of shape (K,).
+        A: array
+            Values of A_i on the grid of shape (K, n_qubits).
+        B: array
+            Values of B_i on the grid of shape (K, n_qubits).
+        extrapolate: bool
+            Extrapolates linearly beyond the grid if True, else uses the values at
+            the boundaries.
+        exact: bool
+            Whether the grid contains all breakpoints, i.e., the table reproduces
+            the interpolation of ``s_to_offset`` exactly.
+    """
+
+    def __init__(
+            self, grid: ndarray, A: ndarray, B: ndarray, extrapolate: bool, exact: bool
+    ):
+        self.grid = grid
+        self.A = A
+        self.B = B
+        self.extrapolate = extrapolate
+        self.exact = exact
+
+    def __call__(self, s) -> Tuple[ndarray, ndarray]:
+        """Returns A and B for all qubits
+
+        Shapes are (n_qubits,) for scalar s and s.shape + (n_qubits,) else.
+        """
+        s = np.asarray(s, dtype=float)
+        if not self.extrapolate:
+            s = np.clip(s, self.grid[0], self.grid[-1])
+        idx = np.clip(
+            np.searchsorted(self.grid, s, side="right") - 1, 0, self.grid.size - 2
+        )
+        weight = ((s - self.grid[idx]) / (self.grid[idx + 1] - self.grid[idx]))[
+            ..., None
+        ]
+        A = (1.0 - weight) * self.A[idx] + weight * self.A[idx + 1]
+        B = (1.0 - weight) * self.B[idx] + weight * self.B[idx + 1]
+        return A, B
+
+
 class AnnealSchedule:
     """Class for obtaining anneal parameters for given anneal schedule parameters.
     """
@@ -186,13 +427,14 @@ class AnnealSchedule:
         fill_value: str = "extrapolate",
         anneal_curve: str = "linear",
         graph_params={},
+        schedule: Optional[List[Tuple[float, float]]] = None,
         **kwargs,
     ):
         """Initializes offset curves
 
         Arguments:
             offset, hi_for_offset, offset_min, offset_range: Parameters for AnnealOffset
-            fill_value, anneal_curve: Parameters for s_to_offset
+            fill_value, anneal_curve, schedule: Parameters for s_to_offset
         """
         AO = AnnealOffset(offset, graph_params)
         self.offset_list, self.offset_tag = AO.fcn(
@@ -201,7 +443,61 @@ class AnnealSchedule:
         #_, self.offset_tag, self.offset_list = find_offset(hi_for_offset, AO.fcn, embedding, offset_min, offset_range)
         print("From find offset")
         print(self.offset_list)
-        self.s2o = s_to_offset(fill_value, anneal_curve)
+        self.s2o = s_to_offset(fill_value, anneal_curve, schedule)
+        self.table = self.compile()
+        self.breakpoints = self._breakpoints()
+
+    def _breakpoints(self) -> ndarray:
+        """Returns the normalized times where A_i(s) or B_i(s) change slope abruptly
+
+        These are the kinks of C(s), e.g., the start and end of a pause, and, for the
+        fill value "truncate", the times where C(s) + offset_i leaves the range of
+        the anneal curve. Kinks of the tabulated anneal curve itself are excluded.
+        """
+        sknots, cknots = self.s2o.interpC.x, self.s2o.interpC.y
+        slope = np.diff(cknots) / np.diff(sknots)
+        kinks = sknots[1:-1][~np.isclose(slope[1:], slope[:-1], rtol=1e-9, atol=1e-12)]
+        if self.s2o.fill_value == "truncate":
+            ends = self.s2o.interpA.x[[0, -1]]
+            offsets = np.unique(np.asarray(self.offset_list, dtype=float))
+            kinks = np.concatenate(
+                [kinks, _crossings(ends[None, :] - offsets[:, None], sknots, cknots)]
+            )
+        return np.unique(kinks)
+
+    def compile(self, max_points: int = 20000) -> CoefficientTable:
+        """Tabulates A_i(s) and B_i(s) for all qubits on a piecewise linear grid
+
+        ``A_i(s) = interpA(interpC(s) + offset_i)`` is piecewise linear with
+        breakpoints at the knots of interpC and where ``interpC(s) + offset_i`` hits a
+        knot of interpA or interpB. If there are at most ``max_points`` breakpoints,
+        the table is exact. Otherwise, it uses ``max_points`` uniformly spaced points.
+
+        Beyond the grid, the table extrapolates linearly for the fill value
+        "extrapolate" and is constant for "truncate".
+
+        Arguments:
+            max_points: Maximal size of the grid.
+        """
+        sknots, cknots = self.s2o.interpC.x, self.s2o.interpC.y
+        offsets = np.unique(np.asarray(self.offset_list, dtype=float))
+        targets = self.s2o.interpA.x[None, :] - offsets[:, None]
+
+        grid = np.unique(np.concatenate([sknots, _crossings(targets, sknots, cknots)]))
+        exact = grid.size <= max_points
+        if not exact:
+            grid = np.linspace(grid.min(), grid.max(), max_points)
+        if grid.size < 2:
+            grid = np.array([grid[0], grid[0] + 1.0])
+
+        C = self.C(grid[:, None])
+        return CoefficientTable(
+            grid,
+            self.s2o.interpA(C),
+            self.s2o.interpB(C),
+            extrapolate=self.s2o.fill_value == "extrapolate",
+            exact=exact,
+        )
 
     def C(self, s: float) -> ndarray:
         """Returns anneal time for given normalized time including offset
@@ -210,19 +506,25 @@ class AnnealSchedule:
         C_offset = C + self.offset_list
         return C_offset
 
+    def AB(self, s: float) -> Tuple[ndarray, ndarray]:
+        """Returns A and B for all qubits from the compiled coefficient table
+
+        Arguments:
+            s: Normalized time, scalar or array.
+        """
+        return self.table(s)
+
     def A(self, s: float) -> ndarray:
         """Converts normalized anneal time to anneal time and returns corresponding
         value for initial Hamiltonian parameter.
         """
-        C = self.C(s)
-        return self.s2o.interpA(C)
+        return self.table(s)[0]
 
     def B(self, s: float) -> ndarray:
         """Converts normalized anneal time to anneal time and returns corresponding
         value for final Hamiltonian parameter.
         """
-        C = self.C(s)
-        return self.s2o.interpB(C)
+        return self.table(s)[1]
 
     def plot(
         self,
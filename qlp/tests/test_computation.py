@@ -0,0 +1,77 @@
+"""Tests of the time dependent Schrödinger equation solver
+"""
+from unittest import TestCase
+
+import numpy as np
+
+from qlp.tdse.computation import TDSE
+
+
+def make_tdse(Jij, hi, solver_params=None) -> TDSE:
+    """Returns a TDSE instance with the linear anneal curve and without offsets"""
+    n_qubits = len(hi)
+    graph_params = {"total_qubits": n_qubits}
+    ising_params = {
+        "Jij": np.array(Jij, dtype=float),
+        "hi": np.array(hi, dtype=float),
+        "c": 0,
+        "energyscale": 1.0,
+    }
+    offset_params = {
+        "annealing_time": 1,
+        "normalized_time": [0, 1],
+        "offset": "linear",
+        "hi_for_offset": np.ones(n_qubits),
+        "offset_min": 0,
+        "offset_range": 0,
+        "fill_value": "truncate",
+        "anneal_curve": "linear",
+        "embedding": None,
+        "Aoffset": 0,
+    }
+    solver_params = solver_params or {"method": "RK45", "rtol": 1e-7, "atol": 1e-8}
+    return TDSE(graph_params, ising_params, offset_params, solver_params)
+
+
+def frustrated_triangle(solver_params=None) -> TDSE:
+    """Antiferromagnetic triangle with a threefold degenerate final ground state"""
+    return make_tdse(np.triu(np.ones((3, 3)), 1), 0.5 * np.ones(3), solver_params)
+
+
+class SolvePureTest(TestCase):
+    """Tests of ``TDSE.solve_pure``"""
+
+    def test_sparse_t_eval(self):
+        """Segments without output times are skipped"""
+        tdse = frustrated_triangle()
+        y0 = tdse.init_wavefunction("transverse")
+        for t_eval in [np.array([0.0, 1.0]), tdse.adaptive_t_eval(num=30)]:
+            sol = tdse.solve_pure(y0, t_eval=t_eval)
+            np.testing.assert_allclose(sol.t, t_eval)
+            self.assertEqual(sol.y.shape, (y0.size, t_eval.size))
+
+    def test_dense_output_in_solver_params(self):
+        """The solution does not depend on ``dense_output`` in the solver parameters"""
+        t_eval = np.linspace(0, 1, 11)
+        sols = []
+        for dense_output in [False, True]:
+            solver_params = {"method": "RK45", "rtol": 1e-7, "atol": 1e-8}
+            solver_params["dense_output"] = dense_output
+            tdse = frustrated_triangle(solver_params)
+            y0 = tdse.init_wavefunction("transverse")
+            sols.append(tdse.solve_pure(y0, t_eval=t_eval).y)
+        np.testing.assert_allclose(sols[0], sols[1])
+
+
+class AdaptiveTEvalTest(TestCase):
+    """Tests of ``TDSE.adaptive_t_eval``"""
+
+    def test_degenerate_final_ground_state(self):
+        """The closing gap within the final ground manifold does not attract points"""
+        tdse = frustrated_triangle()
+        t_eval = tdse.adaptive_t_eval(num=100)
+        self.assertEqual(t_eval[0], 0)
+        self.assertEqual(t_eval[-1], 1)
+        self.assertTrue(np.all(np.diff(t_eval) > 0))
+        self.assertLess(np.count_nonzero(t_eval > 0.9), 20)
+        self.assertGreater(np.count_nonzero(t_eval < 0.5), 30)
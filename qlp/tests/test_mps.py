@@ -0,0 +1,69 @@
+"""Tests of the matrix product state solver
+"""
+from unittest import TestCase
+
+import numpy as np
+
+from qlp.tdse.computation import TDSE
+from qlp.tdse.mps import MPSTDSE
+
+
+def make_params(Jij, hi):
+    """Returns graph, ising and offset parameters for the linear anneal curve"""
+    n_qubits = len(hi)
+    graph_params = {"total_qubits": n_qubits}
+    ising_params = {
+        "Jij": np.array(Jij, dtype=float),
+        "hi": np.array(hi, dtype=float),
+        "c": 0,
+        "energyscale": 1.0,
+    }
+    offset_params = {
+        "annealing_time": 1,
+        "normalized_time": [0, 1],
+        "offset": "linear",
+        "hi_for_offset": np.ones(n_qubits),
+        "offset_min": 0,
+        "offset_range": 0,
+        "fill_value": "truncate",
+        "anneal_curve": "linear",
+        "embedding": None,
+        "Aoffset": 0,
+    }
+    return graph_params, ising_params, offset_params
+
+
+class MPSTDSETest(TestCase):
+    """Compares ``MPSTDSE`` against the exact ``TDSE`` solver"""
+
+    def test_symmetric_chain(self):
+        """A symmetric Jij has the same couplings as its upper triangle"""
+        hi = [0.3, -0.5, 0.2, 0.4]
+        Jij = np.diag([0.6, -0.4, 0.8], k=1)
+        Jij = Jij + Jij.T
+        t_eval = np.linspace(0, 1, 11)
+
+        solver_params = {"method": "RK45", "rtol": 1e-9, "atol": 1e-10}
+        tdse = TDSE(*make_params(Jij, hi), solver_params)
+        psi = tdse.solve_pure(tdse.init_wavefunction("transverse"), t_eval=t_eval).y
+        psi = psi / np.linalg.norm(psi, axis=0)
+        z = np.array(
+            [np.real(np.sum(psi.conj() * (Z @ psi), axis=0)) for Z in tdse.FockZ]
+        ).T
+        final = psi[:, -1]
+        zz = np.array(
+            [
+                [np.real(np.vdot(final, Zi @ (Zj @ final))) for Zj in tdse.FockZ]
+                for Zi in tdse.FockZ
+            ]
+        )
+        energy = tdse.IsingH_exact.diagonal()
+        ground = np.isclose(energy, energy.min())
+        prob = np.sum(np.abs(final[ground]) ** 2)
+
+        mps = MPSTDSE(*make_params(Jij, hi), {"n_steps": 2000})
+        sol = mps.solve_pure(mps.init_wavefunction(), t_eval=t_eval)
+
+        np.testing.assert_allclose(sol.z, z, atol=1e-3)
+        np.testing.assert_allclose(mps.correlation_matrix(sol.mps), zz, atol=1e-3)
+        self.assertAlmostEqual(mps.ground_state_probability(sol), prob, delta=1e-3)
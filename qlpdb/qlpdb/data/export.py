@@ -0,0 +1,249 @@
+"""Columnar export of experiment data
+
+Streams `Data` and `Sample` entries of experiments into a directory of `.npy` column
+files which can be loaded with memory mapping.
+Spin configurations are stored as packed bits of shape [n_rows, n_bytes], the first
+spin of a configuration is the most significant bit of the first byte.
+
+Layout of an export directory::
+
+    experiments.json                metadata of experiments and their graphs
+    data_<column>.npy               one row per `Data` entry
+    sample_<column>.npy             one row per `Sample` entry
+"""
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import json
+import os
+from itertools import islice
+
+import numpy as np
+
+from qlpdb.data.models import Data, Sample
+from qlpdb.experiment.models import DWaveExperiment
+
+DATA_COLUMNS = {
+    "experiment": np.int64,
+    "measurement": np.int64,
+    "energy": np.float64,
+    "chain_break_fraction": np.float64,
+    "constraint_satisfaction": np.bool_,
+}
+
+SAMPLE_COLUMNS = {
+    "experiment": np.int64,
+    "occurrences": np.int64,
+    "energy": np.float64,
+    "chain_break_fraction": np.float64,
+    "max_chain_break_fraction": np.float64,
+    "constraint_satisfaction": np.bool_,
+}
+
+
+def _experiment_summary(experiment: DWaveExperiment, total_spins: int) -> Dict:
+    """Returns the JSON serializable metadata of an experiment and its graph."""
+    graph = experiment.graph
+    return {
+        "id": experiment.pk,
+        "tag": experiment.tag,
+        "machine": experiment.machine,
+        "settings": experiment.settings,
+        "p": float(experiment.p),
+        "chain_strength": experiment.chain_strength,
+        "total_spins": total_spins,
+        "graph": {
+            "id": graph.pk,
+            "tag": graph.tag,
+            "total_vertices": graph.total_vertices,
+            "total_edges": graph.total_edges,
+            "max_edges": graph.max_edges,
+            "fingerprint": graph.fingerprint,
+            "adjacency": graph.adjacency,
+        },
+    }
+
+
+def _total_spins(experiment: DWaveExperiment) -> int:
+    """Returns the number of spins per configuration stored for the experiment."""
+    sample = (
+        Sample.objects.filter(experiment=experiment)
+        .values_list("total_spins", flat=True)
+        .first()
+    )
+    if sample is not None:
+        return sample
+    spin_config = (
+        Data.objects.filter(experiment=experiment)
+        .values_list("spin_config", flat=True)
+        .first()
+    )
+    return len(spin_config) if spin_config is not None else 0
+
+
+def _chunks(iterator: Iterator, chunk_size: int) -> Iterator[List]:
+    """Yields lists of at most `chunk_size` elements of the iterator."""
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _write_columns(
+    path: str,
+    prefix: str,
+    queryset,
+    columns: Dict[str, type],
+    pack,
+    n_bytes: int,
+    chunk_size: int,
+) -> List[str]:
+    """Streams the queryset in chunks into memory mapped `.npy` column files.
+
+    Rows added after the initial count are ignored, so the files are consistent.
+
+    Arguments:
+        path: Export directory.
+        prefix: File name prefix of the columns.
+        queryset: Queryset ordered by experiment.
+        columns: Names and dtypes of the value columns.
+        pack: Function mapping the list of spin configurations of a chunk to packed
+            bits of shape [n_chunk, n_bytes].
+        n_bytes: Number of bytes of the widest packed spin configuration.
+        chunk_size: Number of rows fetched and written at once.
+    """
+    n_rows = queryset.count()
+    files = {
+        name: os.path.join(path, f"{prefix}_{name}.npy")
+        for name in list(columns) + ["spin_config"]
+    }
+    arrays = {
+        name: np.lib.format.open_memmap(
+            files[name], mode="w+", dtype=dtype, shape=(n_rows,)
+        )
+        for name, dtype in columns.items()
+    }
+    arrays["spin_config"] = np.lib.format.open_memmap(
+        files["spin_config"], mode="w+", dtype=np.uint8, shape=(n_rows, n_bytes)
+    )
+
+    rows = queryset.values_list(*columns, "spin_config").iterator(
+        chunk_size=chunk_size
+    )
+    start = 0
+    for chunk in _chunks(islice(rows, n_rows), chunk_size):
+        stop = start + len(chunk)
+        values = list(zip(*chunk))
+        for name, column in zip(columns, values):
+            arrays[name][start:stop] = column
+        packed = pack(values[-1])
+        arrays["spin_config"][start:stop, : packed.shape[1]] = packed
+        start = stop
+
+    for array in arrays.values():
+        array.flush()
+    return list(files.values())
+
+
+def _pack_data(spin_config: Tuple[List[int]]) -> np.ndarray:
+    """Packs JSON spin configurations of possibly different lengths."""
+    width = max(len(spins) for spins in spin_config)
+    spins = np.zeros((len(spin_config), width), dtype=np.uint8)
+    for idx, config in enumerate(spin_config):
+        spins[idx, : len(config)] = config
+    return np.packbits(spins, axis=1)
+
+
+def _pack_samples(spin_config: Tuple[bytes]) -> np.ndarray:
+    """Stacks packed spin configurations of possibly different lengths."""
+    width = max(len(bytes(spins)) for spins in spin_config)
+    packed = np.zeros((len(spin_config), width), dtype=np.uint8)
+    for idx, config in enumerate(spin_config):
+        config = np.frombuffer(bytes(config), dtype=np.uint8)
+        packed[idx, : len(config)] = config
+    return packed
+
+
+def export_experiments(
+    experiments: Iterable, path: str, chunk_size: int = 10000
+) -> List[str]:
+    """Exports data and samples of experiments to columnar `.npy` files.
+
+    Rows are streamed in chunks (with server-side cursors on backends supporting
+    them) and written into memory mapped files, so memory use is bounded by the
+    chunk size.
+
+    Arguments:
+        experiments: DWave experiments or their primary keys.
+        path: Directory of the export, created if it does not exist.
+        chunk_size: Number of rows fetched and written at once.
+
+    Returns:
+        The list of written files.
+    """
+    ids = [getattr(experiment, "pk", experiment) for experiment in experiments]
+    os.makedirs(path, exist_ok=True)
+
+    metadata = []
+    for experiment in DWaveExperiment.objects.filter(pk__in=ids).select_related(
+        "graph"
+    ):
+        metadata.append(_experiment_summary(experiment, _total_spins(experiment)))
+    metadata.sort(key=lambda entry: entry["id"])
+    n_bytes = (max([entry["total_spins"] for entry in metadata], default=0) + 7) // 8
+
+    files = [os.path.join(path, "experiments.json")]
+    with open(files[0], "w") as out:
+        json.dump(metadata, out)
+
+    files += _write_columns(
+        path,
+        "data",
+        Data.objects.filter(experiment__in=ids).order_by("experiment", "measurement"),
+        DATA_COLUMNS,
+        _pack_data,
+        n_bytes,
+        chunk_size,
+    )
+    files += _write_columns(
+        path,
+        "sample",
+        Sample.objects.filter(experiment__in=ids).order_by("experiment", "energy"),
+        SAMPLE_COLUMNS,
+        _pack_samples,
+        n_bytes,
+        chunk_size,
+    )
+    return files
+
+
+def load_export(path: str, mmap_mode: Optional[str] = "r") -> Dict[str, object]:
+    """Loads an export created by `export_experiments`.
+
+    Returns a dictionary with the experiment metadata under ``"experiments"`` and the
+    columns under ``"data"`` and ``"sample"``.
+
+    Arguments:
+        path: Directory of the export.
+        mmap_mode: Memory mapping mode passed to `numpy.load`.
+    """
+    with open(os.path.join(path, "experiments.json")) as inp:
+        result = {"experiments": json.load(inp)}
+    for prefix, columns in [("data", DATA_COLUMNS), ("sample", SAMPLE_COLUMNS)]:
+        result[prefix] = {
+            name: np.load(
+                os.path.join(path, f"{prefix}_{name}.npy"), mmap_mode=mmap_mode
+            )
+            for name in list(columns) + ["spin_config"]
+        }
+    return result
+
+
+def unpack_spins(packed: np.ndarray, total_spins: int) -> np.ndarray:
+    """Unpacks spin configurations of shape [n_rows, n_bytes] into 0/1 spins.
+
+    Arguments:
+        packed: Packed spin configurations.
+        total_spins: Number of spins per configuration.
+    """
+    return np.unpackbits(packed, axis=1, count=total_spins)
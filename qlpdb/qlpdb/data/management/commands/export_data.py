@@ -0,0 +1,42 @@
+"""Exports experiment data to columnar `.npy` files, see `qlpdb.data.export`
+"""
+from django.core.management.base import BaseCommand
+
+from qlpdb.data.export import export_experiments
+from qlpdb.experiment.models import DWaveExperiment
+
+
+class Command(BaseCommand):
+    help = "Exports data and samples of selected DWave experiments to .npy columns."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Directory of the export")
+        parser.add_argument(
+            "--experiments", nargs="+", type=int, help="Primary keys of experiments"
+        )
+        parser.add_argument("--tag", help="Only experiments with this tag")
+        parser.add_argument("--machine", help="Only experiments on this machine")
+        parser.add_argument("--graph-tag", help="Only experiments on graphs with tag")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=10000,
+            help="Number of rows fetched and written at once",
+        )
+
+    def handle(self, *args, **options):
+        experiments = DWaveExperiment.objects.all()
+        if options["experiments"]:
+            experiments = experiments.filter(pk__in=options["experiments"])
+        if options["tag"]:
+            experiments = experiments.filter(tag=options["tag"])
+        if options["machine"]:
+            experiments = experiments.filter(machine=options["machine"])
+        if options["graph_tag"]:
+            experiments = experiments.filter(graph__tag=options["graph_tag"])
+
+        ids = list(experiments.values_list("pk", flat=True))
+        files = export_experiments(
+            ids, options["path"], chunk_size=options["chunk_size"]
+        )
+        self.stdout.write(f"Exported {len(ids)} experiments to {len(files)} files")
@@ -0,0 +1,38 @@
+# Generated by Django 3.2.25 on 2026-10-18 23:41
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('experiment', '0002_auto_20201102_1852'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('data', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Sample',
+            fields=[
+                ('id', models.AutoField(help_text='Primary key for Base class.', primary_key=True, serialize=False)),
+                ('last_modified', models.DateTimeField(auto_now=True, help_text='Date the class was last modified')),
+                ('tag', models.CharField(blank=True, help_text='User defined tag for easy searches', max_length=200, null=True)),
+                ('spin_config', models.BinaryField(help_text='Spin configuration of solution packed into bytes, first spin is the most significant bit')),
+                ('total_spins', models.PositiveIntegerField(help_text='Number of spins in the spin configuration')),
+                ('occurrences', models.PositiveIntegerField(help_text='Number of measurements of this spin configuration')),
+                ('chain_break_fraction', models.FloatField(help_text='Mean chain break fraction over all occurrences')),
+                ('max_chain_break_fraction', models.FloatField(help_text='Largest chain break fraction over all occurrences')),
+                ('energy', models.FloatField(help_text='Energy corresponding to spin_config and QUBO')),
+                ('constraint_satisfaction', models.BooleanField(help_text='Are the inequality constraints satisfied by the slacks?')),
+                ('experiment', models.ForeignKey(help_text='Foreign Key to `experiment`', on_delete=django.db.models.deletion.CASCADE, to='experiment.experiment')),
+                ('user', models.ForeignKey(blank=True, help_text='User who updated this object. Set on save by connection to database. Anonymous if not found.', null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='sample',
+            constraint=models.UniqueConstraint(fields=('experiment', 'spin_config'), name='unique_sample'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.25 on 2026-10-18 23:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0002_sample'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='data',
+            index=models.Index(fields=['experiment', 'constraint_satisfaction', 'energy'], name='data_summary_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sample',
+            index=models.Index(fields=['experiment', 'constraint_satisfaction', 'energy'], name='sample_summary_idx'),
+        ),
+    ]
@@ -3,6 +3,10 @@
 
 # Note: if you want your models to use espressodb features, they must inherit from Base
 
+from typing import List
+
+import numpy as np
+
 from django.db import models
 from espressodb.base.models import Base
 from django.db.models import JSONField
@@ -34,3 +38,155 @@ class Data(Base):
                 fields=["experiment", "measurement"], name="unique_data"
             )
         ]
+        indexes = [
+            models.Index(
+                fields=["experiment", "constraint_satisfaction", "energy"],
+                name="data_summary_idx",
+            )
+        ]
+
+
+class Sample(Base):
+    """Unique spin configuration of an experiment with its number of occurrences.
+
+    Compact alternative to `Data`: each configuration is stored once per experiment
+    as a packed bitstring.
+    """
+
+    experiment = models.ForeignKey(
+        "experiment.Experiment",
+        on_delete=models.CASCADE,
+        help_text=r"Foreign Key to `experiment`",
+    )
+    spin_config = models.BinaryField(
+        help_text="Spin configuration of solution packed into bytes, first spin is"
+        " the most significant bit"
+    )
+    total_spins = models.PositiveIntegerField(
+        null=False, help_text="Number of spins in the spin configuration"
+    )
+    occurrences = models.PositiveIntegerField(
+        null=False, help_text="Number of measurements of this spin configuration"
+    )
+    chain_break_fraction = models.FloatField(
+        null=False, help_text="Mean chain break fraction over all occurrences"
+    )
+    max_chain_break_fraction = models.FloatField(
+        null=False, help_text="Largest chain break fraction over all occurrences"
+    )
+    energy = models.FloatField(
+        null=False, help_text="Energy corresponding to spin_config and QUBO"
+    )
+    constraint_satisfaction = models.BooleanField(
+        null=False, help_text="Are the inequality constraints satisfied by the slacks?"
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["experiment", "spin_config"], name="unique_sample"
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["experiment", "constraint_satisfaction", "energy"],
+                name="sample_summary_idx",
+            )
+        ]
+
+    @property
+    def spins(self) -> List[int]:
+        """Returns the unpacked spin configuration."""
+        packed = np.frombuffer(bytes(self.spin_config), dtype=np.uint8)
+        return np.unpackbits(packed, count=self.total_spins).tolist()
+
+    @classmethod
+    def aggregate(
+        cls,
+        experiment,
+        spin_config: np.ndarray,
+        energy: np.ndarray,
+        constraint_satisfaction: np.ndarray,
+        chain_break_fraction: np.ndarray,
+    ) -> List["Sample"]:
+        """Returns unsaved samples for the unique spin configurations of measurements.
+
+        Arguments:
+            experiment: The experiment the measurements belong to.
+            spin_config: Spin configurations of shape [n_measurements, n_spins].
+            energy: Energy of each measurement.
+            constraint_satisfaction: Constraint satisfaction of each measurement.
+            chain_break_fraction: Chain break fraction of each measurement.
+        """
+        spin_config = np.asarray(spin_config, dtype=np.uint8)
+        if not spin_config.size:
+            return []
+        chain_break_fraction = np.asarray(chain_break_fraction, dtype=float)
+
+        packed = np.packbits(spin_config, axis=1)
+        _, first, inverse, counts = np.unique(
+            packed, axis=0, return_index=True, return_inverse=True, return_counts=True
+        )
+        inverse = inverse.reshape(-1)
+        mean_cbf = np.bincount(inverse, weights=chain_break_fraction) / counts
+        max_cbf = np.full(len(counts), -np.inf)
+        np.maximum.at(max_cbf, inverse, chain_break_fraction)
+
+        energy = np.asarray(energy, dtype=float)
+        satisfied = np.asarray(constraint_satisfaction, dtype=bool)
+        return [
+            cls(
+                experiment=experiment,
+                spin_config=packed[idx].tobytes(),
+                total_spins=spin_config.shape[1],
+                occurrences=int(count),
+                chain_break_fraction=float(mean),
+                max_chain_break_fraction=float(largest),
+                energy=float(energy[idx]),
+                constraint_satisfaction=bool(satisfied[idx]),
+            )
+            for idx, count, mean, largest in zip(first, counts, mean_cbf, max_cbf)
+        ]
+
+    @classmethod
+    def from_data(cls, experiment) -> List["Sample"]:
+        """Returns unsaved samples aggregating the `Data` entries of an experiment.
+
+        Arguments:
+            experiment: The experiment to aggregate.
+        """
+        rows = list(
+            Data.objects.filter(experiment=experiment)
+            .order_by("measurement")
+            .values_list(
+                "spin_config", "energy", "constraint_satisfaction", "chain_break_fraction"
+            )
+        )
+        if not rows:
+            return []
+        spin_config, energy, satisfied, chain_break_fraction = zip(*rows)
+        return cls.aggregate(
+            experiment, spin_config, energy, satisfied, chain_break_fraction
+        )
+
+    def to_data(self, first_measurement: int = 0) -> List[Data]:
+        """Returns one unsaved `Data` entry per occurrence of this sample.
+
+        The order of the original measurements is not stored, the entries are
+        numbered consecutively starting at `first_measurement`.
+
+        Arguments:
+            first_measurement: Measurement number of the first entry.
+        """
+        spins = self.spins
+        return [
+            Data(
+                experiment_id=self.experiment_id,
+                measurement=first_measurement + idx,
+                spin_config=list(spins),
+                chain_break_fraction=self.chain_break_fraction,
+                energy=self.energy,
+                constraint_satisfaction=self.constraint_satisfaction,
+            )
+            for idx in range(self.occurrences)
+        ]
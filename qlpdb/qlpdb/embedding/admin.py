@@ -0,0 +1,7 @@
+"""Admin pages for embedding models
+
+On default generates list view admins for all models
+"""
+from espressodb.base.admin import register_admins
+
+register_admins("qlpdb.embedding")
@@ -0,0 +1,40 @@
+# Generated by Django 3.2.25 on 2026-10-18 23:33
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Embedding',
+            fields=[
+                ('id', models.AutoField(help_text='Primary key for Base class.', primary_key=True, serialize=False)),
+                ('last_modified', models.DateTimeField(auto_now=True, help_text='Date the class was last modified')),
+                ('tag', models.TextField(blank=True, help_text='Tag of the source problem (e.g. the graph tag)')),
+                ('source_hash', models.TextField(help_text='md5 hash of the sorted couplings of the source QUBO')),
+                ('target_hash', models.TextField(help_text='md5 hash of machine name and sorted couplers of the target graph')),
+                ('machine', models.TextField(help_text='Hardware name (e.g. DW_2000Q_5)')),
+                ('target_min', models.FloatField(help_text='Anneal offset all chains must reach from below')),
+                ('target_range', models.FloatField(help_text='Anneal offset range all chains must support')),
+                ('embedding', models.JSONField(help_text='List of [variable, chain] pairs, chain is a list of qubits')),
+                ('min_offset', models.FloatField(help_text='Largest lower anneal offset bound of embedded qubits')),
+                ('max_offset', models.FloatField(help_text='Smallest upper anneal offset bound of embedded qubits')),
+                ('max_chain_length', models.PositiveIntegerField(help_text='Number of qubits in the longest chain')),
+                ('total_qubits', models.PositiveIntegerField(help_text='Number of qubits in all chains')),
+                ('user', models.ForeignKey(blank=True, help_text='User who updated this object. Set on save by connection to database. Anonymous if not found.', null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='embedding',
+            constraint=models.UniqueConstraint(fields=('source_hash', 'target_hash', 'target_min', 'target_range'), name='unique_embedding'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+"""Models of embedding
+"""
+
+# Note: if you want your models to use espressodb features, they must inherit from Base
+
+from django.db import models
+from espressodb.base.models import Base
+from django.db.models import JSONField
+
+
+class Embedding(Base):
+    """Minor embedding of a QUBO sparsity pattern into the graph of a machine.
+
+    Entries are content addressed: the same source sparsity pattern on the same
+    target graph with the same offset targets maps to one embedding.
+    """
+
+    tag = models.TextField(
+        null=False,
+        blank=True,
+        help_text="Tag of the source problem (e.g. the graph tag)",
+    )
+    source_hash = models.TextField(
+        null=False,
+        blank=False,
+        help_text="md5 hash of the sorted couplings of the source QUBO",
+    )
+    target_hash = models.TextField(
+        null=False,
+        blank=False,
+        help_text="md5 hash of machine name and sorted couplers of the target graph",
+    )
+    machine = models.TextField(
+        null=False, blank=False, help_text="Hardware name (e.g. DW_2000Q_5)"
+    )
+    target_min = models.FloatField(
+        null=False, help_text="Anneal offset all chains must reach from below"
+    )
+    target_range = models.FloatField(
+        null=False, help_text="Anneal offset range all chains must support"
+    )
+    embedding = JSONField(
+        help_text="List of [variable, chain] pairs, chain is a list of qubits"
+    )
+    min_offset = models.FloatField(
+        null=False, help_text="Largest lower anneal offset bound of embedded qubits"
+    )
+    max_offset = models.FloatField(
+        null=False, help_text="Smallest upper anneal offset bound of embedded qubits"
+    )
+    max_chain_length = models.PositiveIntegerField(
+        null=False, help_text="Number of qubits in the longest chain"
+    )
+    total_qubits = models.PositiveIntegerField(
+        null=False, help_text="Number of qubits in all chains"
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["source_hash", "target_hash", "target_min", "target_range"],
+                name="unique_embedding",
+            )
+        ]
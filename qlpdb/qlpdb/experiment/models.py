@@ -1,12 +1,14 @@
 """Models of experiment
 """
-from typing import List, Dict
+from typing import List, Dict, Iterable, Tuple
 
-from django.db import models
+from django.core.exceptions import EmptyResultSet
+from django.db import models, connections
 from espressodb.base.models import Base
 from django.db.models import JSONField
 
-from django.db.models import Count, Avg
+from django.db.models import Count, Avg, Sum, F, FloatField, ExpressionWrapper, Window
+from django.db.models.functions import RowNumber
 
 
 class Experiment(Base):
@@ -63,31 +65,152 @@ class DWaveExperiment(Experiment):
     @property
     def n_data(self) -> int:
         """Returns the number of present data entries
+
+        Counts the occurrences of the deduplicated samples if the experiment has any.
         """
-        return self.data_set.count()
+        return self.count_data([self])[self.pk]
 
     def get_summary(self, n_entries: int = 5) -> List[Dict[str, float]]:
         """Returns a summary of solutions which fulfill the constraints.
 
         The returned list is sorted according to energy (ascending) and contains the
         energy and number of occurances.
+        Reads from the deduplicated samples if the experiment has any.
 
         Arguments:
             n_entries: Number of different energies to be returned.
         """
-        exp_data = self.data_set.all()
-        satisfied_data = (
-            exp_data.filter(
-                constraint_satisfaction=True,
-                experiment_ptr__dwaveexperiment__isnull=False,
+        return self.get_summaries([self], n_entries=n_entries)[self.pk]
+
+    @staticmethod
+    def _split_sources(experiments: Iterable) -> Tuple[List[int], List[int]]:
+        """Returns the primary keys of experiments with samples and of all others.
+
+        Experiments with deduplicated samples are read from `Sample` only, even if
+        they also have `Data` entries.
+        """
+        from qlpdb.data.models import Sample
+
+        ids = [getattr(experiment, "pk", experiment) for experiment in experiments]
+        with_samples = set(
+            Sample.objects.filter(experiment__in=ids)
+            .order_by()
+            .values_list("experiment", flat=True)
+            .distinct()
+        )
+        return (
+            [pk for pk in ids if pk in with_samples],
+            [pk for pk in ids if pk not in with_samples],
+        )
+
+    @classmethod
+    def count_data(cls, experiments: Iterable) -> Dict[int, int]:
+        """Returns the number of data entries for many experiments at once.
+
+        Experiments with samples count the occurrences of their samples.
+
+        Arguments:
+            experiments: Experiments or their primary keys.
+        """
+        from qlpdb.data.models import Data, Sample
+
+        sample_ids, data_ids = cls._split_sources(experiments)
+        counts = dict(
+            Sample.objects.filter(experiment__in=sample_ids)
+            .order_by()
+            .values("experiment")
+            .annotate(count=Sum("occurrences"))
+            .values_list("experiment", "count")
+        )
+        counts.update(
+            Data.objects.filter(experiment__in=data_ids)
+            .order_by()
+            .values("experiment")
+            .annotate(count=Count("pk"))
+            .values_list("experiment", "count")
+        )
+        return {pk: counts.get(pk, 0) for pk in sample_ids + data_ids}
+
+    @classmethod
+    def get_summaries(
+        cls, experiments: Iterable, n_entries: int = 5
+    ) -> Dict[int, List[Dict[str, float]]]:
+        """Returns the summaries of many experiments, see `get_summary`.
+
+        Aggregates in the database with one query for samples and one for data.
+        Only the `n_entries` lowest energies per experiment are fetched.
+
+        Arguments:
+            experiments: Experiments or their primary keys.
+            n_entries: Number of different energies to be returned per experiment.
+        """
+        from qlpdb.data.models import Data, Sample
+
+        sample_ids, data_ids = cls._split_sources(experiments)
+        summaries = {pk: [] for pk in sample_ids + data_ids}
+
+        samples = (
+            Sample.objects.filter(experiment__in=sample_ids, constraint_satisfaction=True)
+            .values("experiment", "energy")
+            .annotate(
+                occurances=Sum("occurrences"),
+                chain_break_fraction=ExpressionWrapper(
+                    Sum(
+                        F("chain_break_fraction") * F("occurrences"),
+                        output_field=FloatField(),
+                    )
+                    / Sum("occurrences"),
+                    output_field=FloatField(),
+                ),
             )
-            .values("energy")
+        )
+        data = (
+            Data.objects.filter(experiment__in=data_ids, constraint_satisfaction=True)
+            .values("experiment", "energy")
             .annotate(
-                occurances=Count("energy"),
+                occurances=Count("pk"),
                 chain_break_fraction=Avg("chain_break_fraction"),
             )
         )
-        return sorted(list(satisfied_data[:n_entries]), key=lambda el: el["energy"])
+        for queryset in [samples, data]:
+            for row in _lowest_energies(queryset, n_entries):
+                summaries[row.pop("experiment")].append(row)
+        return summaries
+
+
+def _lowest_energies(queryset, n_entries: int) -> List[Dict[str, float]]:
+    """Returns the rows of the queryset grouped by experiment and energy with the
+    `n_entries` lowest energies per experiment, sorted by experiment and energy.
+
+    Django can not filter on window functions, so the ranked queryset is wrapped in
+    a raw SQL query.
+    """
+    ranked = queryset.annotate(
+        position=Window(
+            RowNumber(), partition_by=[F("experiment")], order_by=F("energy").asc()
+        )
+    ).order_by()
+    try:
+        sql, params = ranked.query.get_compiler(queryset.db).as_sql()
+    except EmptyResultSet:
+        return []
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(
+            f"SELECT * FROM ({sql}) summary WHERE summary.position <= %s"
+            " ORDER BY summary.experiment_id, summary.energy",
+            (*params, n_entries),
+        )
+        columns = [column[0] for column in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    return [
+        {
+            "experiment": row["experiment_id"],
+            "energy": row["energy"],
+            "occurances": row["occurances"],
+            "chain_break_fraction": row["chain_break_fraction"],
+        }
+        for row in rows
+    ]
 
 
 class HMCExperiment(Experiment):
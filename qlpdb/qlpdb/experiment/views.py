@@ -1,7 +1,7 @@
 from django.views.generic import DetailView
 from django.views.generic.list import ListView
 
-from qlpdb.experiment.models import Experiment
+from qlpdb.experiment.models import Experiment, DWaveExperiment
 
 # Create your views here.
 
@@ -31,5 +31,21 @@ class ExperimentSummaryView(ListView):
     """
 
     template_name = "experiment-summary.html"
-    model = Experiment
+    model = DWaveExperiment
+    context_object_name = "experiment_list"
     ordering = ["-tag"]
+
+    def get_queryset(self):
+        return super().get_queryset().select_related("graph")
+
+    def get_context_data(self, **kwargs):
+        """Attaches data counts and summaries fetched for all experiments at once.
+        """
+        context = super().get_context_data(**kwargs)
+        experiments = context["experiment_list"]
+        counts = DWaveExperiment.count_data(experiments)
+        summaries = DWaveExperiment.get_summaries(experiments)
+        for experiment in experiments:
+            experiment.n_measurements = counts[experiment.pk]
+            experiment.summary = summaries[experiment.pk]
+        return context
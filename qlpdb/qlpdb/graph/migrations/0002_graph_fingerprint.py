@@ -0,0 +1,33 @@
+# Generated by Django 3.2.25 on 2026-10-18 23:34
+
+from django.db import migrations, models
+import networkx as nx
+
+
+def fill_fingerprints(apps, schema_editor):
+    """Sets the Weisfeiler-Lehman hash of existing graphs as in
+    qlp.mds.graph_tools.graph_fingerprint
+    """
+    Graph = apps.get_model('graph', 'Graph')
+    graphs = list(Graph.objects.only('id', 'adjacency'))
+    for graph in graphs:
+        G = nx.Graph()
+        G.add_edges_from(tuple(edge) for edge in graph.adjacency)
+        graph.fingerprint = nx.weisfeiler_lehman_graph_hash(G, iterations=3)
+    Graph.objects.bulk_update(graphs, ['fingerprint'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('graph', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='graph',
+            name='fingerprint',
+            field=models.TextField(blank=True, db_index=True, default='', help_text='Weisfeiler-Lehman hash of the graph, equal for isomorphic graphs'),
+        ),
+        migrations.RunPython(fill_fingerprints, migrations.RunPython.noop),
+    ]
@@ -29,6 +29,13 @@ class Graph(Base):
         blank=False,
         help_text="md5 hash of adjacency list used for unique constraint",
     )
+    fingerprint = models.TextField(
+        null=False,
+        blank=True,
+        default="",
+        db_index=True,
+        help_text="Weisfeiler-Lehman hash of the graph, equal for isomorphic graphs",
+    )
 
     class Meta:
         constraints = [